@@ -1,15 +1,46 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 from datetime import datetime
+import asyncio
+import json
 import uuid
 import os
-import requests
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader  # For PDF text extraction
-from docx import Document as DocxDocument  # For DOCX text extraction
-import tempfile
-import re
+import time
+from typing import List, Optional
+from utils.analysis import (
+    ANALYSIS_MODE,
+    ANALYSIS_MODES,
+    DEFAULT_CATEGORY,
+    DEFAULT_SUMMARY,
+    PROMPT_VERSION,
+    analyze_document,
+    categorize_document,
+    inference_backend,
+    summarize_chunks,
+    summarize_document,
+)
+from utils.blobs import BlobResponse, create_blob_store
+from utils.bulk import BulkAdmission, iter_bulk_entries, spool_bulk_upload, stream_bulk_results
+from utils.chunking import Chunker
+from utils.cache import ResultCache, cache_key
+from utils.classifier import CLASSIFIER_ENABLED, CLASSIFIER_TRAIN_LIMIT, CentroidClassifier
+from utils.dedup import IDEMPOTENCY_KEY_MAX_LENGTH, DedupStats, IdempotencyStore
+from utils.events import EventBroker, EventLog
+from utils.extraction import ExtractionError, ExtractionPool, join_pages
+from utils.extractors import EXTRACTORS, PDF_CONTENT_TYPE, sniff_content_type
+from utils.jobs import JobInFlightError, JobQueue, JobStore, QueueFullError
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, EXTRACTION_LATENCY, Gauge, MetricsMiddleware, registry
+from utils.ocr import PageOCR
+from utils.search import SearchIndex
+from utils.serving import SHARED_STATE
+from utils.spool import spool_upload
+from utils.store import COLUMNS, SORT_FIELDS, SORT_ORDERS, InvalidCursorError, create_store
+from utils.vectors import VectorIndex
 
 # Load environment variables
 load_dotenv()
@@ -25,12 +56,36 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-# Hugging Face API configuration
-HUGGING_FACE_API_URL = "https://api-inference.huggingface.co/models"
-HUGGING_FACE_API_TOKEN = os.getenv("HUGGING_FACE_API_TOKEN")  # Retrieve token from .env
+# Request counts and latency per route, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Category/summary results keyed by extracted text (see utils/cache.py for configuration)
+result_cache = ResultCache()
+
+# Document metadata storage (see utils/store.py for configuration)
+document_store = create_store()
+
+# Original files, stored once per distinct content (see utils/blobs.py for configuration)
+blob_store = create_blob_store()
+
+# Full-text index over extracted text (see utils/search.py for configuration)
+search_index = SearchIndex()
+
+# Document embeddings for similarity search (see utils/vectors.py for configuration)
+vector_index = VectorIndex()
 
-# In-memory storage for documents (replace with a database in production)
-documents = []
+# Worker processes for text extraction (see utils/extraction.py for configuration)
+extraction_pool = ExtractionPool()
+
+# Text recognition for scanned PDF pages, when tesseract is installed (see utils/ocr.py for configuration)
+page_ocr = PageOCR()
+
+# Job progress pushed to server-sent event subscribers, relayed between server processes
+# when there are several (see utils/events.py and utils/serving.py for configuration)
+event_broker = EventBroker(log=EventLog() if SHARED_STATE else None)
+
+# Cheap categorizer tried before the model (see utils/classifier.py for configuration)
+classifier = CentroidClassifier()
 
 class DocumentMetadata(BaseModel):
     id: str
@@ -38,174 +93,638 @@ class DocumentMetadata(BaseModel):
     uploadDate: str
     category: str
     summary: str
+    pageCount: Optional[int] = None
+    extractMs: Optional[float] = None
+    contentHash: Optional[str] = None
+    contentType: Optional[str] = None
+    size: Optional[int] = None
 
-def query_hugging_face(payload, model):
+def train_classifier():
     """
-    Query Hugging Face's Inference API.
+    Train the classifier on the most recently stored documents and their indexed text.
     """
-    headers = {
-        "Authorization": f"Bearer {HUGGING_FACE_API_TOKEN}",
-        "Content-Type": "application/json",
-    }
-    response = requests.post(f"{HUGGING_FACE_API_URL}/{model}", headers=headers, json=payload)
-    return response.json()
+    documents, _ = document_store.query(limit=CLASSIFIER_TRAIN_LIMIT, fields=["id", "category"])
+    texts, labels = [], []
+    for document in documents:
+        if document["category"] == DEFAULT_CATEGORY:
+            continue
+        text = search_index.content(document["id"])
+        if text:
+            texts.append(text)
+            labels.append(document["category"])
+    classifier.learn_many(texts, labels)
 
-def categorize_document(content: str) -> str:
+async def analyze(job, content: str, chunks: List[str]):
     """
-    Use Hugging Face's Inference API to categorize the document.
+    Categorize and summarize with the job's analysis mode, recording which mode was used.
+    The classifier supplies the category when it is confident; otherwise the model does,
+    and the classifier learns from its answer.
     """
-    prompt = f"""
-    Analyze the following document content and suggest a category label that best describes it.
-    The category should be a single word or a short phrase.
-    Respond with only the category label and nothing else.
-    Document Content: {content}
-    """
-    payload = {
-        "inputs": prompt,
-        "parameters": {
-            "max_length": 20,  # Limit the response to a short label
-        },
-    }
-    # Use a more instruction-following model like flan-t5-large
-    response = query_hugging_face(payload, "google/flan-t5-large")
-    
-    # Extract the category label from the response
-    if isinstance(response, list) and len(response) > 0:
-        generated_text = response[0].get("generated_text", "").strip()
-    elif isinstance(response, dict):
-        generated_text = response.get("generated_text", "").strip()
+    category = None
+    if CLASSIFIER_ENABLED:
+        with job.stage("classify"):
+            category, job.status.classifierScore = await run_in_threadpool(classifier.predict, content)
+    job.status.categorySource = "classifier" if category else "model"
+    if category:
+        event_broker.job_event(job, "categorized", category=category)
+
+    if len(chunks) > 1:
+        # Too long for one request: the category comes from the opening chunk (all
+        # the model would read anyway) and the summary from a map-reduce over all chunks
+        job.status.analysisMode = "map-reduce"
+        job.status.summaryChunks = len(chunks)
+        if not category:
+            with job.stage("categorize"):
+                category = await categorize_document(chunks[0])
+            event_broker.job_event(job, "categorized", category=category)
+            await learn_category(job, content, category)
+        with job.stage("summarize"):
+            summary = await summarize_chunks(chunks, result_cache)
+        return category, summary
+
+    if category:
+        # Only the summary is needed from the model
+        job.status.analysisMode = "classifier"
+        with job.stage("summarize"):
+            summary = await summarize_document(content)
+        return category, summary
+
+    mode = job.payload["analysis_mode"]
+    analysis = None
+    if mode == "combined":
+        with job.stage("analyze"):
+            analysis = await analyze_document(content)
+    if analysis:
+        category, summary = analysis
+        event_broker.job_event(job, "categorized", category=category)
     else:
-        generated_text = ""
-    
-    # Remove the prompt and extract only the first line (category label)
-    category = generated_text.replace(prompt, "").strip().split("\n")[0]
-    return category if category else "other"
+        # Separate requests, either by choice or because the combined response didn't parse
+        if mode == "combined":
+            mode = "combined-fallback"
+        with job.stage("categorize"):
+            category = await categorize_document(content)
+        event_broker.job_event(job, "categorized", category=category)
+        with job.stage("summarize"):
+            summary = await summarize_document(content)
+    job.status.analysisMode = mode
+    await learn_category(job, content, category)
+    return category, summary
 
-def summarize_document(content: str) -> str:
+def find_near_duplicate(embedding):
     """
-    Use Hugging Face's Inference API to summarize the document.
+    Return the stored document closest to an embedding if it is a near duplicate, and the closest similarity.
     """
-    prompt = f"""
-    Summarize the following document content in one sentence.
-    Respond with only the summary and nothing else.
-    Document Content: {content}
+    document_id, score = vector_index.near_duplicate(embedding)
+    return (document_store.get(document_id) if document_id else None), score
+
+async def learn_category(job, content: str, category: str):
     """
-    payload = {
-        "inputs": prompt,
-        "parameters": {
-            "max_length": 50,  # Limit summary to one sentence
-        },
-    }
-    # Use a more instruction-following model like flan-t5-large
-    response = query_hugging_face(payload, "google/flan-t5-large")
-    
-    # Extract the summary from the response
-    if isinstance(response, list) and len(response) > 0:
-        generated_text = response[0].get("generated_text", "").strip()
-    elif isinstance(response, dict):
-        generated_text = response.get("generated_text", "").strip()
-    else:
-        generated_text = ""
-    
-    # Remove the prompt and extract only the first line (summary)
-    summary = generated_text.replace(prompt, "").strip().split("\n")[0]
-    return summary if summary else "No summary available."
+    Teach the classifier a category the model assigned.
+    """
+    if CLASSIFIER_ENABLED and category != DEFAULT_CATEGORY:
+        with job.stage("learn"):
+            await run_in_threadpool(classifier.learn, content, category)
 
-def extract_text_from_pdf(file):
+async def process_upload(job):
     """
-    Extract text from a PDF file.
+    Background pipeline for an uploaded file: extract, categorize, summarize, store, index.
     """
     try:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        return text.strip()  # Remove trailing newlines
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to extract text from PDF: {str(e)}")
+        document = await ingest_upload(job)
+        if job.payload.get("idempotency_key"):
+            await run_in_threadpool(idempotency_store.set_document, job.id, document["id"])
+        return document
+    finally:
+        if in_flight.get(job.payload["sha256"]) is job:
+            del in_flight[job.payload["sha256"]]
+        # Clean up the temporary file, unless the blob store moved it into place
+        try:
+            os.unlink(job.payload["path"])
+        except FileNotFoundError:
+            pass
 
-def extract_text_from_docx(file):
+async def extract_content(job, extraction):
     """
-    Extract text from a DOCX file.
+    Extract an upload's pages, chunking them as they arrive so chunking
+    overlaps the extraction of later pages. Scanned PDF pages (no text
+    layer) start OCR as soon as they are found; chunking waits for their
+    text, to keep pages in order. Returns the text and its chunks.
     """
-    try:
-        doc = DocxDocument(file)
-        text = ""
-        for paragraph in doc.paragraphs:
-            if paragraph.text:
-                text += paragraph.text + "\n"
-        return text.strip()  # Remove trailing newlines
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to extract text from DOCX: {str(e)}")
-
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    # Validate file type
-    if file.content_type not in ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF and DOCX files are allowed.")
-
-    # Save the uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-        content = await file.read()
-        if not content:
-            raise HTTPException(status_code=400, detail="The file is empty.")
-        temp_file.write(content)
-        temp_file_path = temp_file.name
+    path, content_type = job.payload["path"], job.payload["content_type"]
+    document_ocr = page_ocr.document(path) if page_ocr.available and content_type == PDF_CONTENT_TYPE else None
+    chunker = Chunker()
+    pages = []
+    fed = 0  # Pages passed to the chunker so far
+
+    async def feed(wait: bool):
+        nonlocal fed
+        while fed < len(pages):
+            if document_ocr is not None and not pages[fed]:
+                if document_ocr.pending(fed) and not wait:
+                    return
+                pages[fed] = await document_ocr.text(fed)
+            await run_in_threadpool(chunker.feed, pages[fed])
+            fed += 1
 
     try:
-        # Extract text based on file type
-        if file.content_type == "application/pdf":
-            with open(temp_file_path, "rb") as f:
-                content = extract_text_from_pdf(f)
-        elif file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            with open(temp_file_path, "rb") as f:
-                content = extract_text_from_docx(f)
+        try:
+            with job.stage("extract"):
+                async for page in extraction_pool.iter_pages(path, content_type, extraction):
+                    if document_ocr is not None and not page:
+                        document_ocr.add(len(pages))
+                    pages.append(page)
+                    await feed(wait=False)
+        except ExtractionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+        EXTRACTION_LATENCY.observe(extraction["extractMs"] / 1000, content_type)
+
+        if document_ocr is not None and document_ocr.started:
+            # Recognition still running once extraction is done
+            with job.stage("ocr"):
+                await feed(wait=True)
+                texts, job.status.ocrPages = await document_ocr.finish()
+            event_broker.job_event(job, "recognized", ocrPages=len(texts))
         else:
-            content = ""
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
-    finally:
-        # Clean up the temporary file
-        os.unlink(temp_file_path)
+            await feed(wait=True)
+    except BaseException:
+        if document_ocr is not None:
+            document_ocr.cancel()
+        raise
+    return join_pages(pages), chunker.finish()
 
+async def ingest_upload(job):
+    temp_file_path = job.payload["path"]
+    extraction = {}
+    content, chunks = await extract_content(job, extraction)
     if not content:
         raise HTTPException(status_code=400, detail="Failed to extract text from the file. The file may be empty or unsupported.")
+    event_broker.job_event(job, "extracted", pageCount=extraction["pageCount"])
 
-    # Generate metadata
-    document_id = str(uuid.uuid4())
-    title = file.filename
-    upload_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # Embed the text for similarity search and near-duplicate detection
+    with job.stage("embed"):
+        embedding = await run_in_threadpool(vector_index.embed, content)
 
-    # Use Hugging Face to categorize and summarize the document
-    category = categorize_document(content)
-    summary = summarize_document(content)
+    # Use the inference backend to categorize and summarize the document, unless this
+    # text (or text nearly identical to it) was seen before
+    key = cache_key(content, inference_backend.model, PROMPT_VERSION)
+    job.status.cacheKey = key
+    cached = await run_in_threadpool(result_cache.get, key)
+    duplicate = None
+    if cached:
+        job.status.cacheHit = True
+        category, summary = cached["category"], cached["summary"]
+    else:
+        with job.stage("deduplicate"):
+            duplicate, job.status.nearDuplicateScore = await run_in_threadpool(find_near_duplicate, embedding)
+    if duplicate:
+        job.status.nearDuplicateOf = duplicate["id"]
+        job.status.analysisMode = "near-duplicate"
+        category, summary = duplicate["category"], duplicate["summary"]
+    elif not cached:
+        category, summary = await analyze(job, content, chunks)
+        # Don't cache placeholder results from failed inference calls
+        if category != DEFAULT_CATEGORY and summary != DEFAULT_SUMMARY:
+            await run_in_threadpool(result_cache.put, key, {"category": category, "summary": summary})
+    if cached or duplicate:
+        event_broker.job_event(job, "categorized", category=category)
+    event_broker.job_event(job, "summarized", summary=summary)
 
     # Store document metadata
-    document = DocumentMetadata(
-        id=document_id,
-        title=title,
-        uploadDate=upload_date,
-        category=category,
-        summary=summary,
+    with job.stage("store"):
+        document = DocumentMetadata(
+            id=str(uuid.uuid4()),
+            title=job.status.filename,
+            uploadDate=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            category=category,
+            summary=summary,
+            pageCount=extraction["pageCount"],
+            extractMs=extraction["extractMs"],
+            contentHash=job.payload["sha256"],
+            contentType=job.payload["content_type"],
+            size=job.payload["size"],
+        )
+        # Keep the original file; identical uploads share one blob
+        await run_in_threadpool(blob_store.add, temp_file_path, job.payload["sha256"], job.payload["size"])
+        try:
+            await run_in_threadpool(document_store.add, document.dict())
+        except Exception:
+            await run_in_threadpool(blob_store.release, job.payload["sha256"])
+            raise
+
+    # Make the extracted text searchable
+    with job.stage("index"):
+        await run_in_threadpool(search_index.add, document.id, document.title, content)
+        await run_in_threadpool(vector_index.add, document.id, embedding)
+    event_broker.job_event(job, "indexed", documentId=document.id)
+
+    return document.dict()
+
+# Background ingestion queue; with several server processes, job statuses are shared
+# through SQLite (see utils/jobs.py and utils/serving.py for configuration)
+job_store = JobStore() if SHARED_STATE else None
+job_queue = JobQueue(process_upload, notify=event_broker.job_event, store=job_store)
+
+# Idempotency-Key -> job, and unfinished jobs by content hash (see utils/dedup.py for configuration)
+idempotency_store = IdempotencyStore()
+in_flight = {}
+dedup_stats = DedupStats()
+
+# Bulk uploads on disk at once (see utils/bulk.py for configuration)
+bulk_admission = BulkAdmission()
+
+async def find_earlier_result(spooled, idempotency_key: Optional[str]):
+    """
+    Return a job that already answers this upload: the one started by the same
+    Idempotency-Key, one processing the same bytes, or a completed job holding
+    the document stored for them. Returns None if the upload must be processed.
+    """
+    if idempotency_key:
+        record = await run_in_threadpool(idempotency_store.get, idempotency_key)
+        if record and record["contentHash"] != spooled.sha256:
+            raise HTTPException(status_code=422, detail="This Idempotency-Key was already used for a different file.")
+        if record:
+            job = await job_queue.find(record["jobId"])
+            # A failed job is retried rather than replayed
+            if job and job.status.status != "failed":
+                return job, "idempotency-key"
+            document = await run_in_threadpool(document_store.get, record["documentId"]) if record["documentId"] else None
+            if document:
+                return job_queue.complete(spooled.filename, document, job_id=record["jobId"], deduplicated="idempotency-key"), "idempotency-key"
+
+    job = in_flight.get(spooled.sha256)
+    if job:
+        return job, "in-flight"
+    document = await run_in_threadpool(document_store.find_by_hash, spooled.sha256)
+    if document:
+        return job_queue.complete(spooled.filename, document, deduplicated="content-hash"), "content-hash"
+    # The same bytes may have been queued while the store was checked
+    job = in_flight.get(spooled.sha256)
+    return (job, "in-flight") if job else (None, None)
+
+async def submit_upload(spooled, content_type: str, analysis_mode: str, idempotency_key: Optional[str] = None, wait: bool = False):
+    """
+    Queue an upload unless an earlier result answers it. With `wait`, waits for
+    room in the queue instead of raising QueueFullError. The spool file is
+    owned by the job, or removed if no job is queued.
+    """
+    try:
+        job, reason = await find_earlier_result(spooled, idempotency_key)
+    except BaseException:
+        spooled.discard()
+        raise
+    dedup_stats.upload()
+    if not job:
+        payload = {
+            "path": spooled.path,
+            "content_type": content_type,
+            "size": spooled.size,
+            "sha256": spooled.sha256,
+            "analysis_mode": analysis_mode,
+            "idempotency_key": idempotency_key,
+        }
+        try:
+            job = await (job_queue.put if wait else job_queue.submit)(spooled.filename, payload)
+        except JobInFlightError as e:
+            # Another server process is processing the same bytes
+            job, reason = e.job, "in-flight"
+        except BaseException:
+            spooled.discard()
+            raise
+        else:
+            in_flight[spooled.sha256] = job
+    if reason:
+        spooled.discard()
+        dedup_stats.hit(reason)
+    if idempotency_key and reason != "idempotency-key":
+        await run_in_threadpool(idempotency_store.put, idempotency_key, spooled.sha256, job.id, (job.status.document or {}).get("id"))
+    return job
+
+# Point-in-time values read when /metrics is scraped
+Gauge("job_queue_depth", "Jobs waiting for a worker.", lambda: job_queue.stats()["queueDepth"])
+Gauge("job_workers_busy", "Workers currently processing a job.", lambda: job_queue.stats()["busyWorkers"])
+Gauge("event_subscribers", "Connected server-sent event clients.", lambda: event_broker.stats()["subscribers"])
+
+@app.on_event("startup")
+async def start_job_queue():
+    await extraction_pool.start()
+    await page_ocr.start()
+    await job_queue.start()
+    await event_broker.start()
+    if job_store:
+        # Jobs left unfinished by server processes that have since exited
+        asyncio.get_running_loop().run_in_executor(None, job_store.fail_orphans)
+    if CLASSIFIER_ENABLED:
+        # Uploads fall back to the model until training finishes
+        asyncio.get_running_loop().run_in_executor(None, train_classifier)
+    if vector_index.wants_training:
+        # Flat search is used until the IVF clusters are trained
+        asyncio.get_running_loop().run_in_executor(None, vector_index.train)
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    # Drain queued and running jobs (up to JOB_DRAIN_TIMEOUT); the rest are failed
+    for job in await job_queue.stop():
+        try:
+            os.unlink(job.payload["path"])
+        except (KeyError, FileNotFoundError):
+            pass
+    await event_broker.stop()
+    if job_store:
+        job_store.close()
+    await inference_backend.close()
+    extraction_pool.shutdown()
+    page_ocr.shutdown()
+    document_store.close()
+    search_index.close()
+    vector_index.close()
+    blob_store.close()
+    idempotency_store.close()
+
+async def detect_content_type(spooled) -> str:
+    """
+    Sniff a spooled upload's type from its bytes rather than trusting the one
+    the client declared; the spool file is removed if it isn't supported.
+    """
+    content_type = await run_in_threadpool(sniff_content_type, spooled.path, spooled.filename, spooled.content_type)
+    if content_type is None:
+        spooled.discard()
+        formats = ", ".join(extractor.name for extractor in EXTRACTORS.values())
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Supported formats: {formats}.")
+    return content_type
+
+# The body is parsed by utils/spool.py rather than FastAPI, so describe it for the docs
+UPLOAD_REQUEST_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                },
+            },
+        },
+    },
+}
+
+@app.post("/upload", status_code=202, openapi_extra=UPLOAD_REQUEST_SCHEMA)
+async def upload_file(request: Request, analysis_mode: str = Query(ANALYSIS_MODE), idempotency_key: Optional[str] = Header(None)):
+    # Validate analysis mode
+    if analysis_mode not in ANALYSIS_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid analysis mode. Use one of: {', '.join(ANALYSIS_MODES)}.")
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters.")
+
+    # Stream the file to a spool file, then tell its type from its first bytes;
+    # the job removes the spool file once processed
+    start = time.perf_counter()
+    spooled = await spool_upload(request)
+    spool_ms = round((time.perf_counter() - start) * 1000, 2)
+    if not spooled.size:
+        spooled.discard()
+        raise HTTPException(status_code=400, detail="The file is empty.")
+    content_type = await detect_content_type(spooled)
+
+    # Retries and repeated files are answered with the earlier job or document
+    try:
+        job = await submit_upload(spooled, content_type, analysis_mode, idempotency_key)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    job.status.stageTimings.setdefault("spool", spool_ms)
+
+    return job.status
+
+# Many files, or ZIP archives, in one multipart form; a ZIP may also be sent as the raw body
+BULK_UPLOAD_REQUEST_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                    "required": ["files"],
+                },
+            },
+            "application/zip": {"schema": {"type": "string", "format": "binary"}},
+        },
+    },
+}
+
+@app.post("/upload/bulk", openapi_extra=BULK_UPLOAD_REQUEST_SCHEMA)
+async def upload_bulk(request: Request, analysis_mode: str = Query(ANALYSIS_MODE)):
+    # Validate analysis mode
+    if analysis_mode not in ANALYSIS_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid analysis mode. Use one of: {', '.join(ANALYSIS_MODES)}.")
+
+    # Spool the whole request first, within the size and file limits; ZIP entries are unpacked as they are processed.
+    # Admission caps the bulk uploads on disk at once, and the space they can take.
+    reservation = bulk_admission.admit(request)
+    try:
+        files = await spool_bulk_upload(request)
+    except BaseException:
+        reservation.release()
+        raise
+
+    async def submit(spooled):
+        if not spooled.size:
+            raise HTTPException(status_code=400, detail="The file is empty.")
+        content_type = await detect_content_type(spooled)
+        # Waits for room in the job queue rather than failing with 503
+        return await submit_upload(spooled, content_type, analysis_mode, wait=True)
+
+    # One JSON line per file as it finishes, then a summary line
+    # Jobs may belong to another server process, so finishing is checked through the queue
+    async def lines():
+        try:
+            async for result in stream_bulk_results(iter_bulk_entries(files), submit, wait=job_queue.wait):
+                yield json.dumps(result) + "\n"
+        finally:
+            reservation.release()
+
+    # Also released in the background, in case the stream never starts
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(reservation.release))
+
+@app.get("/jobs")
+async def get_jobs(ids: List[str] = Query(...)):
+    # Batch status lookup; unknown ids are omitted
+    jobs = [await job_queue.find(job_id) for job_id in ids]
+    return [job.status for job in jobs if job]
+
+@app.get("/jobs/stats")
+async def get_job_stats():
+    return {**job_queue.stats(), "extraction": extraction_pool.stats(), "ocr": page_ocr.stats(), "events": event_broker.stats(), "dedup": dedup_stats.stats(), "bulk": bulk_admission.stats()}
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition format
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/events")
+async def stream_events(job_ids: Optional[List[str]] = Query(None)):
+    # Server-sent events for the given jobs (or all jobs). Each watched job's current
+    # status is sent first, so events published before the client connected aren't missed.
+    subscriber = event_broker.subscribe(job_ids)
+    snapshot = []
+    for job_id in job_ids or []:
+        job = await job_queue.find(job_id)
+        if job:
+            snapshot.append({"type": "snapshot", "jobId": job.id, **job.status.dict()})
+    return StreamingResponse(
+        event_broker.stream(subscriber, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    documents.append(document)
 
-    return document
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    job = await job_queue.find(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    # Optionally long-poll until the job finishes
+    await job_queue.wait(job, wait)
+    return job.status
+
+@app.get("/admin/cache")
+async def get_cache_stats():
+    return result_cache.stats()
+
+@app.get("/admin/inference")
+async def get_inference_stats():
+    return inference_backend.stats()
+
+@app.get("/admin/classifier")
+async def get_classifier_stats():
+    return {"enabled": CLASSIFIER_ENABLED, **classifier.stats()}
+
+@app.get("/admin/blobs")
+async def get_blob_stats():
+    return await run_in_threadpool(blob_store.stats)
+
+@app.get("/admin/vectors")
+async def get_vector_stats():
+    return await run_in_threadpool(vector_index.stats)
+
+@app.post("/admin/vectors/train")
+async def train_vector_index():
+    # Cluster the vectors for IVF search; slow on large indexes
+    trained = await run_in_threadpool(vector_index.train)
+    return {"trained": trained, **await run_in_threadpool(vector_index.stats)}
+
+@app.delete("/admin/cache")
+async def clear_cache():
+    removed = await run_in_threadpool(result_cache.clear)
+    return {"message": "Cache cleared successfully", "removed": removed}
+
+@app.delete("/admin/cache/{key}")
+async def invalidate_cache_entry(key: str):
+    if not await run_in_threadpool(result_cache.invalidate, key):
+        raise HTTPException(status_code=404, detail="Cache entry not found.")
+    return {"message": "Cache entry invalidated successfully"}
 
 @app.get("/documents")
-async def get_documents():
-    return documents
+async def get_documents(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    uploaded_after: Optional[str] = None,
+    uploaded_before: Optional[str] = None,
+    sort: str = "uploadDate",
+    order: str = "desc",
+    fields: Optional[str] = None,
+    include_total: bool = False,
+):
+    # Validate sorting and projection
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort field. Use one of: {', '.join(SORT_FIELDS)}.")
+    if order not in SORT_ORDERS:
+        raise HTTPException(status_code=400, detail="Invalid sort order. Use asc or desc.")
+    selected = None
+    if fields:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}.")
+
+    filters = {"category": category, "uploaded_after": uploaded_after, "uploaded_before": uploaded_before}
+    try:
+        items, next_cursor = await run_in_threadpool(
+            document_store.query, sort=sort, order=order, limit=limit, cursor=cursor, fields=selected, **filters
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    total = await run_in_threadpool(document_store.count, **filters) if include_total else None
+
+    return {"items": items, "nextCursor": next_cursor, "total": total}
+
+@app.get("/search")
+async def search_documents(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    prefix: bool = False,
+):
+    matches = await run_in_threadpool(search_index.search, q, limit, offset, prefix)
+    return {"items": await with_metadata(matches)}
+
+@app.get("/search/semantic")
+async def semantic_search(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=100)):
+    embedding = await run_in_threadpool(vector_index.embed, q)
+    matches = await run_in_threadpool(vector_index.search, embedding, limit)
+    return {"items": await with_metadata(matches)}
+
+@app.get("/documents/{document_id}/similar")
+async def get_similar_documents(document_id: str, limit: int = Query(10, ge=1, le=100)):
+    embedding = await run_in_threadpool(vector_index.vector, document_id)
+    if embedding is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    matches = await run_in_threadpool(vector_index.search, embedding, limit, document_id)
+    return {"items": await with_metadata(matches)}
+
+async def with_metadata(matches):
+    """
+    Attach metadata to each match, skipping documents deleted since they were indexed.
+    """
+    items = []
+    for match in matches:
+        document = await run_in_threadpool(document_store.get, match["id"])
+        if document:
+            items.append({**document, **{key: value for key, value in match.items() if key != "id"}})
+    return items
+
+@app.api_route("/documents/{document_id}/file", methods=["GET", "HEAD"])
+async def download_document(document_id: str, request: Request):
+    document = await run_in_threadpool(document_store.get, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    # Documents uploaded before originals were kept have no blob
+    size = await run_in_threadpool(blob_store.size, document["contentHash"]) if document.get("contentHash") else None
+    if size is None:
+        raise HTTPException(status_code=404, detail="The original file is not available for this document.")
+    return BlobResponse(blob_store, document["contentHash"], size, request.headers, document["title"], document["contentType"], request.method)
 
 @app.delete("/delete/{document_id}")
 async def delete_document(document_id: str):
-    global documents
-    documents = [doc for doc in documents if doc.id != document_id]
+    document = await run_in_threadpool(document_store.get, document_id)
+    deleted = await run_in_threadpool(document_store.delete, document_id)
+    await run_in_threadpool(search_index.remove, document_id)
+    await run_in_threadpool(vector_index.remove, document_id)
+    # Only the request that removed the document drops its blob reference
+    if deleted and document.get("contentHash"):
+        await run_in_threadpool(blob_store.release, document["contentHash"])
     return {"message": "Document deleted successfully"}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # One server process per core unless WEB_WORKERS says otherwise. Exported so every
+    # worker process reads the same count when it imports the app and agrees on SHARED_STATE.
+    workers = max(1, int(os.getenv("WEB_WORKERS") or os.cpu_count() or 1))
+    os.environ["WEB_WORKERS"] = str(workers)
+    if workers > 1:
+        # Each worker process imports the app by name
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# main.py opens its databases when imported; the tests' copies go in a temporary
+# directory instead of data/. Set before any test module imports utils.
+DATA_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+for variable, name in (
+    ("DOCUMENT_DB", "documents.db"),
+    ("SEARCH_DB", "search.db"),
+    ("IDEMPOTENCY_DB", "idempotency.db"),
+    ("JOB_DB", "jobs.db"),
+    ("EVENTS_DB", "events.db"),
+    ("OCR_CACHE_DB", "ocr.db"),
+    ("BLOB_DIR", "blobs"),
+    ("VECTOR_DIR", "vectors"),
+):
+    os.environ[variable] = os.path.join(DATA_DIR, name)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def app():
+    """
+    The application module with its queue and pools started, and a client
+    for it. Shared by the tests, so each uploads content of its own.
+    """
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield main, client
+
+
+@pytest.fixture
+def model(app, monkeypatch):
+    """
+    Answer inference prompts with `model.reply(prompt)`, a fixed analysis by
+    default. The classifier is off, so every category comes from the model.
+    """
+    main, _ = app
+
+    class Model:
+        prompts = []
+
+        @staticmethod
+        def reply(prompt: str) -> str:
+            return "Category: Invoice\nSummary: An invoice."
+
+    async def generate(prompts, max_length):
+        Model.prompts.extend(prompts)
+        return [Model.reply(prompt) for prompt in prompts]
+
+    monkeypatch.setattr(main.inference_backend, "_generate", generate)
+    monkeypatch.setattr(main, "CLASSIFIER_ENABLED", False)
+    return Model
@@ -0,0 +1,180 @@
+import asyncio
+import uuid
+
+import pytest
+
+from utils import analysis
+from utils.analysis import DEFAULT_CATEGORY, DEFAULT_SUMMARY, parse_analysis, summarize_chunks
+from utils.cache import ResultCache
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Category: Invoice\nSummary: An invoice for consulting services.", ("Invoice", "An invoice for consulting services.")),
+    ("  category :  Legal contract.\n summary: A lease agreement.", ("Legal contract", "A lease agreement.")),
+    ("Category: Invoice Summary: A bill.", ("Invoice", "A bill.")),
+    ("Category: Invoice; Summary: A bill.", ("Invoice", "A bill.")),
+    ("Category: Invoice | Summary: A bill.", ("Invoice", "A bill.")),
+    ("Summary: A bill for March.\nCategory: Invoice", ("Invoice", "A bill for March.")),
+    ("Here you go.\nCategory: Report\nSummary: Monthly figures.\nAnything else?", ("Report", "Monthly figures.")),
+])
+def test_labelled_fields_are_parsed(text, expected):
+    assert parse_analysis(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "   ",
+    "Invoice",
+    "The document is an invoice for consulting services.",
+    "Category: Invoice",
+    "Summary: A bill.",
+    "Category:\nSummary: A bill.",
+    "Category: Invoice\nSummary:   ",
+    "Category: .\nSummary: A bill.",
+])
+def test_missing_fields_fall_back(text):
+    assert parse_analysis(text) is None
+
+
+def analysis_model(model, combined: str, category: str = "Receipt", summary: str = "A store receipt."):
+    """
+    Answer the combined prompt with `combined` and the separate ones with `category` and `summary`.
+    """
+    def reply(prompt: str) -> str:
+        if "Respond in exactly this format" in prompt:
+            return combined
+        if "category label" in prompt:
+            return category
+        return summary
+
+    model.reply = staticmethod(reply)
+
+
+def analyze(client, mode: str = "combined"):
+    text = "Receipt " + " ".join(str(uuid.uuid4()) for _ in range(8))
+    job = client.post("/upload", params={"analysis_mode": mode}, files={"file": ("receipt.txt", text.encode(), "text/plain")}).json()
+    return client.get(f"/jobs/{job['id']}", params={"wait": 30}).json()
+
+
+def test_combined_answer_is_used_when_it_parses(app, model):
+    _, client = app
+    analysis_model(model, "Category: Receipt\nSummary: A grocery receipt.")
+
+    job = analyze(client)
+
+    assert job["analysisMode"] == "combined"
+    assert (job["document"]["category"], job["document"]["summary"]) == ("Receipt", "A grocery receipt.")
+    assert len(model.prompts) == 1
+
+
+def test_unparsable_combined_answer_falls_back_to_separate_requests(app, model):
+    _, client = app
+    analysis_model(model, "I think this is a receipt.")
+
+    job = analyze(client)
+
+    assert job["analysisMode"] == "combined-fallback"
+    assert (job["document"]["category"], job["document"]["summary"]) == ("Receipt", "A store receipt.")
+    assert len(model.prompts) == 3
+
+
+def test_empty_answers_get_the_defaults(app, model):
+    _, client = app
+    analysis_model(model, "", category="", summary="")
+
+    job = analyze(client, "separate")
+
+    assert job["analysisMode"] == "separate"
+    assert (job["document"]["category"], job["document"]["summary"]) == (DEFAULT_CATEGORY, DEFAULT_SUMMARY)
+
+
+@pytest.fixture
+def sections(monkeypatch):
+    """
+    Answer summary prompts with "summary of <first word of the text>", recording the prompts and peak concurrency.
+    """
+    calls = {"prompts": [], "running": 0, "peak": 0}
+
+    async def generate(prompt: str, max_length: int) -> str:
+        calls["prompts"].append(prompt)
+        calls["running"] += 1
+        calls["peak"] = max(calls["peak"], calls["running"])
+        await asyncio.sleep(0.01)
+        calls["running"] -= 1
+        text = prompt.split("Content:", 1)[1].split()
+        return f"summary of {text[0]}" if text else ""
+
+    monkeypatch.setattr(analysis, "generate", generate)
+    return calls
+
+
+def test_chunks_are_summarized_then_combined(sections):
+    chunks = [f"part{index} lorem ipsum." for index in range(5)]
+
+    summary = asyncio.run(summarize_chunks(chunks))
+
+    section_prompts = [prompt for prompt in sections["prompts"] if "section of a longer document" in prompt]
+    assert len(section_prompts) == 5
+    # The final prompt summarizes the section summaries, in chunk order
+    reduce_prompt = sections["prompts"][-1]
+    assert reduce_prompt.index("summary of part0") < reduce_prompt.index("summary of part4")
+    assert summary == "summary of summary"
+
+
+def test_section_requests_are_capped(sections, monkeypatch):
+    monkeypatch.setattr(analysis, "SUMMARY_FANOUT", 2)
+
+    asyncio.run(summarize_chunks([f"part{index}" for index in range(6)]))
+
+    assert sections["peak"] == 2
+
+
+def test_unchanged_sections_come_from_the_cache(sections):
+    cache = ResultCache(db_path="")
+    asyncio.run(summarize_chunks(["alpha text.", "beta text.", "gamma text."], cache))
+    sections["prompts"].clear()
+
+    asyncio.run(summarize_chunks(["alpha text.", "delta text.", "gamma text."], cache))
+
+    section_prompts = [prompt for prompt in sections["prompts"] if "section of a longer document" in prompt]
+    assert len(section_prompts) == 1
+    assert "delta text." in section_prompts[0]
+
+
+def test_empty_section_summaries_are_left_out(sections):
+    assert asyncio.run(summarize_chunks(["   ", "part1 text."])) == "summary of summary"
+    assert sections["prompts"][-1].count("summary of") == 1
+    assert asyncio.run(summarize_chunks(["  ", " "])) == DEFAULT_SUMMARY
+
+
+def test_long_section_summaries_are_reduced_again(sections, monkeypatch):
+    monkeypatch.setattr(analysis, "CHUNK_TOKENS", 10)
+
+    asyncio.run(summarize_chunks([f"part{index}" for index in range(6)]))
+
+    # Six section summaries don't fit in one request, so they are summarized as sections again
+    section_prompts = [prompt for prompt in sections["prompts"] if "section of a longer document" in prompt]
+    assert len(section_prompts) > 6
+    assert "Summarize the following document content" in sections["prompts"][-1]
+
+
+def test_long_document_is_summarized_by_map_reduce(app, model):
+    _, client = app
+
+    def reply(prompt: str) -> str:
+        if "category label" in prompt:
+            return "Handbook"
+        return "Policies." if "section of a longer document" in prompt else "An employee handbook."
+
+    model.reply = staticmethod(reply)
+    paragraphs = [f"Section {index} {uuid.uuid4()}. " + "Employees follow the policy on leave and travel. " * 20 for index in range(6)]
+    job = client.post("/upload", files={"file": ("handbook.txt", "\n".join(paragraphs).encode(), "text/plain")}).json()
+    job = client.get(f"/jobs/{job['id']}", params={"wait": 30}).json()
+
+    assert job["analysisMode"] == "map-reduce"
+    assert job["summaryChunks"] > 1
+    assert (job["document"]["category"], job["document"]["summary"]) == ("Handbook", "An employee handbook.")
+    # The category comes from the opening chunk only
+    category_prompt = next(prompt for prompt in model.prompts if "category label" in prompt)
+    assert "Section 0" in category_prompt
+    assert "Section 5" not in category_prompt
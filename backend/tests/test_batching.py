@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from utils.batching import MicroBatcher
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+
+    async def run(self, items, key):
+        self.batches.append((key, list(items)))
+        return [f"{key}:{item}" for item in items]
+
+
+def test_partial_batch_is_sent_when_the_window_expires():
+    recorder = Recorder()
+
+    async def run():
+        batcher = MicroBatcher(recorder.run, window_ms=20, max_batch=10)
+        start = asyncio.get_running_loop().time()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        return results, asyncio.get_running_loop().time() - start
+
+    results, elapsed = asyncio.run(run())
+
+    assert results == ["None:1", "None:2"]
+    assert recorder.batches == [(None, [1, 2])]
+    assert elapsed >= 0.015
+
+
+def test_full_batch_is_sent_without_waiting():
+    recorder = Recorder()
+
+    async def run():
+        batcher = MicroBatcher(recorder.run, window_ms=10_000, max_batch=2)
+        return await asyncio.wait_for(asyncio.gather(batcher.submit(1), batcher.submit(2)), 1)
+
+    assert asyncio.run(run()) == ["None:1", "None:2"]
+    assert recorder.batches == [(None, [1, 2])]
+
+
+def test_items_are_batched_by_key():
+    recorder = Recorder()
+
+    async def run():
+        batcher = MicroBatcher(recorder.run, window_ms=10, max_batch=10)
+        return await asyncio.gather(batcher.submit(1, "a"), batcher.submit(2, "b"), batcher.submit(3, "a"))
+
+    assert asyncio.run(run()) == ["a:1", "b:2", "a:3"]
+    assert sorted(recorder.batches) == [("a", [1, 3]), ("b", [2])]
+
+
+def test_failed_batch_fails_every_caller():
+    async def fail(items, key):
+        raise RuntimeError("model unavailable")
+
+    async def run():
+        batcher = MicroBatcher(fail, window_ms=5, max_batch=10)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_caller_is_dropped_from_the_batch():
+    recorder = Recorder()
+
+    async def run():
+        batcher = MicroBatcher(recorder.run, window_ms=20, max_batch=10)
+        gone = asyncio.ensure_future(batcher.submit(1))
+        kept = asyncio.ensure_future(batcher.submit(2))
+        await asyncio.sleep(0)
+        gone.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await gone
+        return await kept
+
+    assert asyncio.run(run()) == "None:2"
+    assert recorder.batches == [(None, [2])]
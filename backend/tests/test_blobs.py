@@ -0,0 +1,276 @@
+import hashlib
+import io
+import os
+import uuid
+
+import pytest
+
+from utils.blobs import LocalBlobStore, S3BlobStore, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 1000)),
+    ("bytes=900-5000", (900, 1000)),
+    ("bytes=-100", (900, 1000)),
+    ("bytes=-5000", (0, 1000)),
+    ("bytes= 10-19", (10, 20)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-10",
+    "bytes=0-10,20-30",
+    "bytes=10",
+    "bytes=-",
+    "bytes=a-10",
+    "bytes=10-b",
+    "bytes=-1-2",
+    "bytes=20-10",
+])
+def test_unusable_headers_send_the_whole_file(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+class FakeS3Error(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.response = {"ResponseMetadata": {"HTTPStatusCode": status}}
+
+
+class FakeS3:
+    """
+    The object methods S3BlobStore uses, over a dict.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error(404)
+        return {"ContentLength": len(self.objects[Bucket, Key])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Bucket, Key] = Body.read()
+        self.puts += 1
+
+    def get_object(self, Bucket, Key, Range):
+        first, last = Range[len("bytes="):].split("-")
+        return {"Body": io.BytesIO(self.objects[Bucket, Key][int(first):int(last) + 1])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+def spool(tmp_path, data: bytes):
+    path = tmp_path / f"upload-{uuid.uuid4().hex}"
+    path.write_bytes(data)
+    return str(path), hashlib.sha256(data).hexdigest(), len(data)
+
+
+def test_local_identical_uploads_share_one_blob(tmp_path):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    first = spool(tmp_path, b"same bytes")
+    second = spool(tmp_path, b"same bytes")
+
+    assert store.add(*first) is True
+    assert store.add(*second) is False
+
+    sha256 = first[1]
+    with open(store.local_path(sha256), "rb") as f:
+        assert f.read() == b"same bytes"
+    assert store.stats() == {
+        "backend": "local",
+        "blobs": 1,
+        "references": 2,
+        "storedBytes": 10,
+        "referencedBytes": 20,
+        "dedupRatio": 2.0,
+    }
+    # The first upload was moved into place; the second is left to its owner
+    assert not os.path.exists(first[0])
+    assert os.path.exists(second[0])
+    store.close()
+
+
+def test_local_blob_is_deleted_with_its_last_reference(tmp_path):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    path, sha256, size = spool(tmp_path, b"x" * 1000)
+    store.add(path, sha256, size)
+    store.add(*spool(tmp_path, b"x" * 1000))
+
+    store.release(sha256)
+    assert os.path.exists(store.local_path(sha256))
+    assert store.size(sha256) == 1000
+
+    store.release(sha256)
+    assert not os.path.exists(store.local_path(sha256))
+    assert store.size(sha256) is None
+    assert store.stats()["blobs"] == 0
+    store.close()
+
+
+def test_local_blob_reads_ranges_in_chunks(tmp_path, monkeypatch):
+    from utils import blobs
+
+    monkeypatch.setattr(blobs, "BLOB_CHUNK_BYTES", 4)
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    path, sha256, size = spool(tmp_path, b"0123456789")
+    store.add(path, sha256, size)
+
+    assert list(store.read(sha256, 2, 9)) == [b"2345", b"678"]
+    store.close()
+
+
+def test_s3_stores_each_content_once_and_deletes_it_with_the_last_reference(tmp_path):
+    client = FakeS3()
+    store = S3BlobStore("bucket", "blobs/", client=client, db_path=str(tmp_path / "blobs.db"))
+    path, sha256, size = spool(tmp_path, b"0123456789")
+
+    assert store.add(path, sha256, size) is True
+    assert store.add(*spool(tmp_path, b"0123456789")) is False
+
+    assert client.puts == 1
+    assert list(client.objects) == [("bucket", f"blobs/{sha256[:2]}/{sha256}")]
+    assert b"".join(store.read(sha256, 3, 7)) == b"3456"
+    assert list(store.read(sha256, 5, 5)) == []
+    store.release(sha256)
+    assert client.objects
+    store.release(sha256)
+    assert not client.objects
+    store.close()
+
+
+def test_s3_object_deleted_after_staging_is_uploaded_again(tmp_path):
+    client = FakeS3()
+    store = S3BlobStore("bucket", "", client=client, db_path=str(tmp_path / "blobs.db"))
+    path, sha256, size = spool(tmp_path, b"contract")
+    store.add(*spool(tmp_path, b"contract"))
+    # Released by another process between this upload's check and its commit
+    client.objects.clear()
+
+    store._commit(path, None, sha256)
+
+    assert b"".join(store.read(sha256, 0, size)) == b"contract"
+    store.close()
+
+
+def test_s3_errors_other_than_not_found_propagate(tmp_path):
+    class Unavailable(FakeS3):
+        def head_object(self, Bucket, Key):
+            raise FakeS3Error(503)
+
+    store = S3BlobStore("bucket", "", client=Unavailable(), db_path=str(tmp_path / "blobs.db"))
+
+    with pytest.raises(FakeS3Error):
+        store.add(*spool(tmp_path, b"contract"))
+    assert store.stats()["blobs"] == 0
+    store.close()
+
+
+@pytest.fixture
+def stored_file(app, model):
+    _, client = app
+    data = f"Original file {uuid.uuid4()}\n".encode() * 10
+    job = client.post("/upload", files={"file": ("notes.txt", data, "text/plain")}).json()
+    document = client.get(f"/jobs/{job['id']}", params={"wait": 30}).json()["document"]
+    return client, f"/documents/{document['id']}/file", data
+
+
+def test_file_is_served_with_its_hash_as_etag(stored_file):
+    client, url, data = stored_file
+
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["etag"] == f'"{hashlib.sha256(data).hexdigest()}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(len(data))
+    assert response.headers["content-disposition"] == "inline; filename*=UTF-8''notes.txt"
+
+
+def test_matching_etag_is_not_modified(stored_file):
+    client, url, _ = stored_file
+    etag = client.head(url).headers["etag"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_byte_ranges(stored_file):
+    client, url, data = stored_file
+
+    partial = client.get(url, headers={"Range": "bytes=5-14"})
+    assert partial.status_code == 206
+    assert partial.content == data[5:15]
+    assert partial.headers["content-range"] == f"bytes 5-14/{len(data)}"
+
+    tail = client.get(url, headers={"Range": "bytes=-4"})
+    assert tail.content == data[-4:]
+
+    unsatisfiable = client.get(url, headers={"Range": f"bytes={len(data)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(data)}"
+
+
+def test_range_is_ignored_when_if_range_is_stale(stored_file):
+    client, url, data = stored_file
+    etag = client.head(url).headers["etag"]
+
+    assert client.get(url, headers={"Range": "bytes=0-3", "If-Range": etag}).status_code == 206
+    stale = client.get(url, headers={"Range": "bytes=0-3", "If-Range": '"old"'})
+    assert stale.status_code == 200
+    assert stale.content == data
+
+
+def test_head_sends_headers_only(stored_file):
+    client, url, data = stored_file
+
+    response = client.head(url)
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(data))
+    assert response.content == b""
+
+
+def test_missing_document_file(app):
+    _, client = app
+
+    assert client.get(f"/documents/{uuid.uuid4()}/file").status_code == 404
+
+
+def test_s3_blob_ranges_are_streamed(tmp_path):
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+    from starlette.testclient import TestClient
+
+    from utils.blobs import BlobResponse
+
+    store = S3BlobStore("bucket", "", client=FakeS3(), db_path=str(tmp_path / "blobs.db"))
+    path, sha256, size = spool(tmp_path, b"0123456789")
+    store.add(path, sha256, size)
+
+    async def download(request):
+        return BlobResponse(store, sha256, size, request.headers, "digits.txt", "text/plain", request.method)
+
+    client = TestClient(Starlette(routes=[Route("/file", download, methods=["GET", "HEAD"])]))
+    response = client.get("/file", headers={"Range": "bytes=2-5"})
+
+    assert response.status_code == 206
+    assert response.content == b"2345"
+    assert client.get("/file").content == b"0123456789"
+    store.close()
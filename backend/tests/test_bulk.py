@@ -0,0 +1,198 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+
+from utils import bulk, jobs, spool
+from utils.bulk import BulkAdmission, iter_bulk_entries, stream_bulk_results
+from utils.jobs import Job, JobQueue, JobStore, _from_status
+from utils.spool import SpooledFile
+
+
+async def no_handler(job):
+    raise AssertionError("Foreign jobs are never run here")
+
+
+def make_foreign(store: JobStore, worker: int) -> Job:
+    # A job saved as if another server process had accepted it
+    job = Job("report.pdf", {"sha256": "abc"})
+    store.save(job.status, "abc")
+    connection = store._db.connection()
+    connection.execute("UPDATE jobs SET worker = ? WHERE id = ?", (worker, job.id))
+    connection.commit()
+    return job
+
+
+def spooled_file(tmp_path) -> SpooledFile:
+    path = tmp_path / "upload"
+    path.write_bytes(b"%PDF-1.4")
+    return SpooledFile(str(path), "report.pdf", "application/pdf", 8, "abc")
+
+
+async def collect(store: JobStore, foreign: Job, tmp_path):
+    queue = JobQueue(no_handler, store=store)
+
+    async def entries():
+        yield "report.pdf", spooled_file(tmp_path), None
+
+    async def submit(spooled):
+        # What submit_upload returns when JobInFlightError names the other process's job
+        spooled.discard()
+        return _from_status(store.get(foreign.id))
+
+    results = stream_bulk_results(entries(), submit, wait=queue.wait)
+    return await asyncio.wait_for(_gather(results), 5)
+
+
+async def _gather(results):
+    return [result async for result in results]
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL", 0.01)
+
+
+def test_duplicate_in_flight_in_another_process_is_reported_when_it_finishes(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    foreign = make_foreign(store, os.getppid())
+
+    async def run():
+        async def finish_elsewhere():
+            await asyncio.sleep(0.1)
+            foreign.status.status = "completed"
+            foreign.status.document = {"id": "doc-1"}
+            store.save(foreign.status, "abc")
+
+        finisher = asyncio.create_task(finish_elsewhere())
+        results = await collect(store, foreign, tmp_path)
+        await finisher
+        return results
+
+    results = asyncio.run(run())
+    store.close()
+
+    assert results[0]["jobId"] == foreign.id
+    assert results[0]["status"] == "completed"
+    assert results[0]["document"] == {"id": "doc-1"}
+    assert results[-1]["summary"]["completed"] == 1
+
+
+def test_duplicate_in_flight_in_an_exited_process_is_reported_failed(tmp_path):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    store = JobStore(str(tmp_path / "jobs.db"))
+    foreign = make_foreign(store, exited.pid)
+
+    results = asyncio.run(collect(store, foreign, tmp_path))
+    store.close()
+
+    assert results[0]["status"] == "failed"
+    assert results[0]["error"] == jobs.SHUTDOWN_ERROR
+    assert results[-1]["summary"]["failed"] == 1
+
+
+def spooled_zip(tmp_path, names) -> SpooledFile:
+    path = tmp_path / "upload.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        for name in names:
+            archive.writestr(name, b"%PDF-1.4 " + name.encode())
+    return SpooledFile(str(path), "upload.zip", "application/zip", path.stat().st_size, "zip")
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "spool"
+    directory.mkdir()
+    monkeypatch.setattr(spool, "SPOOL_DIR", str(directory))
+    return directory
+
+
+def test_entries_past_the_limit_are_skipped_and_removed(tmp_path, spool_dir):
+    files = [spooled_zip(tmp_path, [f"{index}.pdf" for index in range(5)]), spooled_file(tmp_path)]
+
+    async def run():
+        entries = []
+        async for name, spooled, error in iter_bulk_entries(files, max_files=3):
+            entries.append((name, error))
+            if spooled:
+                spooled.discard()
+        return entries
+
+    entries = asyncio.run(run())
+
+    assert [name for name, _ in entries] == ["0.pdf", "1.pdf", "2.pdf", "upload.zip"]
+    assert "limit is 3" in entries[-1][1]
+    assert not any(os.path.exists(spooled.path) for spooled in files)
+    assert not os.listdir(spool_dir)
+
+
+def test_closing_the_stream_removes_unsubmitted_files(tmp_path, spool_dir):
+    files = [spooled_zip(tmp_path, ["a.pdf", "b.pdf", "c.pdf"]), spooled_file(tmp_path)]
+    submitted = []
+
+    async def submit(spooled):
+        submitted.append(spooled.filename)
+        spooled.discard()
+        return Job(spooled.filename, {})
+
+    async def never(job):
+        await asyncio.Event().wait()
+
+    async def run():
+        results = stream_bulk_results(iter_bulk_entries(files), submit, max_in_flight=1, wait=never)
+        reader = asyncio.ensure_future(results.__anext__())
+        # The second entry is spooled and waiting for a slot
+        await asyncio.sleep(0.2)
+        # As when the client disconnects and the response task is cancelled
+        reader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await reader
+
+    asyncio.run(run())
+
+    assert submitted == ["a.pdf"]
+    assert not any(os.path.exists(spooled.path) for spooled in files)
+    assert not os.listdir(spool_dir)
+
+
+class FakeRequest:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_admission_limits_uploads_and_spool_space(spool_dir, monkeypatch):
+    free = shutil.disk_usage(str(spool_dir)).free
+    admission = BulkAdmission(max_uploads=2, min_free_bytes=free - 3_000_000)
+    request = FakeRequest({"content-type": "multipart/form-data; boundary=x", "content-length": "1000000"})
+
+    first = admission.admit(request)
+    # Fits in the space left, but not with the first upload's reservation
+    with pytest.raises(HTTPException) as error:
+        admission.admit(FakeRequest({"content-type": "application/zip", "content-length": "2500000"}))
+    assert error.value.status_code == 507
+    second = admission.admit(request)
+    with pytest.raises(HTTPException) as error:
+        admission.admit(request)
+    assert error.value.status_code == 503
+
+    first.release()
+    first.release()
+    assert admission.stats() == {"uploads": 1, "maxUploads": 2, "reservedBytes": 1_000_000, "rejected": 2}
+    admission.admit(request)
+    second.release()
+
+
+def test_admission_reserves_the_limit_without_a_length(spool_dir, monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_TOTAL_BYTES", 5000)
+    admission = BulkAdmission(max_uploads=2, min_free_bytes=0)
+
+    admission.admit(FakeRequest({"content-type": "multipart/form-data; boundary=x"}))
+    admission.admit(FakeRequest({"content-type": "multipart/form-data; boundary=x", "content-length": "99999"}))
+
+    assert admission.stats()["reservedBytes"] == 10000
@@ -0,0 +1,47 @@
+from utils import cache as cache_module
+from utils.cache import ResultCache
+
+
+def disk_cache(tmp_path, **kwargs) -> ResultCache:
+    # No memory tier, so every hit goes to SQLite
+    return ResultCache(max_entries=0, db_path=str(tmp_path / "results.db"), **kwargs)
+
+
+def test_disk_hits_do_not_write(tmp_path):
+    cache = disk_cache(tmp_path)
+    cache.put("a", {"summary": "A"})
+    changes = cache._db.total_changes
+
+    assert cache.get("a") == {"summary": "A"}
+    assert cache.get("a") == {"summary": "A"}
+    assert cache._db.total_changes == changes
+    assert cache.stats()["diskHits"] == 2
+
+
+def test_recency_is_written_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "RESULT_CACHE_TOUCH_BATCH", 2)
+    cache = disk_cache(tmp_path)
+    cache.put("a", {"summary": "A"})
+    cache.put("b", {"summary": "B"})
+    before = dict(cache._db.execute("SELECT key, accessed_at FROM results").fetchall())
+
+    cache.get("a")
+    cache.get("b")
+
+    after = dict(cache._db.execute("SELECT key, accessed_at FROM results").fetchall())
+    assert after["a"] > before["a"] and after["b"] > before["b"]
+    assert not cache._touched
+
+
+def test_eviction_accounts_for_unwritten_hits(tmp_path):
+    cache = disk_cache(tmp_path, max_db_entries=2)
+    cache.put("old", {"summary": "old"})
+    cache.put("newer", {"summary": "newer"})
+    # Only recorded in memory until the next write
+    cache.get("old")
+
+    cache.put("newest", {"summary": "newest"})
+
+    assert cache.get("old") is not None
+    assert cache.get("newer") is None
+    assert cache.get("newest") is not None
@@ -0,0 +1,45 @@
+import random
+
+from utils.chunking import Chunker, chunk_text, count_tokens
+from utils.extraction import join_pages
+
+WORDS = "alpha beta gamma delta invoice total. Payment due! Items: net 30 days".split()
+
+
+def random_pages(rng: random.Random):
+    return [
+        "\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 60))) for _ in range(rng.randint(0, 30)))
+        for _ in range(rng.randint(1, 8))
+    ]
+
+
+def test_feeding_pages_matches_chunking_their_join():
+    rng = random.Random(0)
+    for _ in range(100):
+        pages = random_pages(rng)
+        chunker = Chunker()
+        for page in pages:
+            chunker.feed(page)
+        assert chunker.finish() == chunk_text(join_pages(pages))
+
+
+def test_chunks_stay_under_the_token_limit():
+    text = "\n".join(" ".join(WORDS * 40) for _ in range(10))
+    chunks = chunk_text(text, max_tokens=100, min_tokens=20)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 100 for chunk in chunks)
+
+
+def test_an_edit_leaves_distant_chunks_unchanged():
+    rng = random.Random(1)
+    lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(400)]
+    before = chunk_text("\n".join(lines))
+    lines[200] = "an edited line in the middle"
+    after = chunk_text("\n".join(lines))
+    assert before[:3] == after[:3]
+    assert before[-3:] == after[-3:]
+
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text("") == []
+    assert chunk_text("\n  \n") == []
@@ -0,0 +1,99 @@
+import numpy as np
+
+from utils import classifier as classifier_module
+from utils.classifier import CentroidClassifier, normalize_label
+
+TEXTS = {
+    "Invoice": "invoice payment due amount total billing account",
+    "Contract": "agreement parties term termination clause signed",
+    "Recipe": "flour sugar butter oven bake minutes stir",
+}
+
+
+def trained(**kwargs) -> CentroidClassifier:
+    classifier = CentroidClassifier(features=1024, min_examples=1, **kwargs)
+    for label, text in TEXTS.items():
+        classifier.learn_many([text] * 10, [label] * 10)
+    return classifier
+
+
+def test_predicts_nearest_category():
+    classifier = trained()
+
+    label, score = classifier.predict("invoice payment due for this account")
+
+    assert label == "Invoice"
+    assert score > 0
+
+
+def test_labels_are_normalized():
+    assert normalize_label('  "Legal\n  Contract."  ') == "Legal Contract"
+    assert normalize_label(" ... ") == ""
+
+    classifier = trained()
+    classifier.learn(TEXTS["Invoice"], "  invoice. ")
+
+    assert classifier.stats()["categories"]["Invoice"] == 11
+
+
+def test_label_set_is_capped():
+    classifier = trained(max_categories=3)
+    classifier.learn("weather rain forecast", "Weather")
+
+    stats = classifier.stats()
+    assert "Weather" not in stats["categories"]
+    assert stats["droppedLabels"] == 1
+    assert len(classifier._sums) == 3
+
+
+def test_rows_grow_geometrically():
+    classifier = CentroidClassifier(features=64)
+    capacities = set()
+    for index in range(20):
+        classifier.learn(f"word{index}", f"label {index}")
+        capacities.add(len(classifier._sums))
+
+    assert capacities == {4, 8, 16, 32}
+
+
+def test_learning_updates_only_the_affected_centroid():
+    classifier = trained()
+    classifier.predict("bake the flour")
+    centroids = classifier._centroids
+    before = centroids.copy()
+
+    classifier.learn("oven bake bread", "Recipe")
+
+    assert classifier._centroids is centroids
+    changed = [row for row in range(3) if not np.array_equal(before[row], centroids[row])]
+    assert changed == [classifier._keys["recipe"]]
+
+
+def test_idf_is_rebuilt_after_enough_growth(monkeypatch):
+    monkeypatch.setattr(classifier_module, "CLASSIFIER_IDF_REFRESH", 0.5)
+    classifier = trained()
+    classifier.predict("bake the flour")
+
+    classifier.learn_many([TEXTS["Recipe"]] * 15, ["Recipe"] * 15)
+
+    assert classifier._centroids is None
+
+
+def test_runner_up_margin():
+    classifier = trained(margin=0.99)
+    label, _ = classifier.predict("invoice agreement")
+    assert label is None
+
+    classifier = trained(margin=0.0)
+    label, _ = classifier.predict("invoice payment")
+    assert label == "Invoice"
+
+
+def test_ineligible_category_counts_as_runner_up():
+    classifier = CentroidClassifier(features=1024, min_examples=3, threshold=0.0, margin=0.05)
+    classifier.learn_many([TEXTS["Invoice"]] * 3, ["Invoice"] * 3)
+    classifier.learn(TEXTS["Contract"], "Contract")
+
+    # Contract has too few examples to win, but it still outscores Invoice
+    assert classifier.predict(TEXTS["Contract"])[0] is None
+    assert classifier.predict(TEXTS["Invoice"])[0] == "Invoice"
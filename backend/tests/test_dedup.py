@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+
+from utils.dedup import IdempotencyStore
+
+
+def upload(client, text: str, key: str = None):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post("/upload", files={"file": ("notes.txt", text.encode(), "text/plain")}, headers=headers)
+
+
+def finish(client, job_id: str):
+    return client.get(f"/jobs/{job_id}", params={"wait": 30}).json()
+
+
+def unique_text() -> str:
+    # Mostly words of its own, so it isn't a near duplicate of another test's upload
+    return "Invoice " + " ".join(str(uuid.uuid4()) for _ in range(8))
+
+
+def test_store_remembers_keys_and_their_documents(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.db"))
+
+    store.put("key-1", "hash-1", "job-1")
+    store.set_document("job-1", "document-1")
+
+    assert store.get("key-1") == {"contentHash": "hash-1", "jobId": "job-1", "documentId": "document-1"}
+    assert store.get("key-2") is None
+    store.close()
+
+
+def test_store_forgets_keys_after_the_ttl(tmp_path, monkeypatch):
+    store = IdempotencyStore(str(tmp_path / "idempotency.db"), ttl=60)
+    store.put("old", "hash-1", "job-1")
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert store.get("old") is None
+    # Expired rows are removed as new keys are written
+    store.put("new", "hash-2", "job-2")
+    count = store._db.connection().execute("SELECT COUNT(*) FROM idempotency_keys").fetchone()[0]
+    assert count == 1
+    store.close()
+
+
+def test_replayed_key_returns_the_original_job(app, model):
+    _, client = app
+    key, text = str(uuid.uuid4()), unique_text()
+
+    first = upload(client, text, key).json()
+    document = finish(client, first["id"])["document"]
+    replay = upload(client, text, key).json()
+
+    assert replay["id"] == first["id"]
+    assert replay["document"]["id"] == document["id"]
+    assert len(model.prompts) == 1
+
+
+def test_replayed_key_after_the_job_leaves_the_history(app, model, monkeypatch):
+    main, client = app
+    key, text = str(uuid.uuid4()), unique_text()
+    first = upload(client, text, key).json()
+    document = finish(client, first["id"])["document"]
+
+    monkeypatch.delitem(main.job_queue._jobs, first["id"])
+    replay = upload(client, text, key).json()
+
+    # Answered from the stored document id
+    assert replay["id"] == first["id"]
+    assert replay["status"] == "completed"
+    assert replay["deduplicated"] == "idempotency-key"
+    assert replay["document"]["id"] == document["id"]
+
+
+def test_key_reused_for_different_content_is_rejected(app, model):
+    _, client = app
+    key = str(uuid.uuid4())
+    finish(client, upload(client, unique_text(), key).json()["id"])
+
+    response = upload(client, unique_text(), key)
+
+    assert response.status_code == 422
+    assert "different file" in response.json()["detail"]
+
+
+def test_expired_key_can_be_used_again(app, model, monkeypatch):
+    main, client = app
+    key = str(uuid.uuid4())
+    first = upload(client, unique_text(), key).json()
+    finish(client, first["id"])
+
+    monkeypatch.setattr(main.idempotency_store, "_ttl", 0)
+    second = upload(client, unique_text(), key)
+
+    assert second.status_code == 202
+    assert second.json()["id"] != first["id"]
+    finish(client, second.json()["id"])
+
+
+def test_repeat_while_in_flight_joins_the_running_job(app, monkeypatch):
+    main, client = app
+    release = threading.Event()
+    calls = []
+
+    async def generate(prompts, max_length):
+        calls.extend(prompts)
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return ["Category: Invoice\nSummary: An invoice."] * len(prompts)
+
+    monkeypatch.setattr(main.inference_backend, "_generate", generate)
+    text = unique_text()
+    first = upload(client, text).json()
+    deadline = time.monotonic() + 10
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    keyed = upload(client, text, str(uuid.uuid4())).json()
+    repeat = upload(client, text).json()
+    release.set()
+
+    assert keyed["id"] == repeat["id"] == first["id"]
+    assert finish(client, first["id"])["status"] == "completed"
+    assert len(calls) == 1
+    assert main.dedup_stats.stats()["hits"]["in-flight"] >= 2
+
+
+def test_completed_content_is_answered_with_its_document(app, model):
+    _, client = app
+    text = unique_text()
+    first = finish(client, upload(client, text).json()["id"])
+
+    repeat = upload(client, text).json()
+
+    assert repeat["id"] != first["id"]
+    assert repeat["status"] == "completed"
+    assert repeat["deduplicated"] == "content-hash"
+    assert repeat["document"]["id"] == first["document"]["id"]
+    assert len(model.prompts) == 1
+
+
+@pytest.mark.parametrize("key", [None, "retry-after-failure"])
+def test_failed_upload_is_processed_again(app, model, key):
+    _, client = app
+    key = key and f"{key}-{uuid.uuid4()}"
+    text = unique_text()
+
+    def unavailable(prompt):
+        raise RuntimeError("model unavailable")
+
+    model.reply = staticmethod(unavailable)
+    first = finish(client, upload(client, text, key).json()["id"])
+    assert first["status"] == "failed"
+
+    model.reply = staticmethod(lambda prompt: "Category: Invoice\nSummary: An invoice.")
+    retry = upload(client, text, key).json()
+
+    assert retry["id"] != first["id"]
+    assert retry["deduplicated"] is None
+    assert finish(client, retry["id"])["status"] == "completed"
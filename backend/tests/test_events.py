@@ -0,0 +1,24 @@
+import asyncio
+
+from utils.events import EventBroker, EventLog
+
+
+def test_published_events_reach_the_log_by_shutdown(tmp_path):
+    path = str(tmp_path / "events.db")
+
+    async def run():
+        broker = EventBroker(log=EventLog(path))
+        await broker.start(interval=0.01)
+        subscriber = broker.subscribe(["job-1"])
+        for stage in ("received", "extracted", "completed"):
+            broker.publish("job-1", {"type": "job", "jobId": "job-1", "stage": stage})
+        delivered = [subscriber.queue.get_nowait()["stage"] for _ in range(3)]
+        await broker.stop()
+        return delivered
+
+    assert asyncio.run(run()) == ["received", "extracted", "completed"]
+    log = EventLog(path)
+    rows = log._db.connection().execute("SELECT job_id, event FROM events ORDER BY seq").fetchall()
+    log.close()
+    assert [row["job_id"] for row in rows] == ["job-1"] * 3
+    assert '"stage": "completed"' in rows[-1]["event"]
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import time
+
+import pytest
+from PyPDF2 import PdfReader, PdfWriter
+
+from utils import extraction
+from utils.extraction import ExtractionError, ExtractionPool, ExtractionTimeoutError, extract_document
+from utils.extractors import PDF_CONTENT_TYPE
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "..", "..", "synthetic_data")
+
+
+# Run in the pool's worker processes, which import this module by name
+def hang(seconds: float) -> str:
+    time.sleep(seconds)
+    return "finished"
+
+
+def crash():
+    os._exit(1)
+
+
+def allocate(megabytes: int) -> str:
+    try:
+        bytearray(megabytes * 1024 * 1024)
+    except MemoryError:
+        return "memory error"
+    return "allocated"
+
+
+def run(pool: ExtractionPool, coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            pool.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_hanging_task_times_out_and_the_pool_recovers():
+    pool = ExtractionPool(workers=1, timeout=0.5, memory_limit_mb=0)
+
+    async def scenario():
+        before = await pool.run(os.getpid)
+        with pytest.raises(ExtractionTimeoutError, match="timed out after 0.5 seconds"):
+            await pool.run(hang, 30)
+        return before, await pool.run(os.getpid)
+
+    before, after = run(pool, scenario())
+
+    # The hung worker was killed and replaced
+    assert before != after
+    assert pool.stats()["restarts"] == 1
+
+
+def test_tasks_caught_in_a_restart_are_retried_once():
+    pool = ExtractionPool(workers=2, timeout=10, memory_limit_mb=0)
+
+    async def scenario():
+        await pool.start()
+        bystander = asyncio.ensure_future(pool.run(hang, 1.0))
+        await asyncio.sleep(0.1)
+        with pytest.raises(ExtractionTimeoutError):
+            await pool.run(hang, 30, timeout=0.5)
+        return await bystander
+
+    assert run(pool, scenario()) == "finished"
+    assert pool.stats()["restarts"] == 1
+
+
+def test_crashed_worker_is_reported_and_replaced():
+    pool = ExtractionPool(workers=1, timeout=10, memory_limit_mb=0)
+
+    async def scenario():
+        with pytest.raises(ExtractionError, match="crashed"):
+            await pool.run(crash)
+        return await pool.run(hang, 0)
+
+    assert run(pool, scenario()) == "finished"
+    assert pool.stats()["restarts"] == 1
+
+
+def test_workers_have_their_address_space_capped():
+    pytest.importorskip("resource")
+    pool = ExtractionPool(workers=1, timeout=30, memory_limit_mb=1024)
+
+    assert run(pool, pool.run(allocate, 2048)) == "memory error"
+
+
+@pytest.fixture
+def long_pdf(tmp_path, monkeypatch):
+    """
+    A five-page PDF alternating two samples, with PDFs over two pages split into two-page ranges.
+    """
+    # Spawned workers read the settings from the environment
+    monkeypatch.setenv("PDF_PARALLEL_MIN_PAGES", "2")
+    monkeypatch.setenv("PDF_PAGES_PER_TASK", "2")
+    monkeypatch.setattr(extraction, "PDF_PAGES_PER_TASK", 2)
+    writer = PdfWriter()
+    for index in range(5):
+        sample = "invoice.pdf" if index % 2 == 0 else "report.pdf"
+        writer.add_page(PdfReader(os.path.join(SAMPLES, sample)).pages[0])
+    path = tmp_path / "long.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_long_pdf_is_split_into_page_ranges_and_kept_in_order(long_pdf):
+    # The first task only extracts the first range
+    assert len(extract_document(long_pdf, PDF_CONTENT_TYPE, split_pages=2)["pages"]) == 2
+
+    pool = ExtractionPool(workers=2, timeout=30, memory_limit_mb=0)
+    info = {}
+
+    async def scenario():
+        return [page async for page in pool.iter_pages(long_pdf, PDF_CONTENT_TYPE, info)]
+
+    pages = run(pool, scenario())
+
+    assert info["pageCount"] == 5
+    assert [page.split()[0] for page in pages] == ["Invoice", "Monthly", "Invoice", "Monthly", "Invoice"]
@@ -0,0 +1,196 @@
+import io
+import os
+import zipfile
+from email.message import EmailMessage
+
+import pytest
+
+from utils.extractors import (
+    DOCX_CONTENT_TYPE,
+    EMAIL_CONTENT_TYPE,
+    HEAVY,
+    HTML_CONTENT_TYPE,
+    LIGHT,
+    PDF_CONTENT_TYPE,
+    PPTX_CONTENT_TYPE,
+    TEXT_CONTENT_TYPE,
+    XLSX_CONTENT_TYPE,
+    get_extractor,
+    iter_text_blocks,
+    sniff_content_type,
+)
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "..", "..", "synthetic_data")
+WORD = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+SHEET = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+DRAWING = 'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+RELATIONSHIPS = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+
+
+def zip_bytes(parts) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in parts.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def rels(*targets) -> str:
+    relationships = "".join(f'<Relationship Id="rId{index}" Target="{target}"/>' for index, target in enumerate(targets, 1))
+    return f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{relationships}</Relationships>'
+
+
+def docx_bytes() -> bytes:
+    body = (
+        f'<w:document {WORD}><w:body>'
+        '<w:p><w:r><w:t>Service</w:t></w:r><w:r><w:t xml:space="preserve"> agreement</w:t></w:r></w:p>'
+        '<w:p><w:r><w:t>Term</w:t><w:tab/><w:t>12 months</w:t><w:br/><w:t>renewable</w:t></w:r></w:p>'
+        '<w:tbl><w:tr><w:tc><w:p><w:r><w:t>Cell</w:t></w:r></w:p></w:tc></w:tr></w:tbl>'
+        '</w:body></w:document>'
+    )
+    return zip_bytes({"[Content_Types].xml": "<Types/>", "word/document.xml": body})
+
+
+def xlsx_bytes() -> bytes:
+    return zip_bytes({
+        "xl/workbook.xml": f'<workbook {SHEET} {RELATIONSHIPS}><sheets><sheet name="Totals" r:id="rId1"/></sheets></workbook>',
+        "xl/_rels/workbook.xml.rels": rels("worksheets/sheet1.xml"),
+        "xl/sharedStrings.xml": f"<sst {SHEET}><si><t>Item</t></si><si><t>Amount</t></si></sst>",
+        "xl/worksheets/sheet1.xml": (
+            f"<worksheet {SHEET}><sheetData>"
+            '<row><c t="s"><v>0</v></c><c t="s"><v>1</v></c></row>'
+            '<row><c t="inlineStr"><is><t>Widget</t></is></c><c><v>42</v></c></row>'
+            "<row><c/></row>"
+            "</sheetData></worksheet>"
+        ),
+    })
+
+
+def pptx_bytes() -> bytes:
+    def slide(*paragraphs):
+        body = "".join(f"<a:p><a:r><a:t>{text}</a:t></a:r></a:p>" for text in paragraphs)
+        return f"<p:sld {DRAWING} xmlns:p=\"urn:p\"><a:txBody>{body}</a:txBody></p:sld>"
+
+    presentation = (
+        f'<p:presentation xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" {RELATIONSHIPS}>'
+        '<p:sldIdLst><p:sldId r:id="rId2"/><p:sldId r:id="rId1"/></p:sldIdLst></p:presentation>'
+    )
+    return zip_bytes({
+        "ppt/presentation.xml": presentation,
+        "ppt/_rels/presentation.xml.rels": rels("slides/slide1.xml", "slides/slide2.xml"),
+        "ppt/slides/slide1.xml": slide("Second slide"),
+        "ppt/slides/slide2.xml": slide("Quarterly review", "Revenue up"),
+    })
+
+
+def email_bytes(html: bool = False) -> bytes:
+    message = EmailMessage()
+    message["From"] = "alice@example.com"
+    message["To"] = "bob@example.com"
+    message["Subject"] = "Invoice 7323"
+    message.set_content("Please find the invoice attached.\nTotal due: $120.")
+    if html:
+        message.add_alternative("<html><body><p>Please <b>pay</b></p><script>x()</script></body></html>", subtype="html")
+    message.add_attachment(b"%PDF-1.4 attachment", maintype="application", subtype="pdf", filename="invoice.pdf")
+    return message.as_bytes()
+
+
+@pytest.fixture
+def write(tmp_path):
+    def write(data: bytes, name: str = "upload") -> str:
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+
+def extract(content_type: str, data: bytes):
+    return list(get_extractor(content_type).iter_pages(io.BytesIO(data)))
+
+
+@pytest.mark.parametrize("data, filename, declared, expected", [
+    (b"%PDF-1.4\n...", "notes.txt", "text/plain", PDF_CONTENT_TYPE),
+    (b"\xef\xbb\xbfjunk%PDF-1.7", "", "", PDF_CONTENT_TYPE),
+    (docx_bytes(), "report.pdf", "application/pdf", DOCX_CONTENT_TYPE),
+    (xlsx_bytes(), "", "", XLSX_CONTENT_TYPE),
+    (pptx_bytes(), "", "", PPTX_CONTENT_TYPE),
+    (email_bytes(), "message.txt", "text/plain", EMAIL_CONTENT_TYPE),
+    (b"Subject: hello\n\nbody", "mail.eml", "", EMAIL_CONTENT_TYPE),
+    (b"Subject: hello\n\nbody", "notes.txt", "", TEXT_CONTENT_TYPE),
+    (b"<!DOCTYPE html><html><body>Hi</body></html>", "page.txt", "text/plain", HTML_CONTENT_TYPE),
+    (b"<p>A fragment</p>", "fragment.html", "", HTML_CONTENT_TYPE),
+    (b"<p>A fragment</p>", "fragment.txt", "", TEXT_CONTENT_TYPE),
+    ("Caf\xe9 cr\xe8me".encode("cp1252"), "", "", TEXT_CONTENT_TYPE),
+    (b"\x00\x01\x02\x03binary" * 10, "data.txt", "text/plain", None),
+    (b"PK\x03\x04not really a zip", "archive.docx", DOCX_CONTENT_TYPE, None),
+])
+def test_bytes_decide_the_type(write, data, filename, declared, expected):
+    assert sniff_content_type(write(data), filename, declared) == expected
+
+
+def test_markup_and_email_parse_in_the_pool():
+    assert get_extractor(HTML_CONTENT_TYPE).cost == HEAVY
+    assert get_extractor(EMAIL_CONTENT_TYPE).cost == HEAVY
+    assert get_extractor(TEXT_CONTENT_TYPE).cost == LIGHT
+
+
+def test_pdf_pages():
+    with open(os.path.join(SAMPLES, "invoice.pdf"), "rb") as f:
+        pages = list(get_extractor(PDF_CONTENT_TYPE).iter_pages(f))
+
+    assert len(pages) == 1
+    assert pages[0].startswith("Invoice")
+
+
+def test_docx_paragraphs_stream_with_tabs_and_breaks():
+    assert extract(DOCX_CONTENT_TYPE, docx_bytes()) == ["Service agreement", "Term\t12 months\nrenewable", "Cell"]
+
+
+def test_docx_matches_python_docx_on_a_real_document():
+    import docx
+
+    path = os.path.join(SAMPLES, "contract.docx")
+    expected = [paragraph.text for paragraph in docx.Document(path).paragraphs]
+    with open(path, "rb") as f:
+        paragraphs = list(get_extractor(DOCX_CONTENT_TYPE).iter_pages(f))
+
+    # python-docx only lists body paragraphs; table cells come on top
+    assert [paragraph for paragraph in paragraphs if paragraph in expected] == expected
+
+
+def test_xlsx_rows_resolve_shared_strings():
+    assert extract(XLSX_CONTENT_TYPE, xlsx_bytes()) == ["Totals\nItem\tAmount\nWidget\t42"]
+
+
+def test_pptx_slides_follow_presentation_order():
+    assert extract(PPTX_CONTENT_TYPE, pptx_bytes()) == ["Quarterly review\nRevenue up", "Second slide"]
+
+
+def test_email_headers_and_plain_body_without_attachments():
+    pages = extract(EMAIL_CONTENT_TYPE, email_bytes())
+
+    assert pages[0] == "Subject: Invoice 7323\nFrom: alice@example.com\nTo: bob@example.com"
+    assert pages[1:] == ["Please find the invoice attached.\nTotal due: $120."]
+
+
+def test_email_prefers_plain_over_html():
+    assert extract(EMAIL_CONTENT_TYPE, email_bytes(html=True))[1].startswith("Please find")
+
+
+def test_html_visible_text_and_declared_charset():
+    html = (
+        '<html><head><meta charset="windows-1252"><title>Caf\xe9</title><style>p {}</style></head>'
+        "<body><h1>Menu</h1><p>Cr\xe8me <b>br\xfbl\xe9e</b> &amp; tea</p><script>alert(1)</script></body></html>"
+    ).encode("cp1252")
+
+    assert extract(HTML_CONTENT_TYPE, html) == ["Caf\xe9\nMenu\nCr\xe8me br\xfbl\xe9e & tea"]
+
+
+def test_text_blocks_end_at_line_breaks():
+    text = "".join(f"line {index}\n" for index in range(5))
+
+    blocks = list(iter_text_blocks(io.StringIO(text), 10))
+
+    assert len(blocks) == 3
+    assert "\n".join(blocks) == text.rstrip("\n")
+    assert extract(TEXT_CONTENT_TYPE, text.encode()) == [text.rstrip("\n")]
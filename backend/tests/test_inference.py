@@ -0,0 +1,147 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from utils import inference
+from utils.backends import RemoteBackend
+from utils.inference import InferenceClient
+
+
+class Server:
+    """
+    Answers requests with queued (status, body) pairs, repeating the last one.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        status, body = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        return httpx.Response(status, json=body)
+
+
+LOADING = (503, {"error": "Model google/flan-t5-large is currently loading", "estimated_time": 0})
+GENERATED = (200, [{"generated_text": "Category: Invoice"}])
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """
+    Backoff waits, skipped and recorded; jitter is left out.
+    """
+    recorded = []
+
+    async def sleep(delay):
+        recorded.append(delay)
+
+    monkeypatch.setattr(inference.asyncio, "sleep", sleep)
+    monkeypatch.setattr(inference.random, "uniform", lambda low, high: 0)
+    return recorded
+
+
+def query(server: Server, **options):
+    client = InferenceClient("https://inference.test/models", token="token", transport=httpx.MockTransport(server), **options)
+
+    async def run():
+        try:
+            return await client.query("model", {"inputs": "Hello"})
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_retries_while_the_model_loads(delays):
+    server = Server(LOADING, LOADING, GENERATED)
+
+    assert query(server, max_retries=3, backoff=1.0) == [{"generated_text": "Category: Invoice"}]
+    assert len(server.requests) == 3
+    assert delays == [1.0, 2.0]
+    assert server.requests[0].url == "https://inference.test/models/model"
+    assert server.requests[0].headers["authorization"] == "Bearer token"
+    assert json.loads(server.requests[0].content) == {"inputs": "Hello"}
+
+
+def test_backoff_waits_for_the_estimated_load_time(delays, monkeypatch):
+    monkeypatch.setattr(inference, "INFERENCE_MAX_BACKOFF", 20.0)
+    loading = lambda seconds: (503, {"error": "loading", "estimated_time": seconds})
+    server = Server(loading(7.5), loading(0.5), loading(300), GENERATED)
+
+    query(server, max_retries=3, backoff=1.0)
+
+    # The estimate when longer than the backoff, never more than INFERENCE_MAX_BACKOFF
+    assert delays == [7.5, 2.0, 20.0]
+
+
+def test_gives_up_after_the_last_retry(delays):
+    server = Server(LOADING)
+
+    assert query(server, max_retries=2, backoff=0.5) == LOADING[1]
+    assert len(server.requests) == 3
+    assert delays == [0.5, 1.0]
+
+
+def test_other_errors_are_not_retried(delays):
+    server = Server((400, {"error": "bad input"}))
+
+    assert query(server, max_retries=3) == {"error": "bad input"}
+    assert len(server.requests) == 1
+    assert delays == []
+
+
+def test_connection_errors_are_raised(delays):
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    with pytest.raises(httpx.ConnectError):
+        query(refuse)
+
+
+def generate(server: Server, prompts):
+    client = InferenceClient("https://inference.test/models", transport=httpx.MockTransport(server), max_retries=0)
+    backend = RemoteBackend("model", client=client, batch_window_ms=50)
+
+    async def run():
+        try:
+            return await backend.generate(prompts, 20), backend.stats()
+        finally:
+            await backend.close()
+
+    return asyncio.run(run())
+
+
+def test_remote_batch_returns_one_text_per_prompt():
+    server = Server((200, [{"generated_text": "first"}, {"generated_text": "second"}]))
+
+    texts, stats = generate(server, ["a", "b"])
+
+    assert texts == ["first", "second"]
+    assert len(server.requests) == 1
+    assert json.loads(server.requests[0].content)["inputs"] == ["a", "b"]
+    assert stats["prompts"] == 2
+
+
+def test_remote_batch_error_object_gives_empty_texts():
+    texts, _ = generate(Server(LOADING), ["a", "b"])
+
+    assert texts == ["", ""]
+
+
+def test_failed_generation_is_raised_and_counted():
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    client = InferenceClient("https://inference.test/models", transport=httpx.MockTransport(refuse))
+    backend = RemoteBackend("model", client=client)
+
+    async def run():
+        with pytest.raises(httpx.ConnectError):
+            await backend.generate(["a"], 20)
+        await backend.close()
+
+    asyncio.run(run())
+    assert backend.stats()["errors"] == 1
@@ -0,0 +1,220 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from utils import jobs
+from utils.jobs import SHUTDOWN_ERROR, Job, JobInFlightError, JobQueue, JobStore, QueueFullError
+
+
+class Gate:
+    """
+    A job handler that holds every job until released, recording the statuses it saw.
+    """
+
+    def __init__(self, result=None, error: Exception = None):
+        self.release = asyncio.Event()
+        self.started = asyncio.Event()
+        self.seen = []
+        self.result = result if result is not None else {"id": "document"}
+        self.error = error
+
+    async def __call__(self, job: Job):
+        self.seen.append(job.status.status)
+        self.started.set()
+        with job.stage("extract"):
+            await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def test_job_moves_from_queued_to_running_to_completed():
+    events = []
+
+    async def run():
+        gate = Gate()
+        queue = JobQueue(gate, workers=1, notify=lambda job, event, **data: events.append(event))
+        await queue.start()
+        job = await queue.submit("report.pdf", {"size": 10})
+        assert job.status.status == "queued"
+        await gate.started.wait()
+        assert (job.status.status, job.status.stage) == ("running", "extract")
+        gate.release.set()
+        await queue.wait(job, 5)
+        await queue.stop(0)
+        return job, gate
+
+    job, gate = asyncio.run(run())
+
+    assert gate.seen == ["running"]
+    assert job.status.status == "completed"
+    assert job.status.document == {"id": "document"}
+    assert job.status.stage is None
+    assert job.status.startedAt and job.status.finishedAt
+    assert "extract" in job.status.stageTimings
+    assert events == ["received", "completed"]
+
+
+def test_handler_errors_fail_the_job_with_their_detail():
+    async def run():
+        gate = Gate(error=HTTPException(status_code=400, detail="Failed to extract text from the file."))
+        gate.release.set()
+        queue = JobQueue(gate, workers=1)
+        await queue.start()
+        job = await queue.wait(await queue.submit("report.pdf", {}), 5)
+        stats = queue.stats()
+        await queue.stop(0)
+        return job, stats
+
+    job, stats = asyncio.run(run())
+
+    assert job.status.status == "failed"
+    assert job.status.error == "Failed to extract text from the file."
+    assert stats["jobs"] == {"failed": 1}
+
+
+def test_full_queue_rejects_submissions_but_put_waits():
+    async def run():
+        gate = Gate()
+        queue = JobQueue(gate, maxsize=1, workers=1)
+        await queue.start()
+        await queue.submit("running.pdf", {})
+        await gate.started.wait()
+        await queue.submit("queued.pdf", {})
+        with pytest.raises(QueueFullError, match="1 pending jobs"):
+            await queue.submit("rejected.pdf", {})
+
+        waiting = asyncio.ensure_future(queue.put("waiting.pdf", {}))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        gate.release.set()
+        job = await asyncio.wait_for(waiting, 5)
+        await queue.wait(job, 5)
+        await queue.stop(0)
+        return queue.stats()
+
+    stats = asyncio.run(run())
+
+    assert stats["jobs"] == {"completed": 3}
+    assert stats["queueDepth"] == 0
+
+
+def test_full_queue_answers_uploads_with_503(app, monkeypatch):
+    main, client = app
+
+    async def full(filename, payload):
+        raise QueueFullError("Job queue is full (100 pending jobs).")
+
+    monkeypatch.setattr(main.job_queue, "submit", full)
+    response = client.post("/upload", files={"file": ("queue-full.txt", os.urandom(16).hex().encode(), "text/plain")})
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Job queue is full (100 pending jobs)."
+
+
+def test_wait_returns_when_the_job_finishes_or_the_timeout_passes():
+    async def run():
+        gate = Gate()
+        queue = JobQueue(gate, workers=1)
+        await queue.start()
+        job = await queue.submit("report.pdf", {})
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await queue.wait(job, 0.1)
+        timed_out = (job.status.status, loop.time() - start)
+
+        # Zero doesn't wait at all
+        assert (await queue.wait(job, 0)).status.status == "running"
+        loop.call_later(0.1, gate.release.set)
+        await queue.wait(job)
+        await queue.stop(0)
+        return timed_out, job
+
+    (status, elapsed), job = asyncio.run(run())
+
+    assert status == "running"
+    assert 0.1 <= elapsed < 1
+    assert job.status.status == "completed"
+
+
+def test_stop_fails_the_jobs_that_did_not_drain():
+    async def run():
+        gate = Gate()
+        queue = JobQueue(gate, workers=1)
+        await queue.start()
+        running = await queue.submit("running.pdf", {"path": "running"})
+        queued = await queue.submit("queued.pdf", {"path": "queued"})
+        await gate.started.wait()
+        abandoned = await queue.stop(0.05)
+        with pytest.raises(QueueFullError, match="shutting down"):
+            await queue.submit("late.pdf", {})
+        return running, queued, abandoned
+
+    running, queued, abandoned = asyncio.run(run())
+
+    assert abandoned == [running, queued]
+    assert all(job.status.status == "failed" and job.status.error == SHUTDOWN_ERROR for job in abandoned)
+
+
+def test_history_keeps_the_newest_finished_jobs(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_HISTORY_LIMIT", 3)
+
+    async def run():
+        queue = JobQueue(Gate(), workers=1)
+        await queue.start()
+        finished = [queue.complete(f"{index}.pdf", {"id": str(index)}) for index in range(5)]
+        await queue.stop(0)
+        return queue, finished
+
+    queue, finished = asyncio.run(run())
+
+    assert [queue.get(job.id) for job in finished] == [None, None, *finished[2:]]
+
+
+def test_store_shares_statuses_and_claims_content(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+
+    async def run():
+        gate = Gate()
+        queue = JobQueue(gate, workers=1, store=store)
+        await queue.start()
+        job = await queue.submit("report.pdf", {"sha256": "abc"})
+        await gate.started.wait()
+        gate.release.set()
+        await queue.wait(job, 5)
+        await queue.stop(0)
+        return job
+
+    job = asyncio.run(run())
+
+    assert store.get(job.id).status == "completed"
+    assert store.get(job.id).document == {"id": "document"}
+    # Finished content can be claimed again
+    assert store.claim(Job("again.pdf", {}).status, "abc") is None
+    store.close()
+
+
+def test_content_claimed_by_a_running_process_is_reported_in_flight(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    other = Job("report.pdf", {"sha256": "abc"})
+    store.save(other.status, "abc")
+    connection = store._db.connection()
+    # The parent process stands in for another server process that is alive
+    connection.execute("UPDATE jobs SET worker = ? WHERE id = ?", (os.getppid(), other.id))
+    connection.commit()
+
+    async def run():
+        queue = JobQueue(Gate(), workers=1, store=store)
+        await queue.start()
+        try:
+            with pytest.raises(JobInFlightError) as error:
+                await queue.submit("report.pdf", {"sha256": "abc"})
+            return error.value.job
+        finally:
+            await queue.stop(0)
+
+    assert asyncio.run(run()).id == other.id
+    store.close()
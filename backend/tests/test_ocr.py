@@ -0,0 +1,25 @@
+from utils.ocr import OCRCache, PageOCR
+
+
+def test_put_reports_new_entries(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.db"))
+
+    assert cache.put("hash", "eng", "text")
+    assert not cache.put("hash", "eng", "text")
+    assert cache.put("hash", "deu", "text")
+    assert cache.size() == 2
+    cache.close()
+
+
+def test_stats_do_not_query_the_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "ocr.db")
+    cache = OCRCache(path)
+    cache.put("a", "eng", "text")
+    cache.put("b", "eng", "text")
+    cache.close()
+
+    ocr = PageOCR(enabled=False, cache_path=path)
+    monkeypatch.setattr(OCRCache, "size", lambda self: 1 / 0)
+
+    assert ocr.stats()["cachedImages"] == 2
+    ocr.shutdown()
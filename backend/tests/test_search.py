@@ -0,0 +1,92 @@
+import pytest
+
+from utils.search import SearchIndex, build_match_query
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.db"))
+    index.add("invoice", "Invoice 7323", "Consulting services for March. Total due: $120.")
+    index.add("contract", "Service agreement", "The contractor invoices monthly. Termination needs 30 days notice.")
+    index.add("report", "Monthly report", "Revenue grew in March. Costs fell. Revenue per customer rose.")
+    # Documents without the test terms, so that BM25 gives the terms weight
+    for number in range(5):
+        index.add(f"memo-{number}", "Memo", f"Meeting moved to room {number}.")
+    yield index
+    index.close()
+
+
+def ids(results):
+    return [result["id"] for result in results]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("invoice total", '"invoice" "total"'),
+    ('"quoted" OR NOT -x', '"quoted" "OR" "NOT" "x"'),
+    ("title:secret*", '"title" "secret"'),
+    ("café résumé", '"café" "résumé"'),
+    ("  ?!  ", ""),
+])
+def test_free_text_becomes_quoted_terms(query, expected):
+    assert build_match_query(query) == expected
+
+
+def test_prefix_applies_to_the_last_term_only():
+    assert build_match_query("monthly rev", prefix=True) == '"monthly" "rev"*'
+
+
+def test_every_term_must_match(index):
+    assert ids(index.search("march revenue")) == ["report"]
+    assert ids(index.search("march")) != []
+    assert index.search("march giraffe") == []
+
+
+def test_title_matches_rank_first(index):
+    # Stemming matches "invoices" in the contract too, but the invoice has the word in its title
+    assert ids(index.search("invoice")) == ["invoice", "contract"]
+
+
+def test_more_frequent_terms_rank_higher(index):
+    index.add("notes", "Notes", "Revenue was mentioned once.")
+
+    results = index.search("revenue")
+
+    assert ids(results) == ["report", "notes"]
+    assert results[0]["score"] > results[1]["score"] > 0
+
+
+def test_snippets_highlight_matches(index):
+    assert "<mark>Termination</mark>" in index.search("termination")[0]["snippet"]
+
+
+def test_query_syntax_is_treated_as_text(index):
+    # Operators, column filters and unbalanced quotes would be FTS5 syntax errors or change the meaning
+    for query in ['title:invoice', 'invoice"', "invoice NOT contract", "(march", "*", "NEAR(a b)"]:
+        index.search(query)
+    assert ids(index.search("title:invoice")) == []
+    assert ids(index.search("invoice NOT contract")) == []
+    assert index.search("?!") == []
+
+
+def test_prefix_search(index):
+    assert ids(index.search("month", prefix=True)) == ["report", "contract"]
+    assert index.search("month") == []
+
+
+def test_paging(index):
+    everything = ids(index.search("march", limit=10))
+
+    assert ids(index.search("march", limit=1)) + ids(index.search("march", limit=1, offset=1)) == everything
+
+
+def test_readding_replaces_and_remove_deletes(index):
+    index.add("report", "Quarterly report", "Margins widened.")
+
+    assert index.search("revenue") == []
+    assert ids(index.search("margins")) == ["report"]
+    assert index.content("report") == "Margins widened."
+
+    assert index.remove("report") is True
+    assert index.remove("report") is False
+    assert index.search("margins") == []
+    assert index.content("report") is None
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from utils import serving
+from utils.serving import FileLock, per_worker, process_alive
+
+
+@pytest.mark.parametrize("workers, total, expected", [(1, 8, 8), (4, 8, 2), (3, 8, 2), (8, 4, 1), (2, 0, 1)])
+def test_per_worker_splits_the_budget(monkeypatch, workers, total, expected):
+    monkeypatch.setattr(serving, "WEB_WORKERS", workers)
+
+    assert per_worker(total) == expected
+
+
+def test_process_alive():
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+
+    assert process_alive(os.getpid())
+    assert not process_alive(exited.pid)
+
+
+def test_file_lock_is_reentrant(tmp_path):
+    lock = FileLock(str(tmp_path / "locks" / "a.lock"))
+
+    with lock:
+        with lock:
+            pass
+        assert lock._file is not None
+    assert lock._file is None
+
+
+def test_file_lock_excludes_threads(tmp_path):
+    lock = FileLock(str(tmp_path / "a.lock"))
+    inside = []
+    overlaps = []
+
+    def work():
+        for _ in range(20):
+            with lock:
+                inside.append(1)
+                overlaps.append(len(inside))
+                time.sleep(0.001)
+                inside.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(overlaps) == 1
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Processes are only excluded where flock is available")
+def test_file_lock_excludes_other_processes(tmp_path):
+    path = str(tmp_path / "a.lock")
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = f"import time; from utils.serving import FileLock\nwith FileLock({path!r}): print(time.time())"
+
+    with FileLock(path):
+        child = subprocess.Popen([sys.executable, "-c", script], cwd=backend, stdout=subprocess.PIPE, text=True)
+        time.sleep(0.5)
+        released = time.time()
+    acquired = float(child.communicate(timeout=10)[0])
+
+    assert acquired >= released
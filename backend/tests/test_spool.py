@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from utils import spool
+from utils.spool import iter_spooled_files, spool_upload
+
+BOUNDARY = "----boundary1234"
+
+
+def multipart_body(parts) -> bytes:
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\nContent-Type: application/pdf\r\n\r\n".encode()
+        body += data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def request(body: bytes, chunk_size: int) -> Request:
+    chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+
+    async def receive():
+        return messages.pop(0)
+
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+async def spool_all(body: bytes, chunk_size: int, **kwargs):
+    return [spooled async for spooled in iter_spooled_files(request(body, chunk_size), **kwargs)]
+
+
+@pytest.fixture(autouse=True)
+def spool_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "spool"
+    directory.mkdir()
+    monkeypatch.setattr(spool, "SPOOL_DIR", str(directory))
+    return directory
+
+
+# Chunk sizes that split the boundary, the part headers and the CRLF before the next boundary
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, len(BOUNDARY) + 1, 64, 1 << 20])
+def test_files_survive_any_read_size(chunk_size):
+    first = b"%PDF-1.4 first\r\n--not-the-boundary\r\n" * 10
+    second = os.urandom(500)
+    body = multipart_body([("note", None, b"plain field"), ("files", "a.pdf", first), ("files", "b.pdf", second)])
+
+    files = asyncio.run(spool_all(body, chunk_size))
+
+    assert [spooled.filename for spooled in files] == ["a.pdf", "b.pdf"]
+    for spooled, data in zip(files, (first, second)):
+        with open(spooled.path, "rb") as f:
+            assert f.read() == data
+        assert spooled.size == len(data)
+        assert spooled.sha256 == hashlib.sha256(data).hexdigest()
+        spooled.discard()
+
+
+def test_oversized_file_is_rejected_and_removed(spool_dir):
+    body = multipart_body([("files", "a.pdf", b"small"), ("files", "b.pdf", b"x" * 100)])
+
+    received = []
+
+    async def run():
+        # Files already yielded belong to the caller
+        try:
+            async for spooled in iter_spooled_files(request(body, 16), max_bytes=50):
+                received.append(spooled.filename)
+                spooled.discard()
+        except HTTPException as e:
+            return e
+
+    error = asyncio.run(run())
+
+    assert error.status_code == 413
+    assert received == ["a.pdf"]
+    assert os.listdir(spool_dir) == []
+
+
+def test_total_size_is_limited(spool_dir):
+    body = multipart_body([("files", "a.pdf", b"x" * 100), ("files", "b.pdf", b"x" * 100)])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(spool_all(body, 32, max_total_bytes=150))
+
+    assert error.value.status_code == 413
+    assert os.listdir(spool_dir) == []
+
+
+def test_single_upload_keeps_the_first_file(spool_dir):
+    body = multipart_body([("file", "a.pdf", b"first"), ("file", "b.pdf", b"second")])
+
+    spooled = asyncio.run(spool_upload(request(body, 10)))
+
+    assert spooled.filename == "a.pdf"
+    assert os.listdir(spool_dir) == [os.path.basename(spooled.path)]
+    spooled.discard()
+
+
+def test_single_upload_limits_the_whole_body(spool_dir, monkeypatch):
+    monkeypatch.setattr(spool, "MULTIPART_OVERHEAD_BYTES", 300)
+    # No Content-Length, so only the bytes read so far can be checked
+    body = multipart_body([("file", "a.pdf", b"x" * 50)] + [("file", f"{index}.pdf", b"x" * 50) for index in range(10)])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(spool_upload(request(body, 16), max_bytes=50))
+
+    assert error.value.status_code == 413
+    assert os.listdir(spool_dir) == []
@@ -0,0 +1,54 @@
+import base64
+import json
+
+import pytest
+
+from utils.store import InvalidCursorError, SQLiteDocumentStore, decode_cursor, encode_cursor
+
+
+def tampered(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("title", "asc", {"id": "doc-1", "title": "Report"})
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "title", "asc") == ("Report", "doc-1")
+
+
+def test_cursor_for_another_sort_is_rejected():
+    cursor = encode_cursor("title", "asc", {"id": "doc-1", "title": "Report"})
+
+    with pytest.raises(InvalidCursorError, match="different sort"):
+        decode_cursor(cursor, "title", "desc")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii"),
+    tampered({"sort": "title"}),
+    tampered(["title", "asc", "Report"]),
+    tampered(["title", "asc", ["Report"], "doc-1"]),
+    tampered(["title", "asc", "Report", {"id": 1}]),
+    tampered(5),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "title", "asc")
+
+
+def test_pages_follow_the_cursor(tmp_path):
+    store = SQLiteDocumentStore(str(tmp_path / "documents.db"))
+    for index in range(5):
+        store.add({"id": f"doc-{index}", "title": f"Title {index % 2}", "uploadDate": "2024-01-01 00:00:00", "category": "Report", "summary": ""})
+
+    seen = []
+    cursor = None
+    while True:
+        items, cursor = store.query(sort="title", order="asc", limit=2, cursor=cursor, fields=["id"])
+        seen.extend(item["id"] for item in items)
+        if cursor is None:
+            break
+
+    assert seen == ["doc-0", "doc-2", "doc-4", "doc-1", "doc-3"]
@@ -0,0 +1,135 @@
+import numpy as np
+
+from utils.vectors import HashingEmbedder, VectorIndex
+
+
+def unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def clustered(count: int, dim: int = 16, clusters: int = 4, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    points = centers[np.arange(count) % clusters] + rng.normal(scale=0.1, size=(count, dim))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def index(tmp_path, kind: str = "flat", dim: int = 16) -> VectorIndex:
+    return VectorIndex(str(tmp_path / "vectors"), embedder=HashingEmbedder(dim), kind=kind)
+
+
+def test_flat_search_ranks_by_cosine_similarity(tmp_path):
+    vectors = index(tmp_path, dim=3)
+    vectors.add("x", unit([1, 0, 0]))
+    vectors.add("xy", unit([1, 1, 0]))
+    vectors.add("z", unit([0, 0, 1]))
+
+    matches = vectors.search(unit([1, 0.1, 0]), 2)
+
+    assert [match["id"] for match in matches] == ["x", "xy"]
+    assert matches[0]["score"] > matches[1]["score"]
+    assert [match["id"] for match in vectors.search(unit([1, 0, 0]), 2, exclude="x")] == ["xy", "z"]
+    vectors.close()
+
+
+def test_similar_texts_embed_close_together(tmp_path):
+    vectors = index(tmp_path, dim=256)
+    vectors.add("invoice", vectors.embed("invoice number total amount due payment terms"))
+    vectors.add("recipe", vectors.embed("flour sugar butter bake in the oven"))
+
+    assert vectors.search(vectors.embed("invoice total amount due"), 1)[0]["id"] == "invoice"
+    vectors.close()
+
+
+def test_remove(tmp_path):
+    vectors = index(tmp_path, dim=3)
+    vectors.add("a", unit([1, 0, 0]))
+    vectors.add("b", unit([0, 1, 0]))
+
+    assert vectors.remove("a")
+    assert not vectors.remove("a")
+    assert vectors.vector("a") is None
+    assert [match["id"] for match in vectors.search(unit([1, 0, 0]), 5)] == ["b"]
+    assert vectors.stats()["vectors"] == 1
+    vectors.close()
+
+
+def test_adding_again_replaces_the_vector(tmp_path):
+    vectors = index(tmp_path, dim=3)
+    vectors.add("a", unit([1, 0, 0]))
+    vectors.add("a", unit([0, 1, 0]))
+
+    np.testing.assert_allclose(vectors.vector("a"), unit([0, 1, 0]))
+    assert vectors.stats()["rows"] == 1
+    vectors.close()
+
+
+def test_train_needs_enough_vectors(tmp_path):
+    vectors = index(tmp_path, kind="ivf")
+    for number, vector in enumerate(clustered(10)):
+        vectors.add(str(number), vector)
+
+    assert vectors.wants_training
+    assert not vectors.train(lists=4, min_vectors=100)
+    assert vectors.stats()["index"] == "flat"
+    vectors.close()
+
+
+def test_ivf_search_matches_flat_search(tmp_path):
+    points = clustered(400)
+    flat = index(tmp_path / "flat")
+    ivf = index(tmp_path / "ivf", kind="ivf")
+    for number, vector in enumerate(points):
+        flat.add(str(number), vector)
+        ivf.add(str(number), vector)
+
+    assert ivf.train(lists=4, min_vectors=100)
+    # Added after training, so assigned to its nearest cluster directly
+    flat.add("late", points[0])
+    ivf.add("late", points[0])
+
+    stats = ivf.stats()
+    assert stats["index"] == "ivf" and stats["ivfLists"] == 4
+    assert not ivf.wants_training
+    # With every cluster probed, IVF finds exactly what a flat scan finds
+    for query in points[:20]:
+        assert ivf.search(query, 5) == flat.search(query, 5)
+    flat.close()
+    ivf.close()
+
+
+def test_training_survives_a_restart(tmp_path):
+    points = clustered(200)
+    vectors = index(tmp_path, kind="ivf")
+    for number, vector in enumerate(points):
+        vectors.add(str(number), vector)
+    vectors.train(lists=4, min_vectors=100)
+    vectors.remove("0")
+    expected = vectors.search(points[1], 5)
+    vectors.close()
+
+    reopened = index(tmp_path, kind="ivf")
+
+    assert reopened.stats()["index"] == "ivf"
+    assert reopened.stats()["vectors"] == 199
+    assert reopened.search(points[1], 5) == expected
+    reopened.close()
+
+
+def test_near_duplicate_threshold(tmp_path):
+    vectors = index(tmp_path, dim=3)
+    vectors.add("a", unit([1, 0, 0]))
+
+    assert vectors.near_duplicate(unit([1, 0.01, 0]), 0.95)[0] == "a"
+    document_id, score = vectors.near_duplicate(unit([1, 1, 0]), 0.95)
+    assert document_id is None and 0.7 < score < 0.71
+    assert vectors.near_duplicate(unit([1, 0, 0]), 0) == (None, None)
+    vectors.close()
+
+
+def test_near_duplicate_of_an_empty_index(tmp_path):
+    vectors = index(tmp_path, dim=3)
+
+    assert vectors.near_duplicate(unit([1, 0, 0]), 0.95) == (None, None)
+    vectors.close()
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import re
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+from utils.backends import create_backend
+from utils.cache import ResultCache, cache_key
+from utils.chunking import CHUNK_TOKENS, chunk_text, count_tokens
+
+# Load environment variables
+load_dotenv()
+
+# Analysis configuration
+ANALYSIS_MODES = ("combined", "separate")
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "combined")  # One request for both fields, or one request each
+PROMPT_VERSION = "1"  # Bump whenever a prompt changes so cached results are not reused
+SUMMARY_FANOUT = int(os.getenv("SUMMARY_FANOUT", "4"))  # Chunk summaries requested at once per document
+
+# Returned when the model gives no usable answer
+DEFAULT_CATEGORY = "other"
+DEFAULT_SUMMARY = "No summary available."
+
+# Shared inference backend (see utils/backends.py for configuration)
+inference_backend = create_backend()
+
+async def generate(prompt: str, max_length: int) -> str:
+    """
+    Run one prompt through the inference backend and return the generated text.
+    """
+    return (await inference_backend.generate([prompt], max_length))[0]
+
+async def categorize_document(content: str) -> str:
+    """
+    Use the inference backend to categorize the document.
+    """
+    prompt = f"""
+    Analyze the following document content and suggest a category label that best describes it.
+    The category should be a single word or a short phrase.
+    Respond with only the category label and nothing else.
+    Document Content: {content}
+    """
+    generated_text = await generate(prompt, 20)  # Limit the response to a short label
+
+    # Extract only the first line (category label)
+    category = generated_text.strip().split("\n")[0]
+    return category if category else DEFAULT_CATEGORY
+
+async def summarize_document(content: str) -> str:
+    """
+    Use the inference backend to summarize the document.
+    """
+    prompt = f"""
+    Summarize the following document content in one sentence.
+    Respond with only the summary and nothing else.
+    Document Content: {content}
+    """
+    generated_text = await generate(prompt, 50)  # Limit summary to one sentence
+
+    # Extract only the first line (summary)
+    summary = generated_text.strip().split("\n")[0]
+    return summary if summary else DEFAULT_SUMMARY
+
+
+def parse_analysis(generated_text: str) -> Optional[Tuple[str, str]]:
+    """
+    Parse a combined "Category: ... Summary: ..." response.
+    Returns None when either field is missing so the caller can fall back.
+    """
+    category_match = re.search(r"category\s*:[ \t]*(.+?)\s*(?:$|[\n;|]|summary\s*:)", generated_text, re.IGNORECASE | re.MULTILINE)
+    summary_match = re.search(r"summary\s*:\s*(.+)", generated_text, re.IGNORECASE)
+    if not category_match or not summary_match:
+        return None
+    category = category_match.group(1).strip().strip(".")
+    summary = summary_match.group(1).strip().split("\n")[0]
+    if not category or not summary:
+        return None
+    return category, summary
+
+async def analyze_document(content: str) -> Optional[Tuple[str, str]]:
+    """
+    Use a single inference request to categorize and summarize the document.
+    Returns None when the response cannot be parsed.
+    """
+    prompt = f"""
+    Analyze the following document content.
+    Respond in exactly this format and nothing else:
+    Category: <a single word or short phrase that best describes the document>
+    Summary: <one sentence summarizing the document>
+    Document Content: {content}
+    """
+    generated_text = await generate(prompt, 80)  # Room for a short label plus a one-sentence summary
+    return parse_analysis(generated_text)
+
+async def summarize_section(content: str) -> str:
+    """
+    Use the inference backend to summarize one chunk of a longer document.
+    """
+    prompt = f"""
+    Summarize the following section of a longer document in one sentence.
+    Respond with only the summary and nothing else.
+    Section Content: {content}
+    """
+    summary = (await generate(prompt, 50)).strip().split("\n")[0]  # Limit summary to one sentence
+    return summary if summary else DEFAULT_SUMMARY
+
+async def summarize_chunks(chunks: List[str], cache: Optional[ResultCache] = None) -> str:
+    """
+    Map-reduce summarization: summarize the chunks concurrently (at most
+    SUMMARY_FANOUT at a time), then summarize the joined section summaries.
+    Section summaries are cached by chunk content, so after a small edit only
+    the changed chunks are sent to the model again.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_FANOUT)
+
+    async def summarize_chunk(chunk: str) -> str:
+        key = cache_key(chunk, inference_backend.model, f"{PROMPT_VERSION}-section")
+        cached = await run_in_threadpool(cache.get, key) if cache else None
+        if cached:
+            return cached["summary"]
+        async with semaphore:
+            summary = await summarize_section(chunk)
+        if cache and summary != DEFAULT_SUMMARY:
+            await run_in_threadpool(cache.put, key, {"summary": summary})
+        return summary
+
+    partials = [summary for summary in await asyncio.gather(*map(summarize_chunk, chunks)) if summary != DEFAULT_SUMMARY]
+    if not partials:
+        return DEFAULT_SUMMARY
+    merged = "\n".join(partials)
+    if count_tokens(merged) > CHUNK_TOKENS:
+        # Too long for one request; reduce in another map-reduce round
+        return await summarize_chunks(chunk_text(merged), cache)
+    return await summarize_document(merged)
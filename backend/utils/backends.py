@@ -0,0 +1,211 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+from utils.batching import INFERENCE_BATCH_WINDOW_MS, INFERENCE_MAX_BATCH, MicroBatcher
+from utils.inference import InferenceClient
+from utils.metrics import INFERENCE_BATCH_SIZE, INFERENCE_PROMPTS
+
+# Load environment variables
+load_dotenv()
+
+# Inference backend configuration
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "remote")  # "remote" (Hugging Face API) or "local" (in-process CPU model)
+ANALYSIS_MODEL = os.getenv("ANALYSIS_MODEL", "google/flan-t5-large")  # Model queried by the remote backend
+LOCAL_MODEL = os.getenv("LOCAL_MODEL", "google/flan-t5-small")  # Model loaded by the local backend
+LOCAL_RUNTIME = os.getenv("LOCAL_RUNTIME", "transformers")  # "transformers" (PyTorch) or "onnx" (ONNX Runtime via optimum)
+LOCAL_MAX_BATCH = int(os.getenv("LOCAL_MAX_BATCH", "8"))  # Prompts run through the local model at once
+LOCAL_THREADS = int(os.getenv("LOCAL_THREADS", "0"))  # CPU threads for the local model; 0 leaves the runtime default
+
+INFERENCE_BACKENDS = ("remote", "local")
+
+
+class InferenceBackend:
+    """
+    Generates text for a list of prompts. Prompts from concurrent callers are
+    micro-batched (see utils/batching.py), so implementations only provide
+    _generate, which receives one batch of prompts sharing a max_length.
+    Latency is recorded per call and per batch so backends can be compared
+    through stats().
+    """
+
+    name = ""
+
+    def __init__(self, model: str, batch_window_ms: float = INFERENCE_BATCH_WINDOW_MS, max_batch: int = INFERENCE_MAX_BATCH):
+        self.model = model
+        self._batcher = MicroBatcher(self._run_batch, batch_window_ms, max_batch)
+        self._calls = 0
+        self._prompts = 0
+        self._errors = 0
+        self._latency_ms = 0.0
+        self._batch_ms = 0.0
+        self._started = time.monotonic()
+
+    async def generate(self, prompts: List[str], max_length: int) -> List[str]:
+        """
+        Return one generated text per prompt, in order. If generation fails
+        the error is counted in stats() and raised to the caller.
+        """
+        start = time.perf_counter()
+        try:
+            return list(await asyncio.gather(*(self._batcher.submit(prompt, max_length) for prompt in prompts)))
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._calls += 1
+            self._prompts += len(prompts)
+            self._latency_ms += (time.perf_counter() - start) * 1000
+
+    async def _run_batch(self, prompts: List[str], max_length: int) -> List[str]:
+        INFERENCE_PROMPTS.inc(self.name, amount=len(prompts))
+        INFERENCE_BATCH_SIZE.observe(len(prompts), self.name)
+        start = time.perf_counter()
+        try:
+            return await self._generate(prompts, max_length)
+        finally:
+            self._batch_ms += (time.perf_counter() - start) * 1000
+
+    async def _generate(self, prompts: List[str], max_length: int) -> List[str]:
+        raise NotImplementedError
+
+    async def close(self):
+        await self._batcher.close()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        batching = self._batcher.stats()
+        return {
+            "backend": self.name,
+            "model": self.model,
+            "calls": self._calls,
+            "prompts": self._prompts,
+            "errors": self._errors,
+            "avgLatencyMs": round(self._latency_ms / self._calls, 2) if self._calls else None,
+            "promptsPerSecond": round(self._prompts / elapsed, 3) if elapsed else None,
+            **batching,
+            "avgBatchMs": round(self._batch_ms / batching["batches"], 2) if batching["batches"] else None,
+        }
+
+
+def extract_generated_text(response: Any) -> str:
+    """
+    Pull the generated text out of an Inference API response.
+    """
+    if isinstance(response, list) and len(response) > 0:
+        return response[0].get("generated_text", "").strip()
+    if isinstance(response, dict):
+        return response.get("generated_text", "").strip()
+    return ""
+
+
+class RemoteBackend(InferenceBackend):
+    """
+    Sends each batch of prompts to the Hugging Face Inference API as one
+    request with a list of inputs, over the shared client.
+    """
+
+    name = "remote"
+
+    def __init__(self, model: str = ANALYSIS_MODEL, client: Optional[InferenceClient] = None, **batching):
+        super().__init__(model, **batching)
+        self._client = client or InferenceClient()
+
+    async def _generate(self, prompts: List[str], max_length: int) -> List[str]:
+        inputs = prompts[0] if len(prompts) == 1 else prompts
+        response = await self._client.query(self.model, {"inputs": inputs, "parameters": {"max_length": max_length}})
+        if len(prompts) == 1:
+            return [extract_generated_text(response).replace(prompts[0], "")]
+        # One result per input; an error object (e.g. the model still loading) fails the whole batch
+        if not isinstance(response, list) or len(response) != len(prompts):
+            return [""] * len(prompts)
+        return [extract_generated_text(result).replace(prompt, "") for prompt, result in zip(prompts, response)]
+
+    async def close(self):
+        await super().close()
+        await self._client.close()
+
+
+# Loaded pipelines by (runtime, model), shared by every backend in the process
+_pipelines: Dict[Tuple[str, str], Any] = {}
+_pipelines_lock = threading.Lock()
+
+
+def load_pipeline(model: str, runtime: str = LOCAL_RUNTIME):
+    """
+    Load a text2text-generation pipeline once per process. transformers (and
+    optimum for ONNX) are optional dependencies imported only here.
+    """
+    with _pipelines_lock:
+        if (runtime, model) in _pipelines:
+            return _pipelines[(runtime, model)]
+        try:
+            from transformers import AutoTokenizer, pipeline
+        except ImportError:
+            raise RuntimeError("The local inference backend requires transformers: pip install transformers torch")
+        if LOCAL_THREADS > 0:
+            try:
+                import torch
+                torch.set_num_threads(LOCAL_THREADS)
+            except ImportError:
+                pass
+        if runtime == "onnx":
+            try:
+                from optimum.onnxruntime import ORTModelForSeq2SeqLM
+            except ImportError:
+                raise RuntimeError("LOCAL_RUNTIME=onnx requires optimum: pip install optimum[onnxruntime]")
+            generator = pipeline(
+                "text2text-generation",
+                model=ORTModelForSeq2SeqLM.from_pretrained(model, export=True),
+                tokenizer=AutoTokenizer.from_pretrained(model),
+            )
+        else:
+            generator = pipeline("text2text-generation", model=model, device=-1)
+        _pipelines[(runtime, model)] = generator
+        return generator
+
+
+class LocalBackend(InferenceBackend):
+    """
+    Runs a seq2seq model on the CPU inside the server process.
+
+    The model is loaded on first use and shared by all job workers. Each
+    micro-batch of prompts from concurrent uploads goes through the model
+    as one call, in a thread so the event loop stays free; calls are
+    serialized because they share the model.
+    """
+
+    name = "local"
+
+    def __init__(self, model: str = LOCAL_MODEL, runtime: str = LOCAL_RUNTIME, max_batch: int = LOCAL_MAX_BATCH, **batching):
+        super().__init__(model, max_batch=max_batch, **batching)
+        self._runtime = runtime
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _generate(self, prompts: List[str], max_length: int) -> List[str]:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            generator = await run_in_threadpool(load_pipeline, self.model, self._runtime)
+            outputs = await run_in_threadpool(generator, prompts, max_length=max_length, batch_size=len(prompts))
+        return [extract_generated_text(output) for output in outputs]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "runtime": self._runtime,
+            "loaded": (self._runtime, self.model) in _pipelines,
+        }
+
+
+def create_backend(kind: str = INFERENCE_BACKEND) -> InferenceBackend:
+    if kind == "local":
+        return LocalBackend()
+    if kind == "remote":
+        return RemoteBackend()
+    raise ValueError(f"Unknown INFERENCE_BACKEND {kind!r}; use one of: {', '.join(INFERENCE_BACKENDS)}.")
@@ -0,0 +1,111 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Micro-batching configuration
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "10"))  # How long the first prompt waits for others
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "16"))  # Batches are sent early once this full
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent callers and hands them to `run`
+    as one list.
+
+    Items are grouped by key, since only items with the same key (e.g. the
+    same generation parameters) can share a batch. A group is sent when
+    `window_ms` has passed since its first item or as soon as it holds
+    `max_batch` items, whichever comes first. `run(items, key)` must return
+    one result per item, in order, and each caller gets its own result back.
+    Batches run concurrently; a failed batch fails every caller in it.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[List[Any], Hashable], Awaitable[List[Any]]],
+        window_ms: float = INFERENCE_BATCH_WINDOW_MS,
+        max_batch: int = INFERENCE_MAX_BATCH,
+    ):
+        self._run = run
+        self._window = window_ms / 1000
+        self._max_batch = max(1, max_batch)
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._batches = 0
+        self._items = 0
+        self._full_batches = 0
+
+    async def submit(self, item: Any, key: Hashable = None) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future))
+        if len(batch) >= self._max_batch:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self._window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        # Callers that gave up while waiting are dropped from the batch
+        batch = [(item, future) for item, future in self._pending.pop(key, []) if not future.cancelled()]
+        if not batch:
+            return
+        self._batches += 1
+        self._items += len(batch)
+        if len(batch) >= self._max_batch:
+            self._full_batches += 1
+        task = asyncio.ensure_future(self._execute(batch, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, batch: List[Tuple[Any, asyncio.Future]], key: Hashable):
+        try:
+            results = await self._run([item for item, _ in batch], key)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """
+        Cancel batches in flight and any callers still waiting.
+        """
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers = {}
+        for batch in self._pending.values():
+            for _, future in batch:
+                future.cancel()
+        self._pending = {}
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batchWindowMs": self._window * 1000,
+            "maxBatch": self._max_batch,
+            "batches": self._batches,
+            "fullBatches": self._full_batches,
+            "avgBatchSize": round(self._items / self._batches, 2) if self._batches else None,
+            "batchesInFlight": len(self._tasks),
+        }
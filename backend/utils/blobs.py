@@ -0,0 +1,383 @@
+import os
+import shutil
+import uuid
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+from fastapi.concurrency import iterate_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from utils.db import SQLiteDatabase
+
+# Load environment variables
+load_dotenv()
+
+# Blob storage configuration
+BLOB_STORE = os.getenv("BLOB_STORE", "local")  # local, or s3 for an S3-compatible object store
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join("data", "blobs"))  # Local blobs and the reference count database
+BLOB_S3_BUCKET = os.getenv("BLOB_S3_BUCKET", "")
+BLOB_S3_PREFIX = os.getenv("BLOB_S3_PREFIX", "blobs/")
+BLOB_S3_ENDPOINT = os.getenv("BLOB_S3_ENDPOINT") or None  # e.g. a local MinIO or moto server
+BLOB_CHUNK_BYTES = 256 * 1024  # Read size when streaming a blob
+
+# Applied in order by SQLiteDatabase
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS blobs (
+        hash TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        refs INTEGER NOT NULL
+    )
+    """,
+]
+
+
+class BlobStore:
+    """
+    Content-addressed storage for original uploads, keyed by SHA-256.
+
+    Each blob is stored once however many documents reference it; a SQLite
+    table counts the references, and the blob is removed with its last one.
+    Reference changes and the matching object writes and deletes happen in
+    one write transaction, so a blob can't be deleted while a new document
+    is linking to it.
+    """
+
+    name = ""
+
+    def __init__(self, db_path: str):
+        self._db = SQLiteDatabase(db_path, MIGRATIONS)
+
+    def add(self, path: str, sha256: str, size: int) -> bool:
+        """
+        Store the file at `path` under its hash and add a reference to it.
+        The file may be moved rather than copied. Returns True if the blob
+        was new.
+        """
+        staged = self._stage(path, sha256)
+        connection = self._db.connection()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT refs FROM blobs WHERE hash = ?", (sha256,)).fetchone()
+            connection.execute(
+                "INSERT INTO blobs (hash, size, refs) VALUES (?, ?, 1) ON CONFLICT (hash) DO UPDATE SET refs = refs + 1",
+                (sha256, size),
+            )
+            self._commit(path, staged, sha256)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            self._discard(staged)
+            raise
+        return row is None
+
+    def release(self, sha256: str):
+        """
+        Drop a reference, deleting the blob when none are left.
+        """
+        connection = self._db.connection()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("UPDATE blobs SET refs = refs - 1 WHERE hash = ?", (sha256,))
+            if connection.execute("DELETE FROM blobs WHERE hash = ? AND refs <= 0", (sha256,)).rowcount:
+                self._delete(sha256)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def size(self, sha256: str) -> Optional[int]:
+        row = self._db.connection().execute("SELECT size FROM blobs WHERE hash = ?", (sha256,)).fetchone()
+        return row["size"] if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        row = self._db.connection().execute(
+            "SELECT COUNT(*) AS blobs, COALESCE(SUM(size), 0) AS bytes, COALESCE(SUM(refs), 0) AS refs, "
+            "COALESCE(SUM(size * refs), 0) AS referenced FROM blobs"
+        ).fetchone()
+        return {
+            "backend": self.name,
+            "blobs": row["blobs"],
+            "references": row["refs"],
+            "storedBytes": row["bytes"],
+            # Bytes that would be stored without deduplication
+            "referencedBytes": row["referenced"],
+            "dedupRatio": round(row["referenced"] / row["bytes"], 3) if row["bytes"] else None,
+        }
+
+    def local_path(self, sha256: str) -> Optional[str]:
+        """
+        Path of the blob on the local filesystem, if it has one.
+        """
+        return None
+
+    def read(self, sha256: str, start: int, end: int) -> Iterator[bytes]:
+        """
+        Yield the bytes in [start, end) in chunks.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        self._db.close()
+
+    def _stage(self, path: str, sha256: str) -> Optional[str]:
+        """
+        Copy the file towards its final location before taking the write
+        lock, returning a handle for _commit, or None if the blob exists.
+        """
+        raise NotImplementedError
+
+    def _commit(self, path: str, staged: Optional[str], sha256: str):
+        """
+        Make sure the blob exists (it may have been deleted since staging). Called in the write transaction.
+        """
+        raise NotImplementedError
+
+    def _discard(self, staged: Optional[str]):
+        pass
+
+    def _delete(self, sha256: str):
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Blobs as files under sharded directories (ab/cd/abcd...), so no
+    directory grows past a few hundred entries.
+    """
+
+    name = "local"
+
+    def __init__(self, directory: str = BLOB_DIR):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(os.path.join(directory, "blobs.db"))
+
+    def local_path(self, sha256: str) -> Optional[str]:
+        return os.path.join(self._directory, sha256[:2], sha256[2:4], sha256)
+
+    def read(self, sha256: str, start: int, end: int) -> Iterator[bytes]:
+        with open(self.local_path(sha256), "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(BLOB_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def _stage(self, path: str, sha256: str) -> Optional[str]:
+        final = self.local_path(sha256)
+        if os.path.exists(final):
+            return None
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        staged = f"{final}.{uuid.uuid4().hex}.tmp"
+        try:
+            # A rename is free when the spool directory is on the same filesystem
+            os.rename(path, staged)
+        except OSError:
+            shutil.copyfile(path, staged)
+        return staged
+
+    def _commit(self, path: str, staged: Optional[str], sha256: str):
+        final = self.local_path(sha256)
+        if staged is not None:
+            os.replace(staged, final)
+        elif not os.path.exists(final):
+            self._commit(path, self._stage(path, sha256), sha256)
+
+    def _discard(self, staged: Optional[str]):
+        if staged is not None:
+            try:
+                os.unlink(staged)
+            except FileNotFoundError:
+                pass
+
+    def _delete(self, sha256: str):
+        try:
+            os.unlink(self.local_path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore(BlobStore):
+    """
+    Blobs as objects in an S3-compatible bucket. `client` is a boto3 S3
+    client or anything with the same get/put/head/delete object methods;
+    set BLOB_S3_ENDPOINT to use a local stand-in such as MinIO. Reference
+    counts are kept in a local SQLite database.
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str = BLOB_S3_BUCKET, prefix: str = BLOB_S3_PREFIX, client=None, db_path: str = os.path.join(BLOB_DIR, "blobs.db")):
+        if not bucket:
+            raise ValueError("BLOB_S3_BUCKET must be set to use the s3 blob store.")
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("The s3 blob store needs boto3: pip install boto3")
+            client = boto3.client("s3", endpoint_url=BLOB_S3_ENDPOINT)
+        self._bucket = bucket
+        self._prefix = prefix
+        self._client = client
+        super().__init__(db_path)
+
+    def _key(self, sha256: str) -> str:
+        return f"{self._prefix}{sha256[:2]}/{sha256}"
+
+    def _exists(self, sha256: str) -> bool:
+        try:
+            self._client.head_object(Bucket=self._bucket, Key=self._key(sha256))
+            return True
+        except Exception as e:
+            if _status(e) == 404:
+                return False
+            raise
+
+    def _upload(self, path: str, sha256: str):
+        with open(path, "rb") as f:
+            self._client.put_object(Bucket=self._bucket, Key=self._key(sha256), Body=f)
+
+    def read(self, sha256: str, start: int, end: int) -> Iterator[bytes]:
+        if end <= start:
+            return
+        response = self._client.get_object(Bucket=self._bucket, Key=self._key(sha256), Range=f"bytes={start}-{end - 1}")
+        body = response["Body"]
+        try:
+            while True:
+                chunk = body.read(BLOB_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    def _stage(self, path: str, sha256: str) -> Optional[str]:
+        # Upload outside the write transaction; the object is only linked once counted
+        if self._exists(sha256):
+            return None
+        self._upload(path, sha256)
+        return sha256
+
+    def _commit(self, path: str, staged: Optional[str], sha256: str):
+        if staged is None and not self._exists(sha256):
+            self._upload(path, sha256)
+
+    def _delete(self, sha256: str):
+        self._client.delete_object(Bucket=self._bucket, Key=self._key(sha256))
+
+
+def _status(error: Exception) -> Optional[int]:
+    """
+    HTTP status of a botocore ClientError, if it is one.
+    """
+    response = getattr(error, "response", None) or {}
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode") or response.get("Error", {}).get("Code")
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def create_blob_store(kind: str = BLOB_STORE) -> BlobStore:
+    """
+    Build the configured blob store.
+    """
+    if kind == "local":
+        return LocalBlobStore()
+    if kind == "s3":
+        return S3BlobStore()
+    raise ValueError(f"Unknown blob store: {kind}")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range "bytes=" Range header into [start, end). Returns
+    None to send the whole file (no header, a malformed one, or several
+    ranges) and raises ValueError if the range can't be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, separator, last = header[len("bytes="):].strip().partition("-")
+    if not separator or not (first or last) or not (first.isdigit() or not first) or not (last.isdigit() or not last):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise ValueError("Range not satisfiable.")
+        return max(size - int(last), 0), size
+    start = int(first)
+    end = int(last) + 1 if last else size
+    if last and end <= start:
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable.")
+    return start, min(end, size)
+
+
+class BlobResponse(Response):
+    """
+    Serve a blob with ETag revalidation (304) and single byte ranges (206).
+    The ETag is the content hash, so it is strong and never changes for a
+    document. Local blobs are sent with the ASGI zero-copy extension when
+    the server offers it; otherwise the blob is streamed in chunks read in
+    the threadpool.
+    """
+
+    def __init__(self, store: BlobStore, sha256: str, size: int, request_headers: Headers, filename: str, media_type: Optional[str], method: str = "GET"):
+        self._store = store
+        self._sha256 = sha256
+        self._send_body = method != "HEAD"
+        etag = f'"{sha256}"'
+        super().__init__(status_code=200, media_type=media_type or "application/octet-stream")
+        self.raw_headers = [
+            (b"etag", etag.encode("latin-1")),
+            (b"accept-ranges", b"bytes"),
+            (b"content-disposition", f"inline; filename*=UTF-8''{quote(filename)}".encode("latin-1")),
+        ]
+        self._start, self._end = 0, size
+
+        if _etag_matches(request_headers.get("if-none-match"), etag):
+            self.status_code = 304
+            self._end = 0
+            return
+        self.headers["content-type"] = self.media_type
+        if_range = request_headers.get("if-range")
+        try:
+            byte_range = parse_range(request_headers.get("range"), size) if if_range in (None, etag) else None
+        except ValueError:
+            self.status_code = 416
+            self.headers["content-range"] = f"bytes */{size}"
+            self._end = 0
+            byte_range = None
+        if byte_range is not None:
+            self.status_code = 206
+            self._start, self._end = byte_range
+            self.headers["content-range"] = f"bytes {self._start}-{self._end - 1}/{size}"
+        self.headers["content-length"] = str(self._end - self._start)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self._send_body or self._end <= self._start:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        path = self._store.local_path(self._sha256)
+        if path is not None and "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self._start, "count": self._end - self._start})
+            return
+        async for chunk in iterate_in_threadpool(self._store.read(self._sha256, self._start, self._end)):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
@@ -0,0 +1,286 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import parse_options_header
+
+from utils import spool
+from utils.jobs import JOB_WORKERS
+from utils.spool import SpooledFile, iter_spooled_files, iter_zip_entries, spool_body
+
+# Load environment variables
+load_dotenv()
+
+# Bulk upload configuration
+BULK_MAX_UPLOAD_BYTES = int(os.getenv("BULK_MAX_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))  # Per multipart file or ZIP archive
+BULK_MAX_TOTAL_BYTES = int(os.getenv("BULK_MAX_TOTAL_BYTES", str(4 * 1024 * 1024 * 1024)))  # Whole multipart request
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "10000"))  # Files per upload, counting ZIP entries
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", str(2 * JOB_WORKERS)))  # Jobs one bulk upload may have queued or running
+BULK_MAX_CONCURRENT = int(os.getenv("BULK_MAX_CONCURRENT", "2"))  # Bulk uploads spooling or streaming at once, per server process
+BULK_MIN_FREE_BYTES = int(os.getenv("BULK_MIN_FREE_BYTES", str(1024 * 1024 * 1024)))  # Spool disk space bulk uploads must leave free
+
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+
+# (name, spooled file, None) for a usable file, or (name, None, reason) for one that is skipped
+BulkEntry = Tuple[str, Optional[SpooledFile], Optional[str]]
+
+
+class BulkAdmission:
+    """
+    Limits the bulk uploads in progress: at most `max_uploads` at once, and
+    only while the spool directory has room for them. Each admitted upload
+    reserves its declared size (the request limit when it declares none)
+    until its results stream ends, so uploads admitted together can't add
+    up to more than the disk holds. Other uploads are turned away with 503,
+    or 507 when the disk is short.
+    """
+
+    def __init__(self, max_uploads: int = BULK_MAX_CONCURRENT, min_free_bytes: int = BULK_MIN_FREE_BYTES):
+        self._max_uploads = max_uploads
+        self._min_free_bytes = min_free_bytes
+        self._uploads = 0
+        self._reserved = 0
+        self._rejected = 0
+
+    def admit(self, request: Request) -> "BulkReservation":
+        content_type, _ = parse_options_header(request.headers.get("content-type", ""))
+        limit = BULK_MAX_UPLOAD_BYTES if content_type.decode("latin-1") in ZIP_CONTENT_TYPES else BULK_MAX_TOTAL_BYTES
+        content_length = request.headers.get("content-length")
+        size = min(int(content_length), limit) if content_length and content_length.isdigit() else limit
+        if self._uploads >= self._max_uploads:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail="Too many bulk uploads in progress. Try again later.")
+        free = shutil.disk_usage(spool.SPOOL_DIR or tempfile.gettempdir()).free
+        if free - self._reserved - size < self._min_free_bytes:
+            self._rejected += 1
+            raise HTTPException(status_code=507, detail="Not enough spool space for this upload. Try again later.")
+        self._uploads += 1
+        self._reserved += size
+        return BulkReservation(self, size)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "uploads": self._uploads,
+            "maxUploads": self._max_uploads,
+            "reservedBytes": self._reserved,
+            "rejected": self._rejected,
+        }
+
+    def _release(self, size: int):
+        self._uploads -= 1
+        self._reserved -= size
+
+
+class BulkReservation:
+    """
+    One admitted bulk upload's slot and spool space. Releasing it more than once is harmless.
+    """
+
+    def __init__(self, admission: BulkAdmission, size: int):
+        self._admission = admission
+        self._size = size
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._admission._release(self._size)
+
+
+def is_zip(spooled: SpooledFile) -> bool:
+    return spooled.content_type in ZIP_CONTENT_TYPES or spooled.filename.lower().endswith(".zip")
+
+
+async def spool_bulk_upload(
+    request: Request,
+    max_bytes: int = BULK_MAX_UPLOAD_BYTES,
+    max_total_bytes: int = BULK_MAX_TOTAL_BYTES,
+    max_files: int = BULK_MAX_FILES,
+) -> List[SpooledFile]:
+    """
+    Spool every file of a multipart bulk upload, or a ZIP archive sent as the raw request body.
+    """
+    content_type, _ = parse_options_header(request.headers.get("content-type", ""))
+    if content_type.decode("latin-1") in ZIP_CONTENT_TYPES:
+        return [await spool_body(request, "upload.zip", content_type.decode("latin-1"), max_bytes)]
+
+    files: List[SpooledFile] = []
+    try:
+        async for spooled in iter_spooled_files(request, max_bytes, max_total_bytes=max_total_bytes):
+            files.append(spooled)
+            if len(files) > max_files:
+                raise HTTPException(status_code=413, detail=f"Too many files. The limit is {max_files}.")
+    except BaseException:
+        for spooled in files:
+            spooled.discard()
+        raise
+    if not files:
+        raise HTTPException(status_code=400, detail="No files were uploaded.")
+    return files
+
+
+async def iter_bulk_entries(files: Sequence[SpooledFile], max_files: int = BULK_MAX_FILES) -> AsyncGenerator[BulkEntry, None]:
+    """
+    Yield the uploaded files, expanding ZIP archives one entry at a time so
+    only entries about to be processed take up spool space. Past `max_files`
+    entries a final skipped entry is yielded and the rest are dropped.
+    Yielded files belong to the caller; archives and files never reached are
+    removed, including when the caller stops early.
+    """
+    index = 0
+    count = 0
+    try:
+        for index, spooled in enumerate(files):
+            if not is_zip(spooled):
+                count += 1
+                if count > max_files:
+                    spooled.discard()
+                    break
+                yield spooled.filename, spooled, None
+                continue
+            entries = iter_zip_entries(spooled.path)
+            try:
+                while True:
+                    entry = await _next_entry(entries)
+                    if entry is None:
+                        break
+                    count += 1
+                    if count > max_files:
+                        if entry[1]:
+                            entry[1].discard()
+                        break
+                    yield entry
+            except zipfile.BadZipFile:
+                yield spooled.filename, None, "Not a valid ZIP archive."
+            finally:
+                entries.close()
+                spooled.discard()
+            if count > max_files:
+                break
+        if count > max_files:
+            yield files[index].filename, None, f"Too many files. The limit is {max_files}; the rest were skipped."
+        else:
+            index = len(files)
+    finally:
+        for spooled in files[index + 1:]:
+            spooled.discard()
+
+
+async def stream_bulk_results(
+    entries: AsyncGenerator[BulkEntry, None],
+    submit: Callable[[SpooledFile], Awaitable[Any]],
+    max_in_flight: int = BULK_MAX_IN_FLIGHT,
+    wait: Optional[Callable[[Any], Awaitable[Any]]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Submit entries as jobs, keeping at most `max_in_flight` unfinished at
+    once, and yield a result for each file as soon as it finishes (so in
+    completion order), followed by a summary with the batch throughput.
+    `submit` may raise HTTPException to reject a single file, and owns each
+    file passed to it; files not yet submitted when the stream is closed are
+    removed, along with the entries never read. `wait(job)`
+    returns once a job has finished; by default its `done` event is awaited,
+    which only fires for jobs run by this process.
+    """
+    wait = wait or (lambda job: job.done.wait())
+    start = time.perf_counter()
+    results: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_in_flight)
+    trackers: List[asyncio.Task] = []
+    counts = {"completed": 0, "failed": 0, "skipped": 0}
+
+    async def track(job):
+        await wait(job)
+        slots.release()
+        await results.put({
+            "filename": job.status.filename,
+            "jobId": job.status.id,
+            "status": job.status.status,
+            "document": job.status.document,
+            "error": job.status.error,
+        })
+
+    async def produce():
+        try:
+            async for name, spooled, error in entries:
+                if spooled is None:
+                    await results.put({"filename": name, "status": "skipped", "error": error})
+                    continue
+                # Backpressure: wait for one of this upload's jobs to finish before queueing more
+                try:
+                    await slots.acquire()
+                except BaseException:
+                    spooled.discard()
+                    raise
+                try:
+                    job = await submit(spooled)
+                except HTTPException as e:
+                    slots.release()
+                    spooled.discard()
+                    await results.put({"filename": name, "status": "skipped", "error": e.detail})
+                    continue
+                except BaseException:
+                    slots.release()
+                    spooled.discard()
+                    raise
+                trackers.append(asyncio.create_task(track(job)))
+            await asyncio.gather(*trackers)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await asyncio.gather(*trackers)
+            await results.put({"status": "failed", "error": str(e)})
+        finally:
+            # Removes the spool files of entries that were never reached
+            await entries.aclose()
+            await results.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            if result.get("filename") is not None:
+                counts[result["status"] if result["status"] in counts else "failed"] += 1
+            yield result
+        elapsed = time.perf_counter() - start
+        yield {
+            "summary": {
+                "files": sum(counts.values()),
+                **counts,
+                "elapsedSeconds": round(elapsed, 3),
+                "docsPerSecond": round(counts["completed"] / elapsed, 3) if elapsed else None,
+            }
+        }
+    finally:
+        # The client went away or the stream ended; queued jobs still run to completion
+        producer.cancel()
+        for tracker in trackers:
+            tracker.cancel()
+        await asyncio.gather(producer, *trackers, return_exceptions=True)
+
+
+async def _next_entry(entries: Iterator[BulkEntry]) -> Optional[BulkEntry]:
+    """
+    The next ZIP entry, copied out in the threadpool. A copy can't be
+    interrupted, so on cancellation it is waited for and its file removed.
+    """
+    copy = asyncio.ensure_future(run_in_threadpool(next, entries, None))
+    try:
+        return await asyncio.shield(copy)
+    except asyncio.CancelledError:
+        try:
+            entry = await copy
+        except Exception:
+            entry = None
+        if entry and entry[1]:
+            entry[1].discard()
+        raise
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from utils.serving import SHARED_STATE
+
+# Load environment variables
+load_dotenv()
+
+# Result cache configuration. With several server processes the SQLite tier
+# is shared and the memory tier is off by default, so an invalidation made
+# through one process holds for all of them.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "0" if SHARED_STATE else "10000"))  # Entries kept in memory
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", os.path.join("data", "results.db") if SHARED_STATE else "")  # Optional SQLite file for a persistent tier
+RESULT_CACHE_DB_SIZE = int(os.getenv("RESULT_CACHE_DB_SIZE", "1000000"))  # Entries kept on disk
+RESULT_CACHE_TOUCH_BATCH = 100  # Disk hits whose recency is written in one transaction
+
+
+def cache_key(content: str, model: str, prompt_version: str) -> str:
+    """
+    Content-addressed key: the same text analyzed by the same model and prompts maps to the same entry.
+    """
+    digest = hashlib.sha256()
+    for part in (model, prompt_version, content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of analysis results: an in-process LRU in front of an
+    optional SQLite table that survives restarts. Reads don't write: the
+    recency of disk hits is recorded in batches, and before evicting. Disk
+    access blocks, so call it from the threadpool.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, db_path: str = RESULT_CACHE_DB, max_db_entries: int = RESULT_CACHE_DB_SIZE):
+        self._max_entries = max_entries
+        self._max_db_entries = max_db_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = {"memory": 0, "disk": 0}
+        self._misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_count = 0
+        self._touched: Dict[str, float] = {}  # key -> access time not yet written
+        if db_path:
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+            self._db.commit()
+            self._db_count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hits["memory"] += 1
+                return value
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._touched[key] = time.time()
+                    if len(self._touched) >= RESULT_CACHE_TOUCH_BATCH:
+                        self._write_touched()
+                        self._db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self._hits["disk"] += 1
+                    return value
+            self._misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                exists = self._db.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, accessed_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()),
+                )
+                if not exists:
+                    self._db_count += 1
+                self._touched.pop(key, None)
+                self._trim_db()
+                self._db.commit()
+
+    def invalidate(self, key: str) -> bool:
+        with self._lock:
+            removed = self._entries.pop(key, None) is not None
+            self._touched.pop(key, None)
+            if self._db is not None:
+                cursor = self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                self._db_count -= cursor.rowcount
+                removed = removed or cursor.rowcount > 0
+            return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._touched.clear()
+            if self._db is not None:
+                cursor = self._db.execute("DELETE FROM results")
+                self._db.commit()
+                removed = max(removed, cursor.rowcount)
+                self._db_count = 0
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._hits["memory"] + self._hits["disk"]
+        lookups = hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self._max_entries,
+            "diskEntries": self._db_count if self._db is not None else None,
+            "hits": hits,
+            "memoryHits": self._hits["memory"],
+            "diskHits": self._hits["disk"],
+            "misses": self._misses,
+            "hitRate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _trim_db(self):
+        """
+        Evict the least recently used rows once the disk tier is over its limit.
+        """
+        excess = self._db_count - self._max_db_entries
+        if excess > 0:
+            self._write_touched()
+            self._db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self._db_count -= excess
+
+    def _write_touched(self):
+        if self._touched:
+            self._db.executemany(
+                "UPDATE results SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()],
+            )
+            self._touched.clear()
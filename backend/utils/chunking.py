@@ -0,0 +1,103 @@
+import math
+import os
+import re
+import zlib
+from typing import List
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Chunking configuration
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "400"))  # flan-t5 reads 512 tokens; leave room for the prompt
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "100"))  # Content-defined boundaries are only taken past this size
+CHUNK_BOUNDARY_DIVISOR = int(os.getenv("CHUNK_BOUNDARY_DIVISOR", "8"))  # About one unit in N ends a chunk
+TOKENS_PER_WORD = 1.3  # SentencePiece splits many words into more than one piece
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate how many model tokens a text uses without loading a tokenizer.
+    Words count as TOKENS_PER_WORD tokens and punctuation as one each.
+    """
+    words = punctuation = 0
+    for token in _TOKEN_RE.findall(text):
+        if token[0].isalnum() or token[0] == "_":
+            words += 1
+        else:
+            punctuation += 1
+    return math.ceil(words * TOKENS_PER_WORD) + punctuation
+
+
+def _units(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into lines, breaking lines over the limit into sentences and then into word runs.
+    """
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if count_tokens(line) <= max_tokens:
+            units.append(line)
+            continue
+        for sentence in _SENTENCE_RE.split(line):
+            if count_tokens(sentence) <= max_tokens:
+                units.append(sentence)
+                continue
+            words = sentence.split()
+            step = max(1, int(max_tokens / (TOKENS_PER_WORD + 1)))
+            units.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+    return units
+
+
+class Chunker:
+    """
+    Incremental chunk_text: feed text a page at a time as it is extracted,
+    then finish() returns the chunks. Feeding pages gives the same chunks as
+    chunking their join, since chunks are built from whole lines.
+
+    Boundaries are content-defined: past `min_tokens`, a chunk ends after any
+    line whose checksum hits the divisor. An edit therefore only changes the
+    chunk it falls in (and at most the next one), so cached summaries of the
+    other chunks stay valid.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_TOKENS, min_tokens: int = CHUNK_MIN_TOKENS):
+        self._max_tokens = max_tokens
+        self._min_tokens = min_tokens
+        self.chunks: List[str] = []
+        self._current: List[str] = []
+        self._current_tokens = 0
+
+    def feed(self, text: str):
+        for unit in _units(text, self._max_tokens):
+            tokens = count_tokens(unit)
+            if self._current and self._current_tokens + tokens > self._max_tokens:
+                self._close()
+            self._current.append(unit)
+            self._current_tokens += tokens
+            if self._current_tokens >= self._min_tokens and zlib.crc32(unit.encode("utf-8")) % CHUNK_BOUNDARY_DIVISOR == 0:
+                self._close()
+
+    def finish(self) -> List[str]:
+        if self._current:
+            self._close()
+        return self.chunks
+
+    def _close(self):
+        self.chunks.append("\n".join(self._current))
+        self._current, self._current_tokens = [], 0
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_TOKENS, min_tokens: int = CHUNK_MIN_TOKENS) -> List[str]:
+    """
+    Split text into chunks of at most `max_tokens` estimated tokens (see Chunker).
+    """
+    chunker = Chunker(max_tokens, min_tokens)
+    chunker.feed(text)
+    return chunker.finish()
@@ -0,0 +1,247 @@
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Classifier configuration
+CLASSIFIER_ENABLED = os.getenv("CLASSIFIER_ENABLED", "true").lower() == "true"
+CLASSIFIER_FEATURES = int(os.getenv("CLASSIFIER_FEATURES", str(2 ** 16)))  # Hashed feature dimensions
+CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", "0.15"))  # Minimum cosine similarity to the best centroid
+CLASSIFIER_MARGIN = float(os.getenv("CLASSIFIER_MARGIN", "0.05"))  # Minimum lead over the runner-up category
+CLASSIFIER_MIN_EXAMPLES = int(os.getenv("CLASSIFIER_MIN_EXAMPLES", "5"))  # Documents a category needs before it is predicted
+CLASSIFIER_TRAIN_LIMIT = int(os.getenv("CLASSIFIER_TRAIN_LIMIT", "5000"))  # Most recent documents used to train at startup
+CLASSIFIER_MAX_CATEGORIES = int(os.getenv("CLASSIFIER_MAX_CATEGORIES", "100"))  # Labels past this are not learned
+CLASSIFIER_MAX_TOKENS = 5000  # Only the opening of long documents is vectorized
+CLASSIFIER_MAX_LABEL_LENGTH = 64  # Longer labels are truncated
+CLASSIFIER_IDF_REFRESH = 0.1  # Growth in documents, as a fraction, before IDF weights and all centroids are rebuilt
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_LABEL_TRIM = " \t\r\n\"'`.,:;!?*-"
+
+
+def hash_terms(text: str) -> np.ndarray:
+    """
+    CRC32 hashes of the words and word pairs in the opening of a text.
+    """
+    words = _WORD_RE.findall(text.lower())[:CLASSIFIER_MAX_TOKENS]
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return np.fromiter((zlib.crc32(term.encode("utf-8")) for term in terms), dtype=np.int64, count=len(terms))
+
+
+def normalize_label(label: str) -> str:
+    """
+    Tidy a free-text label: collapse whitespace, drop surrounding quotes and
+    punctuation, and cap its length. Returns "" for a label with no content.
+    """
+    return " ".join(label.split()).strip(_LABEL_TRIM)[:CLASSIFIER_MAX_LABEL_LENGTH].strip()
+
+
+def vectorize(text: str, features: int = CLASSIFIER_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hash the words and word pairs of a text into a sparse term-frequency
+    vector with sublinear (log) weighting. Returns sorted feature indices and
+    their weights.
+    """
+    hashes = hash_terms(text)
+    if not len(hashes):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    indices, counts = np.unique(hashes % features, return_counts=True)
+    return indices, (1 + np.log(counts)).astype(np.float32)
+
+
+class CentroidClassifier:
+    """
+    Nearest-centroid classifier over hashed TF-IDF vectors.
+
+    Each category keeps the sum of its documents' term-frequency vectors and
+    the document frequency of every feature is counted, so learning a new
+    document is a few array additions. Learning renormalizes only the
+    centroids of the categories it touched, with the current IDF weights;
+    the weights and every centroid are rebuilt once the document count has
+    grown by CLASSIFIER_IDF_REFRESH. Labels are normalized and at most
+    `max_categories` are kept, in rows that grow by doubling. A prediction
+    is only trusted when its cosine similarity and its lead over the
+    runner-up clear the configured thresholds; otherwise the caller falls
+    back to the language model.
+    """
+
+    def __init__(
+        self,
+        features: int = CLASSIFIER_FEATURES,
+        threshold: float = CLASSIFIER_THRESHOLD,
+        margin: float = CLASSIFIER_MARGIN,
+        min_examples: int = CLASSIFIER_MIN_EXAMPLES,
+        max_categories: int = CLASSIFIER_MAX_CATEGORIES,
+    ):
+        self._features = features
+        self._threshold = threshold
+        self._margin = margin
+        self._min_examples = min_examples
+        self._max_categories = max_categories
+        self._lock = threading.Lock()
+        self._labels: List[str] = []  # Display label of each category, as first seen
+        self._keys: Dict[str, int] = {}  # Case-insensitive label -> row
+        # Rows past len(self._labels) are spare capacity
+        self._sums = np.zeros((0, features), dtype=np.float32)
+        self._examples = np.zeros(0, dtype=np.int64)
+        self._document_frequency = np.zeros(features, dtype=np.float32)
+        self._documents = 0
+        self._centroids: Optional[np.ndarray] = None  # Normalized IDF-weighted centroids; None until built
+        self._idf: Optional[np.ndarray] = None
+        self._idf_documents = 0  # Document count the IDF weights were computed from
+        self._dropped_labels = 0
+        self._predictions = 0
+        self._accepted = 0
+        self._classify_ms = 0.0
+
+    def learn(self, text: str, label: str):
+        """
+        Add a labelled document to its category's centroid.
+        """
+        self.learn_many([text], [label])
+
+    def learn_many(self, texts: List[str], labels: List[str]):
+        vectors = [vectorize(text, self._features) for text in texts]
+        with self._lock:
+            touched = set()
+            for (indices, weights), label in zip(vectors, labels):
+                label = normalize_label(label)
+                if not len(indices) or not label:
+                    continue
+                row = self._row(label)
+                if row is None:
+                    self._dropped_labels += 1
+                    continue
+                norm = np.linalg.norm(weights)
+                self._sums[row, indices] += weights / norm
+                self._examples[row] += 1
+                self._document_frequency[indices] += 1
+                self._documents += 1
+                touched.add(row)
+            if self._centroids is None or not touched:
+                return
+            if self._documents >= self._idf_documents * (1 + CLASSIFIER_IDF_REFRESH):
+                self._centroids = None
+            else:
+                rows = sorted(touched)
+                self._centroids[rows] = _unit_rows(self._sums[rows] * self._idf)
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        Return the predicted label and its similarity, or (None, similarity) when not confident.
+        """
+        return self.predict_many([text])[0]
+
+    def predict_many(self, texts: List[str]) -> List[Tuple[Optional[str], float]]:
+        """
+        Classify a batch of documents with one gather and reduce over the
+        centroid matrix.
+        """
+        start = time.perf_counter()
+        vectors = [vectorize(text, self._features) for text in texts]
+        results: List[Tuple[Optional[str], float]] = [(None, 0.0)] * len(texts)
+        lengths = np.array([len(indices) for indices, _ in vectors])
+        present = np.flatnonzero(lengths)
+        indices = np.concatenate([vectors[i][0] for i in present]) if len(present) else None
+        with self._lock:
+            centroids, idf, eligible = self._prepare()
+            labels = list(self._labels)
+            if centroids is not None and indices is not None:
+                # Gathered under the lock, since learning updates centroid rows in place
+                gathered = centroids[:, indices]
+                weights = np.concatenate([vectors[i][1] for i in present]) * idf[indices]
+        if centroids is not None and indices is not None:
+            offsets = np.concatenate(([0], np.cumsum(lengths[present])[:-1]))
+            # Per-document norms, then cosine similarity against every centroid
+            norms = np.sqrt(np.add.reduceat(weights * weights, offsets))
+            scores = np.add.reduceat(gathered * weights, offsets, axis=1) / norms
+            columns = np.arange(scores.shape[1])
+            # Categories without enough examples can't win, but still count as runner-up
+            best = np.argmax(np.where(eligible[:, None], scores, -1.0), axis=0)
+            best_scores = scores[best, columns]
+            if len(scores) > 1:
+                second, first = np.partition(scores, len(scores) - 2, axis=0)[-2:]
+                # The best row is the top score unless an ineligible category outscored it
+                runner_up = np.where(best_scores >= first, second, first)
+            else:
+                runner_up = np.zeros(len(columns), dtype=scores.dtype)
+            confident = eligible[best] & (best_scores >= self._threshold) & (best_scores - np.maximum(runner_up, 0.0) >= self._margin)
+            for column, document in enumerate(present):
+                results[document] = (labels[best[column]] if confident[column] else None, round(float(best_scores[column]), 4))
+        with self._lock:
+            self._predictions += len(texts)
+            self._accepted += sum(1 for label, _ in results if label)
+            self._classify_ms += (time.perf_counter() - start) * 1000
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            fallbacks = self._predictions - self._accepted
+            return {
+                "documents": self._documents,
+                "categories": {label: int(count) for label, count in zip(self._labels, self._examples)},
+                "maxCategories": self._max_categories,
+                "droppedLabels": self._dropped_labels,
+                "threshold": self._threshold,
+                "margin": self._margin,
+                "predictions": self._predictions,
+                "classifierRouted": self._accepted,
+                "modelRouted": fallbacks,
+                "classifierRatio": round(self._accepted / self._predictions, 4) if self._predictions else None,
+                "avgClassifyMs": round(self._classify_ms / self._predictions, 3) if self._predictions else None,
+            }
+
+    def _row(self, label: str) -> Optional[int]:
+        """
+        The row of a label's category, added if there is room; None once max_categories are in use.
+        """
+        key = label.lower()
+        if key in self._keys:
+            return self._keys[key]
+        count = len(self._labels)
+        if count >= self._max_categories:
+            return None
+        if count == len(self._sums):
+            capacity = min(max(4, count * 2), self._max_categories)
+            self._sums = _grow(self._sums, capacity)
+            self._examples = _grow(self._examples, capacity)
+            # Rebuilt at the next prediction, at the new size
+            self._centroids = None
+        self._keys[key] = count
+        self._labels.append(label)
+        return count
+
+    def _prepare(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Build the IDF-weighted, unit-length centroids if learning invalidated them. Call with the lock held.
+        """
+        count = len(self._labels)
+        if not count:
+            return None, None, None
+        if self._centroids is None:
+            self._idf = (np.log((1 + self._documents) / (1 + self._document_frequency)) + 1).astype(np.float32)
+            self._idf_documents = self._documents
+            self._centroids = _unit_rows(self._sums * self._idf)
+        return self._centroids[:count], self._idf, self._examples[:count] >= self._min_examples
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _grow(array: np.ndarray, rows: int) -> np.ndarray:
+    """
+    A copy of `array` with room for `rows` rows, the new ones zero.
+    """
+    grown = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import threading
+from typing import List, Sequence
+
+
+class SQLiteDatabase:
+    """
+    SQLite file in WAL mode with one connection per thread, so reads from the
+    threadpool don't block each other. Migrations are applied in order and
+    PRAGMA user_version records how many have run.
+    """
+
+    def __init__(self, path: str, migrations: Sequence[str] = ()):
+        self._path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._migrate(migrations)
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Durable across crashes in WAL mode, fewer fsyncs
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def _migrate(self, migrations: Sequence[str]):
+        connection = self.connection()
+        # Take the write lock first, so server processes starting together migrate one at a time
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            for statement in migrations[version:]:
+                connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {len(migrations)}")
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
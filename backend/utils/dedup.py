@@ -0,0 +1,100 @@
+import os
+import time
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from utils.db import SQLiteDatabase
+from utils.metrics import UPLOAD_DEDUP
+
+# Load environment variables
+load_dotenv()
+
+# Upload deduplication configuration
+IDEMPOTENCY_DB = os.getenv("IDEMPOTENCY_DB", os.path.join("data", "idempotency.db"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 60 * 60)))  # Seconds an Idempotency-Key is remembered
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Reasons an upload is answered without being processed
+DEDUP_REASONS = ("idempotency-key", "in-flight", "content-hash")
+
+# Applied in order by SQLiteDatabase
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        job_id TEXT NOT NULL,
+        document_id TEXT,
+        created REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idempotency_keys_job_id ON idempotency_keys (job_id)",
+    "CREATE INDEX IF NOT EXISTS idempotency_keys_created ON idempotency_keys (created)",
+]
+
+
+class IdempotencyStore:
+    """
+    Remembers which job each client-supplied Idempotency-Key started, and
+    the document it produced, so a retried request gets the original
+    result. Keys expire after IDEMPOTENCY_TTL seconds.
+    """
+
+    def __init__(self, path: str = IDEMPOTENCY_DB, ttl: float = IDEMPOTENCY_TTL):
+        self._db = SQLiteDatabase(path, MIGRATIONS)
+        self._ttl = ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._db.connection().execute(
+            "SELECT content_hash, job_id, document_id FROM idempotency_keys WHERE key = ? AND created >= ?",
+            (key, time.time() - self._ttl),
+        ).fetchone()
+        if not row:
+            return None
+        return {"contentHash": row["content_hash"], "jobId": row["job_id"], "documentId": row["document_id"]}
+
+    def put(self, key: str, content_hash: str, job_id: str, document_id: Optional[str] = None):
+        connection = self._db.connection()
+        connection.execute("DELETE FROM idempotency_keys WHERE created < ?", (time.time() - self._ttl,))
+        connection.execute(
+            "INSERT OR REPLACE INTO idempotency_keys (key, content_hash, job_id, document_id, created) VALUES (?, ?, ?, ?, ?)",
+            (key, content_hash, job_id, document_id, time.time()),
+        )
+        connection.commit()
+
+    def set_document(self, job_id: str, document_id: str):
+        """
+        Record the document a keyed job produced, for retries after the job has left the queue's history.
+        """
+        connection = self._db.connection()
+        connection.execute("UPDATE idempotency_keys SET document_id = ? WHERE job_id = ?", (document_id, job_id))
+        connection.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class DedupStats:
+    """
+    Counts uploads and how many were answered with an earlier result.
+    """
+
+    def __init__(self):
+        self._uploads = 0
+        self._hits = {reason: 0 for reason in DEDUP_REASONS}
+
+    def upload(self):
+        self._uploads += 1
+
+    def hit(self, reason: str):
+        self._hits[reason] += 1
+        UPLOAD_DEDUP.inc(reason)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(self._hits.values())
+        return {
+            "uploads": self._uploads,
+            "hits": dict(self._hits),
+            "hitRate": round(hits / self._uploads, 4) if self._uploads else None,
+        }
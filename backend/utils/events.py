@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from utils.db import SQLiteDatabase
+
+# Load environment variables
+load_dotenv()
+
+# Event stream configuration
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))  # Undelivered events kept per subscriber
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))  # Seconds between keep-alive comments on idle streams
+EVENTS_DB = os.getenv("EVENTS_DB", os.path.join("data", "events.db"))  # Relays events between server processes
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "0.2"))  # Seconds between checks for other processes' events
+EVENTS_LOG_TTL = 300  # Seconds relayed events are kept
+
+# Stages a job reports, in order; a job ends with completed or failed
+JOB_EVENTS = ("received", "extracted", "recognized", "categorized", "summarized", "indexed", "completed", "failed")
+
+# Applied in order by SQLiteDatabase
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_id TEXT NOT NULL,
+        worker INTEGER NOT NULL,
+        event TEXT NOT NULL,
+        created REAL NOT NULL
+    )
+    """,
+]
+
+
+class Subscriber:
+    """
+    One client's bounded queue of pending events. A subscriber that falls
+    too far behind has its queue replaced by a single "resync" event, so a
+    slow client costs a fixed amount of memory and never slows publishing.
+    """
+
+    def __init__(self, job_ids: Optional[Iterable[str]], maxsize: int):
+        self.job_ids: Optional[Set[str]] = set(job_ids) if job_ids else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def deliver(self, event: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class EventLog:
+    """
+    Events published by every server process, in SQLite, so a client
+    streaming from one process sees jobs that another one runs. Each
+    process appends its own events and tails the others'.
+    """
+
+    def __init__(self, path: str = EVENTS_DB, ttl: float = EVENTS_LOG_TTL):
+        self._db = SQLiteDatabase(path, MIGRATIONS)
+        self._ttl = ttl
+        self._appends = 0
+
+    def append_many(self, events: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Append (job id, event) pairs in one transaction.
+        """
+        connection = self._db.connection()
+        now = time.time()
+        connection.executemany(
+            "INSERT INTO events (job_id, worker, event, created) VALUES (?, ?, ?, ?)",
+            [(job_id, os.getpid(), json.dumps(event), now) for job_id, event in events],
+        )
+        previous, self._appends = self._appends, self._appends + len(events)
+        if previous // 100 != self._appends // 100:
+            connection.execute("DELETE FROM events WHERE created < ?", (now - self._ttl,))
+        connection.commit()
+
+    def last(self) -> int:
+        return self._db.connection().execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+
+    def read(self, after: int) -> List[tuple]:
+        """
+        (seq, job id, event) for other processes' events after `after`.
+        """
+        rows = self._db.connection().execute(
+            "SELECT seq, job_id, event FROM events WHERE seq > ? AND worker != ? ORDER BY seq",
+            (after, os.getpid()),
+        ).fetchall()
+        return [(row["seq"], row["job_id"], json.loads(row["event"])) for row in rows]
+
+    def close(self):
+        self._db.close()
+
+
+class EventBroker:
+    """
+    Fans job progress events out to subscribers. Subscribers to specific
+    jobs are indexed by job id, so publishing an event only touches the
+    clients watching that job plus those watching everything.
+    """
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, log: Optional[EventLog] = None):
+        self._queue_size = queue_size
+        self._log = log
+        self._relay: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._outbox: List[Tuple[str, Dict[str, Any]]] = []  # Published events not yet in the log
+        self._outbox_ready = asyncio.Event()
+        self._stopping = False
+        self._all: Set[Subscriber] = set()
+        self._by_job: Dict[str, Set[Subscriber]] = {}
+        self._next_id = 0
+        self._published = 0
+        self._relayed = 0
+
+    async def start(self, interval: float = EVENTS_POLL_INTERVAL):
+        """
+        With a log, write this process's events to it and deliver other server
+        processes' events to this process's subscribers.
+        """
+        if self._log is not None:
+            self._writer = asyncio.create_task(self._write_events())
+            self._relay = asyncio.create_task(self._relay_events(interval))
+
+    async def stop(self):
+        if self._relay is not None:
+            self._relay.cancel()
+            await asyncio.gather(self._relay, return_exceptions=True)
+            self._relay = None
+        if self._writer is not None:
+            # The writer exits once everything published so far is in the log
+            self._stopping = True
+            self._outbox_ready.set()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        if self._log is not None:
+            self._log.close()
+
+    def subscribe(self, job_ids: Optional[Iterable[str]] = None) -> Subscriber:
+        subscriber = Subscriber(job_ids, self._queue_size)
+        if subscriber.job_ids is None:
+            self._all.add(subscriber)
+        else:
+            for job_id in subscriber.job_ids:
+                self._by_job.setdefault(job_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber.job_ids is None:
+            self._all.discard(subscriber)
+            return
+        for job_id in subscriber.job_ids:
+            watchers = self._by_job.get(job_id)
+            if watchers is not None:
+                watchers.discard(subscriber)
+                if not watchers:
+                    del self._by_job[job_id]
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        self._published += 1
+        if self._log is not None:
+            # Written in batches by _write_events, off the event loop
+            self._outbox.append((job_id, event))
+            self._outbox_ready.set()
+        self._deliver(job_id, event)
+
+    def job_event(self, job, stage: str, **data):
+        """
+        Publish a stage event for a job.
+        """
+        self.publish(job.id, {
+            "type": "job",
+            "jobId": job.id,
+            "filename": job.status.filename,
+            "stage": stage,
+            "status": job.status.status,
+            **data,
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        subscribers = set(self._all)
+        for watchers in self._by_job.values():
+            subscribers.update(watchers)
+        return {
+            "subscribers": len(subscribers),
+            "watchedJobs": len(self._by_job),
+            "published": self._published,
+            "relayed": self._relayed if self._log is not None else None,
+            "dropped": sum(subscriber.dropped for subscriber in subscribers),
+        }
+
+    def _deliver(self, job_id: str, event: Dict[str, Any]):
+        self._next_id += 1
+        event = {"id": self._next_id, **event}
+        for subscriber in self._all:
+            subscriber.deliver(event)
+        for subscriber in self._by_job.get(job_id, ()):
+            subscriber.deliver(event)
+
+    async def _write_events(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._outbox_ready.wait()
+            self._outbox_ready.clear()
+            # Events published while a batch is written go in the next batch
+            batch, self._outbox = self._outbox, []
+            if batch:
+                try:
+                    await loop.run_in_executor(None, self._log.append_many, batch)
+                except sqlite3.Error:
+                    # Other processes miss these events; their clients resync from job status
+                    pass
+            if self._stopping and not self._outbox:
+                return
+
+    async def _relay_events(self, interval: float):
+        loop = asyncio.get_running_loop()
+        seq = await loop.run_in_executor(None, self._log.last)
+        while True:
+            await asyncio.sleep(interval)
+            if not self._all and not self._by_job:
+                # Nobody to deliver to; skip what was published meanwhile
+                seq = await loop.run_in_executor(None, self._log.last)
+                continue
+            for seq, job_id, event in await loop.run_in_executor(None, self._log.read, seq):
+                self._relayed += 1
+                self._deliver(job_id, event)
+
+    async def stream(self, subscriber: Subscriber, initial: List[Dict[str, Any]] = (), heartbeat: float = EVENTS_HEARTBEAT) -> AsyncIterator[str]:
+        """
+        Format a subscriber's events as a server-sent event stream, starting
+        with `initial` (e.g. a snapshot of the watched jobs). A comment is
+        sent on idle streams so proxies don't close the connection. The
+        subscriber is removed when the client disconnects.
+        """
+        try:
+            for event in initial:
+                yield format_event(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    lines = []
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event.get('type', 'message')}")
+    lines.append(f"data: {json.dumps(event)}")
+    return "\n".join(lines) + "\n\n"
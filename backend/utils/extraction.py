@@ -0,0 +1,263 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from fastapi.concurrency import iterate_in_threadpool
+from PyPDF2 import PdfReader  # For PDF text extraction
+
+from utils.extractors import EXTRACTORS, LIGHT, PDF_CONTENT_TYPE, Extractor, get_extractor, iter_pdf_pages
+from utils.serving import per_worker
+
+# Load environment variables
+load_dotenv()
+
+# Extraction pool configuration
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(per_worker(os.cpu_count() or 1))))  # Worker processes per server process
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "60"))  # Seconds per document before its worker is killed
+EXTRACT_MEMORY_LIMIT_MB = int(os.getenv("EXTRACT_MEMORY_LIMIT_MB", "1024"))  # Address space per worker; 0 disables
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "100"))  # PDFs with more pages are split across workers
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "50"))  # Page range handled by one worker task
+
+
+class ExtractionError(Exception):
+    """
+    Raised when a document's text cannot be extracted.
+    """
+
+
+class ExtractionTimeoutError(ExtractionError):
+    """
+    Raised when extraction takes longer than the configured timeout.
+    """
+
+
+def join_pages(pages) -> str:
+    """
+    Assemble page or paragraph texts in one linear-time pass.
+    """
+    return "\n".join(page for page in pages if page).strip()
+
+
+def extract_document(path: str, content_type: str, split_pages: int = PDF_PARALLEL_MIN_PAGES) -> Dict[str, Any]:
+    """
+    Extract a file on disk with the extractor registered for its type. Runs
+    in a worker process.
+
+    PDFs with more than `split_pages` pages only have their first page range
+    extracted here; the caller fans the remaining ranges out with
+    extract_pdf_pages.
+    """
+    start = time.perf_counter()
+    extractor = get_extractor(content_type)
+    if extractor is None:
+        return {"pages": [], "pageCount": None, "extractMs": 0.0}
+    try:
+        with open(path, "rb") as f:
+            if content_type == PDF_CONTENT_TYPE:
+                reader = PdfReader(f)
+                page_count = len(reader.pages)
+                stop = page_count if page_count <= split_pages else PDF_PAGES_PER_TASK
+                pages = list(iter_pdf_pages(reader, 0, stop))
+            else:
+                pages = list(extractor.iter_pages(f))
+                page_count = len(pages) if extractor.paged else None
+    except MemoryError:
+        raise ExtractionError(f"Document exceeded the extraction memory limit of {EXTRACT_MEMORY_LIMIT_MB} MB.")
+    except Exception as e:
+        raise ExtractionError(f"Failed to extract text from {extractor.name}: {str(e)}")
+    return {
+        "pages": pages,
+        "pageCount": page_count,
+        "extractMs": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def iter_timed_pages(path: str, extractor: Extractor, info: Dict[str, Any]) -> Iterator[str]:
+    """
+    Run a light extractor in the calling thread, adding the time spent
+    extracting (but not waiting on the consumer) to info["extractMs"].
+    """
+    begin = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            for page in extractor.iter_pages(f):
+                info["extractMs"] = round(info["extractMs"] + (time.perf_counter() - begin) * 1000, 2)
+                yield page
+                begin = time.perf_counter()
+    except Exception as e:
+        raise ExtractionError(f"Failed to extract text from {extractor.name}: {str(e)}")
+    info["extractMs"] = round(info["extractMs"] + (time.perf_counter() - begin) * 1000, 2)
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> Dict[str, Any]:
+    """
+    Extract the text of pages [start, stop) of a PDF. Runs in a worker process.
+    """
+    begin = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            pages = list(iter_pdf_pages(PdfReader(f), start, stop))
+    except MemoryError:
+        raise ExtractionError(f"Document exceeded the extraction memory limit of {EXTRACT_MEMORY_LIMIT_MB} MB.")
+    except Exception as e:
+        raise ExtractionError(f"Failed to extract text from PDF: {str(e)}")
+    return {"pages": pages, "extractMs": round((time.perf_counter() - begin) * 1000, 2)}
+
+
+def _ready() -> bool:
+    return True
+
+
+def _limit_memory(limit_mb: int):
+    """
+    Worker initializer: cap the address space so a pathological document raises MemoryError.
+    """
+    if limit_mb <= 0:
+        return
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+class ExtractionPool:
+    """
+    Runs extraction in worker processes so CPU-heavy parsing never blocks the
+    event loop. The timeout applies to each task once it has a worker. A task
+    that exceeds it has its worker killed; since a running task can't be
+    cancelled on its own, the whole pool is replaced and tasks caught in the
+    restart are retried once.
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, timeout: float = EXTRACT_TIMEOUT, memory_limit_mb: int = EXTRACT_MEMORY_LIMIT_MB):
+        self._workers = workers
+        self._timeout = timeout
+        self._memory_limit_mb = memory_limit_mb
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None  # One per worker, so timeouts don't count queueing
+        self._generation = 0  # Incremented every time the pool is replaced
+        self._restarts = 0
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers,
+                # Spawned workers don't inherit the server's threads and sockets
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_limit_memory,
+                initargs=(self._memory_limit_mb,),
+            )
+        return self._executor
+
+    async def start(self):
+        """
+        Spawn the workers up front so process start-up isn't charged to the first uploads' timeouts.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._ensure_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _ready) for _ in range(self._workers)))
+
+    async def run(self, function, *args, timeout: Optional[float] = None):
+        """
+        Run a picklable function in the pool with a timeout.
+        """
+        timeout = timeout or self._timeout
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._workers)
+        for attempt in range(2):
+            async with self._slots:
+                generation = self._generation
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self._ensure_executor(), function, *args)
+                try:
+                    return await asyncio.wait_for(future, timeout)
+                except asyncio.TimeoutError:
+                    self._restart(generation)
+                    raise ExtractionTimeoutError(f"Extraction timed out after {timeout:g} seconds.")
+                except BrokenProcessPool:
+                    if generation != self._generation and attempt == 0:
+                        continue  # Killed by another task's timeout; try again on the new pool
+                    self._restart(generation)
+                    raise ExtractionError("Extraction worker crashed.")
+
+    async def iter_pages(self, path: str, content_type: str, info: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Yield a document's pages in order as soon as each is extracted, so later
+        stages can start before a long document is finished. Light formats are
+        streamed from a thread without a round trip to the workers; heavy ones
+        run in the pool, and large PDFs are split into page ranges that run on
+        several workers at once. `info`, if given, receives pageCount and the
+        total extraction time in extractMs.
+        """
+        info = info if info is not None else {}
+        extractor = get_extractor(content_type)
+        if extractor is not None and extractor.cost == LIGHT:
+            info["pageCount"] = None
+            info["extractMs"] = 0.0
+            pages = 0
+            async for page in iterate_in_threadpool(iter_timed_pages(path, extractor, info)):
+                pages += 1
+                yield page
+            if extractor.paged:
+                info["pageCount"] = pages
+            return
+
+        first = await self.run(extract_document, path, content_type)
+        info["pageCount"] = first["pageCount"]
+        info["extractMs"] = first["extractMs"]
+        for page in first["pages"]:
+            yield page
+
+        page_count = first["pageCount"] or 0
+        ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count)) for start in range(len(first["pages"]), page_count, PDF_PAGES_PER_TASK)]
+        # Keep up to one range per worker in flight, consuming them in page order
+        pending: List[asyncio.Task] = []
+        try:
+            for index in range(len(ranges)):
+                while len(pending) < self._workers and index + len(pending) < len(ranges):
+                    start, stop = ranges[index + len(pending)]
+                    pending.append(asyncio.ensure_future(self.run(extract_pdf_pages, path, start, stop)))
+                result = await pending.pop(0)
+                info["extractMs"] = round(info["extractMs"] + result["extractMs"], 2)
+                for page in result["pages"]:
+                    yield page
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def extract(self, path: str, content_type: str) -> Dict[str, Any]:
+        info: Dict[str, Any] = {}
+        pages = [page async for page in self.iter_pages(path, content_type, info)]
+        return {"text": join_pages(pages), "pageCount": info["pageCount"], "extractMs": info["extractMs"]}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self._workers,
+            "timeoutSeconds": self._timeout,
+            "memoryLimitMb": self._memory_limit_mb,
+            "restarts": self._restarts,
+            "extractors": {content_type: extractor.cost for content_type, extractor in EXTRACTORS.items()},
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _restart(self, generation: int):
+        if generation != self._generation or self._executor is None:
+            return  # Already replaced
+        # ProcessPoolExecutor has no public way to stop a running task
+        for process in list(getattr(self._executor, "_processes", {}).values()):
+            process.kill()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._generation += 1
+        self._restarts += 1
@@ -0,0 +1,470 @@
+import codecs
+import io
+import os
+import posixpath
+import re
+import zipfile
+from email import policy
+from email.parser import BytesParser
+from html.parser import HTMLParser
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+from dotenv import load_dotenv
+from PyPDF2 import PdfReader
+
+# Load environment variables
+load_dotenv()
+
+SNIFF_BYTES = 8192  # Read from the start of a file to detect its type
+TEXT_PAGE_CHARS = 64 * 1024  # Text streamed per piece from plain text and HTML; pieces end at a line break
+XLSX_PAGE_ROWS = 1000  # Spreadsheet rows streamed per piece
+
+# Cost classes: heavy extractors parse markup, containers or layout and run in
+# the extraction process pool, under its timeout and memory limit; light ones
+# only decode text, in linear time, and run in a server thread
+LIGHT = "light"
+HEAVY = "heavy"
+
+PDF_CONTENT_TYPE = "application/pdf"
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PPTX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+TEXT_CONTENT_TYPE = "text/plain"
+HTML_CONTENT_TYPE = "text/html"
+EMAIL_CONTENT_TYPE = "message/rfc822"
+
+# Office Open XML namespaces
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+DRAWING_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+PRESENTATION_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+# Headers that mark the start of an email message
+EMAIL_HEADERS = {"from", "to", "cc", "subject", "date", "received", "message-id", "mime-version", "return-path", "reply-to"}
+HEADER_LINE = re.compile(rb"^[!-9;-~]+:")
+HTML_START = re.compile(r"^\s*(?:<\?xml[^>]*>\s*)?(?:<!--.*?-->\s*)*<(?:!doctype\s+html|html|head|body)\b", re.IGNORECASE | re.DOTALL)
+HTML_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+class FileHead:
+    """
+    What sniffers look at: the first SNIFF_BYTES of a spooled file, its
+    extension and declared type, plus a ZIP archive's member names and the
+    head decoded as text, each worked out once and only if a sniffer asks.
+    """
+
+    def __init__(self, path: str, filename: str = "", declared_type: str = ""):
+        self.path = path
+        self.extension = os.path.splitext(filename)[1].lower()
+        self.declared_type = declared_type.split(";")[0].strip().lower()
+        with open(path, "rb") as f:
+            self.head = f.read(SNIFF_BYTES)
+        self._zip_names: Optional[frozenset] = None
+        self._encoding: Optional[str] = None
+
+    @property
+    def zip_names(self) -> frozenset:
+        if self._zip_names is None:
+            self._zip_names = frozenset()
+            if self.head.startswith(b"PK\x03\x04"):
+                try:
+                    with zipfile.ZipFile(self.path) as archive:
+                        self._zip_names = frozenset(archive.namelist())
+                except zipfile.BadZipFile:
+                    pass
+        return self._zip_names
+
+    @property
+    def encoding(self) -> Optional[str]:
+        """
+        The head's text encoding, or None if it looks binary.
+        """
+        if self._encoding is None:
+            self._encoding = detect_encoding(self.head) or ""
+        return self._encoding or None
+
+
+def detect_encoding(head: bytes) -> Optional[str]:
+    """
+    Guess the encoding of text that starts with `head`: a byte order mark,
+    else UTF-8, else Windows-1252. Returns None for binary data.
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    if b"\x00" in head:
+        return None
+    try:
+        # Not final: the head may end part way through a character
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        encoding = "utf-8"
+    except UnicodeDecodeError:
+        encoding = "cp1252"
+    controls = sum(1 for byte in head if byte < 32 and byte not in b"\t\n\r\f\x1b")
+    return encoding if controls <= len(head) // 100 else None
+
+
+class Extractor:
+    """
+    Turns one file format into text. `iter_pages` reads an open binary file
+    and yields its text a piece at a time (a page, slide, paragraph or block
+    of lines), so a long file is never held as one string. `sniff` decides
+    from a FileHead whether a file is this format; extractors are tried in
+    registration order, so cheap, specific checks come first.
+    """
+
+    content_type = ""
+    name = ""  # Used in error messages
+    extensions: Tuple[str, ...] = ()
+    cost = HEAVY
+    paged = False  # Each piece is a page or slide, so their count is the page count
+
+    def sniff(self, head: FileHead) -> bool:
+        raise NotImplementedError
+
+    def iter_pages(self, file: BinaryIO) -> Iterator[str]:
+        raise NotImplementedError
+
+
+# Registered extractors by MIME type, in sniffing order
+EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register(cls):
+    """
+    Class decorator that adds an extractor to the registry.
+    """
+    EXTRACTORS[cls.content_type] = cls()
+    return cls
+
+
+def get_extractor(content_type: str) -> Optional[Extractor]:
+    return EXTRACTORS.get(content_type)
+
+
+def sniff_content_type(path: str, filename: str = "", declared_type: str = "") -> Optional[str]:
+    """
+    Detect a file's type from its bytes. The extension and declared type only
+    settle what the bytes can't, such as an HTML fragment saved as .html.
+    Returns None if no extractor accepts the file.
+    """
+    head = FileHead(path, filename, declared_type)
+    for extractor in EXTRACTORS.values():
+        if extractor.sniff(head):
+            return extractor.content_type
+    return None
+
+
+def iter_pdf_pages(reader: PdfReader, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """
+    Yield the text of each page in [start, stop); pages without text yield "".
+    """
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    for index in range(start, stop):
+        yield reader.pages[index].extract_text() or ""
+
+
+def iter_text_blocks(text: io.TextIOBase, size: int = TEXT_PAGE_CHARS) -> Iterator[str]:
+    """
+    Yield about `size` characters at a time, each block ending at a line break.
+    """
+    while True:
+        block = text.read(size)
+        if not block:
+            return
+        block += text.readline()
+        yield block[:-1] if block.endswith("\n") else block
+
+
+def related_parts(archive: zipfile.ZipFile, part: str, tag: str) -> List[Tuple[Dict[str, str], str]]:
+    """
+    Follow the relationships of the `tag` elements in an Office Open XML
+    part, in document order. Returns each element's attributes and the path
+    of the part it points to.
+    """
+    folder, name = posixpath.split(part)
+    targets = {}
+    with archive.open(posixpath.join(folder, "_rels", name + ".rels")) as f:
+        for _, element in iterparse(f):
+            if element.tag.endswith("}Relationship"):
+                target = element.get("Target", "")
+                path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(folder, target))
+                targets[element.get("Id")] = path
+    related = []
+    with archive.open(part) as f:
+        for _, element in iterparse(f):
+            if element.tag == tag and element.get(RELATIONSHIP_ID) in targets:
+                related.append((dict(element.attrib), targets[element.get(RELATIONSHIP_ID)]))
+    return related
+
+
+def iter_xml_paragraphs(file: BinaryIO, paragraph_tag: str, text_tag: str, breaks: Dict[str, str] = None) -> Iterator[str]:
+    """
+    Stream the paragraphs of an XML part: the text of `text_tag` elements up
+    to each closing `paragraph_tag`. Parsed elements are cleared as they are
+    read, so memory stays flat however long the part is.
+    """
+    breaks = breaks or {}
+    texts: List[str] = []
+    for _, element in iterparse(file):
+        if element.tag == text_tag:
+            texts.append(element.text or "")
+        elif element.tag in breaks:
+            texts.append(breaks[element.tag])
+        elif element.tag == paragraph_tag:
+            yield "".join(texts)
+            texts = []
+            element.clear()
+    if texts:
+        yield "".join(texts)
+
+
+class _TextCollector(HTMLParser):
+    """
+    Collects an HTML document's visible text, one line per block element.
+    """
+
+    SKIPPED = {"script", "style", "noscript", "template", "svg"}
+    BLOCKS = {
+        "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "footer", "form",
+        "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section",
+        "table", "td", "th", "title", "tr", "ul",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skipping = 0
+        self._line: List[str] = []
+        self.lines: List[str] = []
+        self.chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skipping += 1
+        elif tag in self.BLOCKS:
+            self.end_line()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.BLOCKS:
+            self.end_line()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._line.append(data)
+
+    def end_line(self):
+        line = " ".join("".join(self._line).split())
+        if line:
+            self.lines.append(line)
+            self.chars += len(line)
+        self._line = []
+
+    def take(self) -> str:
+        text = "\n".join(self.lines)
+        self.lines, self.chars = [], 0
+        return text
+
+
+def iter_html_text(chunks: Iterator[str], size: int = TEXT_PAGE_CHARS) -> Iterator[str]:
+    """
+    Feed HTML to the parser chunk by chunk, yielding the visible text about `size` characters at a time.
+    """
+    collector = _TextCollector()
+    for chunk in chunks:
+        collector.feed(chunk)
+        if collector.chars >= size:
+            yield collector.take()
+    collector.close()
+    collector.end_line()
+    if collector.lines:
+        yield collector.take()
+
+
+@register
+class PdfExtractor(Extractor):
+    content_type = PDF_CONTENT_TYPE
+    name = "PDF"
+    extensions = (".pdf",)
+    paged = True
+
+    def sniff(self, head: FileHead) -> bool:
+        # Some writers put junk before the header; readers accept it within the first kilobyte
+        return b"%PDF-" in head.head[:1024]
+
+    def iter_pages(self, file: BinaryIO) -> Iterator[str]:
+        return iter_pdf_pages(PdfReader(file))
+
+
+class _OfficeExtractor(Extractor):
+    """
+    Office Open XML formats are ZIP archives, told apart by their main part.
+    """
+
+    main_part = ""
+
+    def sniff(self, head: FileHead) -> bool:
+        return self.main_part in head.zip_names
+
+
+@register
+class DocxExtractor(_OfficeExtractor):
+    content_type = DOCX_CONTENT_TYPE
+    name = "DOCX"
+    extensions = (".docx",)
+    main_part = "word/document.xml"
+
+    def iter_pages(self, file: BinaryIO) -> Iterator[str]:
+        with zipfile.ZipFile(file) as archive, archive.open(self.main_part) as part:
+            breaks = {WORD_NS + "tab": "\t", WORD_NS + "br": "\n", WORD_NS + "cr": "\n"}
+            yield from iter_xml_paragraphs(part, WORD_NS + "p", WORD_NS + "t", breaks)
+
+
+@register
+class XlsxExtractor(_OfficeExtractor):
+    content_type = XLSX_CONTENT_TYPE
+    name = "XLSX"
+    extensions = (".xlsx",)
+    main_part = "xl/workbook.xml"
+
+    def iter_pages(self, file: BinaryIO) -> Iterator[str]:
+        with zipfile.ZipFile(file) as archive:
+            shared = []
+            if "xl/sharedStrings.xml" in archive.namelist():
+                with archive.open("xl/sharedStrings.xml") as part:
+                    shared = list(iter_xml_paragraphs(part, SHEET_NS + "si", SHEET_NS + "t"))
+            for attributes, path in related_parts(archive, self.main_part, SHEET_NS + "sheet"):
+                if path not in archive.namelist():
+                    continue
+                rows = [attributes.get("name", "")]
+                with archive.open(path) as part:
+                    for row in self._iter_rows(part, shared):
+                        rows.append(row)
+                        if len(rows) >= XLSX_PAGE_ROWS:
+                            yield "\n".join(rows)
+                            rows = []
+                yield "\n".join(rows)
+
+    def _iter_rows(self, part: BinaryIO, shared: List[str]) -> Iterator[str]:
+        """
+        Yield each non-empty row's cell values, tab-separated.
+        """
+        cells: List[str] = []
+        value: Optional[str] = None
+        for _, element in iterparse(part):
+            if element.tag in (SHEET_NS + "v", SHEET_NS + "t"):
+                value = (value or "") + (element.text or "")
+            elif element.tag == SHEET_NS + "c":
+                if value is not None and element.get("t") == "s":
+                    value = shared[int(value)] if value.isdigit() and int(value) < len(shared) else ""
+                cells.append(value or "")
+                value = None
+                element.clear()
+            elif element.tag == SHEET_NS + "row":
+                if any(cells):
+                    yield "\t".join(cells).rstrip("\t")
+                cells = []
+                element.clear()
+
+
+@register
+class PptxExtractor(_OfficeExtractor):
+    content_type = PPTX_CONTENT_TYPE
+    name = "PPTX"
+    extensions = (".pptx",)
+    main_part = "ppt/presentation.xml"
+    paged = True
+
+    def iter_pages(self, file: BinaryIO) -> Iterator[str]:
+        with zipfile.ZipFile(file) as archive:
+            for _, path in related_parts(archive, self.main_part, PRESENTATION_NS + "sldId"):
+                if path not in archive.namelist():
+                    continue
+                with archive.open(path) as part:
+                    paragraphs = iter_xml_paragraphs(part, DRAWING_NS + "p", DRAWING_NS + "t", {DRAWING_NS + "br": "\n"})
+                    yield "\n".join(paragraph for paragraph in paragraphs if paragraph)
+
+
+@register
+class EmailExtractor(Extractor):
+    content_type = EMAIL_CONTENT_TYPE
+    name = "email"
+    extensions = (".eml",)
+
+    def sniff(self, head: FileHead) -> bool:
+        if head.encoding is None:
+            return False
+        names = set()
+        for line in head.head.splitlines():
+            if not line.strip():
+                break  # End of the header block
+            if line[:1] in (b" ", b"\t"):
+                continue  # Folded header
+            if not HEADER_LINE.match(line):
+                return False
+            names.add(line.split(b":", 1)[0].decode("latin-1").lower())
+        known = len(names & EMAIL_HEADERS)
+        hinted = head.extension in self.extensions or head.declared_type == self.content_type
+        return known >= 2 or (hinted and known >= 1)
+
+    def iter_pages(self, file: BinaryIO) -> Iterator[str]:
+        message = BytesParser(policy=policy.default).parse(file)
+        headers = [f"{name}: {message[name]}" for name in ("Subject", "From", "To", "Cc", "Date") if message[name]]
+        yield "\n".join(headers)
+        # Attachments are skipped; only the message body is text
+        body = message.get_body(preferencelist=("plain", "html"))
+        if body is None:
+            return
+        content = body.get_content()
+        if body.get_content_subtype() == "html":
+            yield from iter_html_text(iter([content]))
+        else:
+            yield from iter_text_blocks(io.StringIO(content))
+
+
+@register
+class HtmlExtractor(Extractor):
+    content_type = HTML_CONTENT_TYPE
+    name = "HTML"
+    extensions = (".html", ".htm", ".xhtml")
+
+    def sniff(self, head: FileHead) -> bool:
+        if head.encoding is None:
+            return False
+        if head.extension in self.extensions or head.declared_type in (self.content_type, "application/xhtml+xml"):
+            return True
+        return bool(HTML_START.match(head.head[:1024].decode(head.encoding, "replace").lstrip("\ufeff")))
+
+    def iter_pages(self, file: BinaryIO) -> Iterator[str]:
+        head = file.read(SNIFF_BYTES)
+        file.seek(0)
+        encoding = detect_encoding(head) or "utf-8"
+        declared = HTML_CHARSET.search(head)
+        if declared and not encoding.startswith(("utf-8-sig", "utf-16")):
+            try:
+                encoding = codecs.lookup(declared.group(1).decode("ascii")).name
+            except LookupError:
+                pass
+        text = io.TextIOWrapper(file, encoding=encoding, errors="replace")
+        yield from iter_html_text(iter(lambda: text.read(TEXT_PAGE_CHARS), ""))
+
+
+@register
+class TextExtractor(Extractor):
+    content_type = TEXT_CONTENT_TYPE
+    name = "text"
+    extensions = (".txt", ".text", ".md", ".csv", ".log")
+    cost = LIGHT
+
+    def sniff(self, head: FileHead) -> bool:
+        # Anything that decodes as text and wasn't claimed by a more specific format
+        return head.encoding is not None
+
+    def iter_pages(self, file: BinaryIO) -> Iterator[str]:
+        encoding = detect_encoding(file.read(SNIFF_BYTES)) or "utf-8"
+        file.seek(0)
+        yield from iter_text_blocks(io.TextIOWrapper(file, encoding=encoding, errors="replace"))
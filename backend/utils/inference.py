@@ -0,0 +1,112 @@
+import asyncio
+import os
+import random
+from typing import Any, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from utils.metrics import INFERENCE_LATENCY, INFERENCE_REQUESTS, INFERENCE_RETRIES
+
+# Load environment variables
+load_dotenv()
+
+# Hugging Face API configuration
+HUGGING_FACE_API_URL = os.getenv("HUGGING_FACE_API_URL", "https://api-inference.huggingface.co/models")
+HUGGING_FACE_API_TOKEN = os.getenv("HUGGING_FACE_API_TOKEN")  # Retrieve token from .env
+
+# Connection pool and retry configuration
+INFERENCE_MAX_CONNECTIONS = int(os.getenv("INFERENCE_MAX_CONNECTIONS", "20"))  # Pooled keep-alive connections
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "8"))  # In-flight requests at once
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "30"))  # Seconds per request
+INFERENCE_MAX_RETRIES = int(os.getenv("INFERENCE_MAX_RETRIES", "3"))  # Retries on 503 "model loading"
+INFERENCE_BACKOFF = float(os.getenv("INFERENCE_BACKOFF", "1.0"))  # Base backoff in seconds
+INFERENCE_MAX_BACKOFF = float(os.getenv("INFERENCE_MAX_BACKOFF", "20"))  # Upper bound for a single wait
+
+
+class InferenceClient:
+    """
+    Async client for the Hugging Face Inference API.
+
+    A single instance is shared by all requests so connections are kept alive
+    and reused, and a semaphore caps how many requests are in flight at once.
+    """
+
+    def __init__(
+        self,
+        base_url: str = HUGGING_FACE_API_URL,
+        token: Optional[str] = HUGGING_FACE_API_TOKEN,
+        max_connections: int = INFERENCE_MAX_CONNECTIONS,
+        max_concurrency: int = INFERENCE_MAX_CONCURRENCY,
+        timeout: float = INFERENCE_TIMEOUT,
+        max_retries: int = INFERENCE_MAX_RETRIES,
+        backoff: float = INFERENCE_BACKOFF,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._base_url = base_url.rstrip("/")
+        self._token = token
+        self._max_connections = max_connections
+        self._max_concurrency = max_concurrency
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._transport = transport  # Default network transport unless given, e.g. a mock in tests
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool is bound to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self._base_url,
+                headers={
+                    "Authorization": f"Bearer {self._token}",
+                    "Content-Type": "application/json",
+                },
+                timeout=self._timeout,
+                transport=self._transport,
+                limits=httpx.Limits(
+                    max_connections=self._max_connections,
+                    max_keepalive_connections=self._max_connections,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+    async def query(self, model: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """
+        Post a payload to a model, retrying with backoff while the model is loading.
+        """
+        client = self._ensure_client()
+        with INFERENCE_LATENCY.time():
+            for attempt in range(self._max_retries + 1):
+                try:
+                    async with self._semaphore:
+                        response = await client.post(f"/{model}", json=payload, timeout=timeout or self._timeout)
+                except httpx.HTTPError:
+                    INFERENCE_REQUESTS.inc("error")
+                    raise
+                if response.status_code != 503 or attempt == self._max_retries:
+                    INFERENCE_REQUESTS.inc("success" if response.is_success else "error")
+                    return response.json()
+                INFERENCE_RETRIES.inc()
+                await asyncio.sleep(self._retry_delay(response, attempt))
+        return response.json()
+
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        """
+        Exponential backoff with jitter, stretched to the model's estimated load time when reported.
+        """
+        delay = self._backoff * (2 ** attempt)
+        try:
+            estimated = float(response.json().get("estimated_time", 0))
+        except (ValueError, AttributeError, TypeError):
+            estimated = 0.0
+        delay = min(max(delay, estimated), INFERENCE_MAX_BACKOFF)
+        return delay + random.uniform(0, delay / 4)
@@ -0,0 +1,499 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from utils.db import SQLiteDatabase
+from utils.metrics import DOCUMENT_BYTES, DOCUMENTS, STAGE_LATENCY
+from utils.serving import process_alive
+
+# Load environment variables
+load_dotenv()
+
+# Job queue configuration
+JOB_QUEUE_MAXSIZE = int(os.getenv("JOB_QUEUE_MAXSIZE", "100"))  # Pending jobs before uploads are rejected
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # Jobs processed concurrently
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", "1000"))  # Finished jobs kept for status queries
+JOB_DB = os.getenv("JOB_DB", os.path.join("data", "jobs.db"))  # Job statuses shared by the server processes
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "30"))  # Seconds shutdown waits for queued and running jobs
+JOB_POLL_INTERVAL = 0.25  # Seconds between status checks when waiting on another process's job
+
+SHUTDOWN_ERROR = "The server shut down before the job finished."
+
+# Pipeline stages that make up the LLM analysis of a document
+ANALYSIS_STAGES = ("classify", "deduplicate", "analyze", "categorize", "summarize")
+
+# Applied in order by SQLiteDatabase
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        content_hash TEXT,
+        worker INTEGER NOT NULL,
+        status TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS jobs_state_content_hash ON jobs (state, content_hash)",
+]
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted while the queue is at capacity.
+    """
+
+
+class JobInFlightError(Exception):
+    """
+    Raised when another server process already has an unfinished job for the
+    same content; `job` is a read-only copy of it.
+    """
+
+    def __init__(self, job: "Job"):
+        super().__init__(f"Job {job.id} is already processing this content.")
+        self.job = job
+
+
+class JobStatus(BaseModel):
+    id: str
+    filename: str
+    status: str  # queued, running, completed or failed
+    stage: Optional[str] = None
+    createdAt: str
+    startedAt: Optional[str] = None
+    finishedAt: Optional[str] = None
+    stageTimings: Dict[str, float] = {}  # Milliseconds spent in each pipeline stage
+    analysisMode: Optional[str] = None  # combined, combined-fallback, separate, classifier, map-reduce or near-duplicate
+    categorySource: Optional[str] = None  # classifier or model
+    classifierScore: Optional[float] = None  # Similarity to the nearest category centroid
+    ocrPages: Optional[List[Dict[str, Any]]] = None  # Scanned pages recognized by OCR, with their timings
+    summaryChunks: Optional[int] = None  # Chunks summarized for long documents
+    cacheKey: Optional[str] = None  # Result cache entry for the extracted text
+    cacheHit: bool = False
+    nearDuplicateOf: Optional[str] = None  # Document whose results were reused
+    nearDuplicateScore: Optional[float] = None  # Similarity to the closest stored document
+    deduplicated: Optional[str] = None  # content-hash, in-flight or idempotency-key when an earlier result was returned
+    document: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class Job:
+    """
+    A unit of background work: the status exposed to clients plus the
+    private payload the handler needs to process it.
+    """
+
+    def __init__(self, filename: str, payload: Dict[str, Any], job_id: Optional[str] = None):
+        self.status = JobStatus(
+            id=job_id or str(uuid.uuid4()),
+            filename=filename,
+            status="queued",
+            createdAt=_now(),
+        )
+        self.payload = payload
+        self.done = asyncio.Event()
+
+    @property
+    def id(self) -> str:
+        return self.status.id
+
+    @property
+    def finished(self) -> bool:
+        return self.status.status in ("completed", "failed")
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Mark the job as being in the given stage and record how long it takes.
+        """
+        self.status.stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.status.stageTimings[name] = round(elapsed, 2)
+
+
+class JobStore:
+    """
+    Job statuses in SQLite, so any server process can answer for a job
+    another one accepted. Rows are written when a job is received, starts
+    and finishes; the process running a job has its live stage in memory.
+    Blocking: JobQueue calls it from a writer thread.
+    """
+
+    def __init__(self, path: str = JOB_DB, history_limit: int = JOB_HISTORY_LIMIT):
+        self._db = SQLiteDatabase(path, MIGRATIONS)
+        self._history_limit = history_limit
+        self._writes = 0
+
+    def save(self, status: JobStatus, content_hash: Optional[str] = None):
+        connection = self._db.connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO jobs (id, state, content_hash, worker, status) VALUES (?, ?, ?, ?, ?)",
+            (status.id, status.status, content_hash, os.getpid(), status.json()),
+        )
+        self._writes += 1
+        if status.status in ("completed", "failed") and self._writes % 100 == 0:
+            # Keep the newest finished jobs, like the in-memory history
+            connection.execute(
+                "DELETE FROM jobs WHERE state IN ('completed', 'failed') AND rowid NOT IN "
+                "(SELECT rowid FROM jobs WHERE state IN ('completed', 'failed') ORDER BY rowid DESC LIMIT ?)",
+                (self._history_limit,),
+            )
+        connection.commit()
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        """
+        A job's last saved status. An unfinished job whose server process has
+        exited is reported failed, so waiting on it ends.
+        """
+        row = self._db.connection().execute("SELECT state, worker, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        status = JobStatus(**json.loads(row["status"]))
+        if row["state"] in ("queued", "running") and row["worker"] != os.getpid() and not process_alive(row["worker"]):
+            status.status, status.stage, status.error, status.finishedAt = "failed", None, SHUTDOWN_ERROR, _now()
+        return status
+
+    def claim(self, status: JobStatus, content_hash: str) -> Optional[JobStatus]:
+        """
+        Save a new job unless another server process has an unfinished job
+        for the same content, which is returned instead. The check and the
+        insert are one transaction, so two processes can't both claim it.
+        """
+        connection = self._db.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT status FROM jobs WHERE state IN ('queued', 'running') AND content_hash = ? AND worker != ? LIMIT 1",
+                (content_hash, os.getpid()),
+            ).fetchone()
+            if row is None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO jobs (id, state, content_hash, worker, status) VALUES (?, ?, ?, ?, ?)",
+                    (status.id, status.status, content_hash, os.getpid(), status.json()),
+                )
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        return JobStatus(**json.loads(row["status"])) if row else None
+
+    def delete(self, job_id: str):
+        connection = self._db.connection()
+        connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        connection.commit()
+
+    def fail_orphans(self) -> int:
+        """
+        Fail the unfinished jobs of server processes that are no longer running,
+        so clients waiting on them get an answer. Returns how many were failed.
+        """
+        connection = self._db.connection()
+        rows = connection.execute("SELECT id, worker, status FROM jobs WHERE state IN ('queued', 'running')").fetchall()
+        orphans = [row for row in rows if row["worker"] != os.getpid() and not process_alive(row["worker"])]
+        for row in orphans:
+            status = JobStatus(**json.loads(row["status"]))
+            status.status, status.stage, status.error, status.finishedAt = "failed", None, SHUTDOWN_ERROR, _now()
+            connection.execute("UPDATE jobs SET state = ?, status = ? WHERE id = ?", (status.status, status.json(), row["id"]))
+        connection.commit()
+        return len(orphans)
+
+    def close(self):
+        self._db.close()
+
+
+class JobQueue:
+    """
+    Bounded queue of jobs consumed by a fixed pool of asyncio workers.
+    `notify(job, event, **data)`, if given, is called when a job is received
+    and when it completes or fails. With a `store`, statuses are also saved
+    there, so jobs accepted by other server processes can be looked up, and
+    content another process is already processing isn't queued again. Store
+    writes run in order on one thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        handler,
+        maxsize: int = JOB_QUEUE_MAXSIZE,
+        workers: int = JOB_WORKERS,
+        notify: Optional[Callable[..., None]] = None,
+        store: Optional[JobStore] = None,
+        drain_timeout: float = JOB_DRAIN_TIMEOUT,
+    ):
+        self._handler = handler
+        self._notify = notify or (lambda job, event, **data: None)
+        self._store = store
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store") if store else None
+        self._drain_timeout = drain_timeout
+        self._accepting = True
+        self._maxsize = maxsize
+        self._worker_count = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._busy = 0
+        self._stage_totals: Dict[str, List[float]] = {}  # stage -> [count, total ms]
+        self._mode_totals: Dict[str, List[float]] = {}  # analysis mode -> [count, total ms]
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self._maxsize)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._worker_count)]
+
+    async def stop(self, timeout: Optional[float] = None) -> List[Job]:
+        """
+        Stop taking jobs and give queued and running ones up to `timeout`
+        seconds (JOB_DRAIN_TIMEOUT by default) to finish before the workers
+        are cancelled. Jobs that didn't finish are marked failed and
+        returned, so the caller can clean up after them.
+        """
+        timeout = self._drain_timeout if timeout is None else timeout
+        self._accepting = False
+        if self._queue is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        abandoned = [job for job in self._jobs.values() if not job.finished]
+        for job in abandoned:
+            job.status.status = "failed"
+            job.status.stage = None
+            job.status.error = SHUTDOWN_ERROR
+            job.status.finishedAt = _now()
+            job.done.set()
+            self._save(job)
+            self._notify(job, "failed", error=job.status.error)
+        if self._writer is not None:
+            # Let queued status writes finish before the store is closed
+            await asyncio.get_running_loop().run_in_executor(None, self._writer.shutdown)
+        return abandoned
+
+    async def submit(self, filename: str, payload: Dict[str, Any]) -> Job:
+        self._check_accepting()
+        job = Job(filename, payload)
+        if self._queue.full():
+            raise QueueFullError(f"Job queue is full ({self._maxsize} pending jobs).")
+        await self._claim(job)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # Filled up while the claim was being written
+            self._unclaim(job)
+            raise QueueFullError(f"Job queue is full ({self._maxsize} pending jobs).")
+        self._received(job)
+        return job
+
+    async def put(self, filename: str, payload: Dict[str, Any]) -> Job:
+        """
+        Like submit, but waits for room in the queue instead of failing.
+        """
+        self._check_accepting()
+        job = Job(filename, payload)
+        await self._claim(job)
+        try:
+            await self._queue.put(job)
+        except BaseException:
+            self._unclaim(job)
+            raise
+        self._received(job)
+        return job
+
+    def complete(self, filename: str, document: Dict[str, Any], job_id: Optional[str] = None, **status) -> Job:
+        """
+        Record a job that is already finished, e.g. an upload answered with
+        an existing document, so clients can track it like any other.
+        """
+        job = Job(filename, {}, job_id)
+        job.status.status = "completed"
+        job.status.startedAt = job.status.finishedAt = job.status.createdAt
+        job.status.document = document
+        for field, value in status.items():
+            setattr(job.status, field, value)
+        job.done.set()
+        self._received(job)
+        self._notify(job, "completed", document=document)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        A job accepted by this process.
+        """
+        return self._jobs.get(job_id)
+
+    async def find(self, job_id: str) -> Optional[Job]:
+        """
+        A job accepted by this or, with a store, any other server process.
+        """
+        job = self._jobs.get(job_id)
+        if job is None and self._store is not None:
+            status = await asyncio.get_running_loop().run_in_executor(None, self._store.get, job_id)
+            job = _from_status(status) if status else None
+        return job
+
+    async def wait(self, job: Job, timeout: Optional[float] = None) -> Job:
+        """
+        Wait up to `timeout` seconds (forever if None) for the job to finish.
+        Another process's job is polled in the store.
+        """
+        if job.finished or (timeout is not None and timeout <= 0):
+            return job
+        if self._jobs.get(job.id) is job or self._store is None:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return job
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        while not job.finished and (deadline is None or loop.time() < deadline):
+            delay = JOB_POLL_INTERVAL if deadline is None else min(JOB_POLL_INTERVAL, max(deadline - loop.time(), 0))
+            await asyncio.sleep(delay)
+            status = await loop.run_in_executor(None, self._store.get, job.id)
+            if status:
+                job.status = status
+        if job.finished:
+            job.done.set()
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status.status] = counts.get(job.status.status, 0) + 1
+        return {
+            "process": os.getpid(),
+            "accepting": self._accepting,
+            "queueDepth": self._queue.qsize() if self._queue else 0,
+            "queueMaxSize": self._maxsize,
+            "workers": self._worker_count,
+            "busyWorkers": self._busy,
+            "jobs": counts,
+            "stageTimings": _averages(self._stage_totals),
+            # Total analysis time per upload, to compare combined and separate requests
+            "analysisTimings": _averages(self._mode_totals),
+        }
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._busy += 1
+            job.status.status = "running"
+            job.status.startedAt = _now()
+            self._save(job)
+            try:
+                result = await self._handler(job)
+                job.status.document = result
+                job.status.status = "completed"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # HTTPException carries its message in `detail`
+                job.status.error = str(getattr(e, "detail", e))
+                job.status.status = "failed"
+            finally:
+                job.status.stage = None
+                job.status.finishedAt = _now()
+                self._record_timings(job)
+                if job.finished:
+                    self._save(job)
+                job.done.set()
+                if job.status.status == "completed":
+                    self._notify(job, "completed", document=job.status.document)
+                elif job.status.status == "failed":
+                    self._notify(job, "failed", error=job.status.error)
+                self._busy -= 1
+                self._queue.task_done()
+
+    def _record_timings(self, job: Job):
+        timings = job.status.stageTimings
+        for stage, elapsed in timings.items():
+            _accumulate(self._stage_totals, stage, elapsed)
+            STAGE_LATENCY.observe(elapsed / 1000, stage)
+        DOCUMENTS.inc(job.status.status)
+        DOCUMENT_BYTES.inc(job.status.status, amount=job.payload.get("size") or 0)
+        if job.status.analysisMode:
+            elapsed = sum(timings.get(stage, 0.0) for stage in ANALYSIS_STAGES)
+            _accumulate(self._mode_totals, job.status.analysisMode, elapsed)
+
+    def _check_accepting(self):
+        if not self._accepting:
+            raise QueueFullError("The server is shutting down and not accepting new jobs.")
+
+    async def _claim(self, job: Job):
+        """
+        Raise JobInFlightError if another server process is already processing this content.
+        """
+        if self._store is not None and job.payload.get("sha256"):
+            claim = self._writer.submit(self._store.claim, job.status.copy(deep=True), job.payload["sha256"])
+            status = await asyncio.wrap_future(claim)
+            if status is not None:
+                raise JobInFlightError(_from_status(status))
+
+    def _unclaim(self, job: Job):
+        if self._store is not None:
+            self._writer.submit(self._store.delete, job.id)
+
+    def _received(self, job: Job):
+        self._jobs[job.id] = job
+        self._prune()
+        self._save(job)
+        self._notify(job, "received")
+
+    def _save(self, job: Job):
+        # A copy, so the write sees the status as it is now
+        if self._store is not None:
+            self._writer.submit(self._store.save, job.status.copy(deep=True), job.payload.get("sha256"))
+
+    def _prune(self):
+        """
+        Drop the oldest finished jobs once the history limit is exceeded.
+        """
+        excess = len(self._jobs) - JOB_HISTORY_LIMIT
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:excess]:
+            del self._jobs[job_id]
+
+
+def _from_status(status: JobStatus) -> Job:
+    """
+    A read-only copy of a job held by another server process.
+    """
+    job = Job(status.filename, {}, status.id)
+    job.status = status
+    if job.finished:
+        job.done.set()
+    return job
+
+
+def _accumulate(totals: Dict[str, List[float]], key: str, elapsed: float):
+    entry = totals.setdefault(key, [0, 0.0])
+    entry[0] += 1
+    entry[1] += elapsed
+
+
+def _averages(totals: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        key: {"count": int(count), "avgMs": round(total / count, 2)}
+        for key, (count, total) in totals.items()
+    }
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
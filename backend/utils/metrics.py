@@ -0,0 +1,231 @@
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from a cache hit to a slow model call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class _Metric:
+    """
+    Base for metrics whose values are kept in per-thread shards. Updates
+    only touch the calling thread's shard, so the hot path takes no lock;
+    collect() sums the shards.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], Any]] = []
+        self._shards_lock = threading.Lock()
+        registry.register(self)
+
+    def _shard(self) -> Dict[Tuple[str, ...], Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Dict[Tuple[str, ...], Any] = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _snapshot(self) -> List[Dict[Tuple[str, ...], Any]]:
+        with self._shards_lock:
+            return [dict(shard) for shard in self._shards]
+
+    def collect(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def collect(self) -> Iterable[str]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        for labels, value in sorted(totals.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # Per-bucket (non-cumulative) counts with +Inf last, then the sum
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def collect(self) -> Iterable[str]:
+        totals: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in self._snapshot():
+            for labels, entry in shard.items():
+                total = totals.setdefault(labels, [0] * len(entry))
+                for index, value in enumerate(entry):
+                    total[index] += value
+        for labels, entry in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(entry[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+
+class Gauge(_Metric):
+    """
+    A value read from a callback at scrape time, e.g. a queue depth.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(name, documentation)
+        self._function = function
+
+    def collect(self) -> Iterable[str]:
+        yield f"{self.name} {_number(self._function())}"
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        # Re-registering a name (e.g. a module imported twice) replaces the old metric
+        self._metrics[metric.name] = metric
+
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Shared metrics, updated across modules
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+STAGE_LATENCY = Histogram("pipeline_stage_duration_seconds", "Time spent in each ingestion pipeline stage.", ("stage",))
+EXTRACTION_LATENCY = Histogram("extraction_duration_seconds", "Worker time to extract a document's text, by file type.", ("content_type",))
+OCR_LATENCY = Histogram("ocr_page_duration_seconds", "Worker time to recognize a scanned PDF page, by whether the cache answered it.", ("outcome",))
+DOCUMENTS = Counter("documents_processed_total", "Uploaded documents by outcome.", ("status",))
+DOCUMENT_BYTES = Counter("document_bytes_processed_total", "Bytes of uploaded documents by outcome.", ("status",))
+UPLOAD_DEDUP = Counter("upload_dedup_total", "Uploads answered with an earlier result instead of being processed, by reason.", ("reason",))
+INFERENCE_REQUESTS = Counter("inference_requests_total", "Inference API requests by outcome.", ("outcome",))
+INFERENCE_RETRIES = Counter("inference_retries_total", "Inference API requests retried while the model was loading.")
+INFERENCE_LATENCY = Histogram("inference_request_duration_seconds", "Inference API request latency, including retries.")
+INFERENCE_PROMPTS = Counter("inference_prompts_total", "Prompts sent to the inference backend.", ("backend",))
+INFERENCE_BATCH_SIZE = Histogram("inference_batch_size", "Prompts per inference batch.", ("backend",), buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that counts requests and times them per route template
+    (e.g. /jobs/{job_id}), so label values stay bounded. Requests that match
+    no route are grouped as "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route_path(scope)
+            HTTP_REQUESTS.inc(scope["method"], route, status)
+            HTTP_LATENCY.observe(time.perf_counter() - start, scope["method"], route)
+
+
+_route_paths: Dict[Any, str] = {}  # Endpoint function -> route template
+
+
+def _route_path(scope) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        path = "unmatched"
+        for route in getattr(scope.get("app"), "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint:
+                path = route.path
+                break
+        _route_paths[endpoint] = path
+    return path
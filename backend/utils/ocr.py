@@ -0,0 +1,327 @@
+import asyncio
+import hashlib
+import io
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from PyPDF2 import PdfReader
+
+from utils.db import SQLiteDatabase
+from utils.extraction import ExtractionError, ExtractionPool
+from utils.metrics import OCR_LATENCY
+from utils.serving import per_worker
+
+# Load environment variables
+load_dotenv()
+
+# OCR configuration; the stage only runs when pytesseract and the tesseract binary are installed
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(per_worker(max(1, (os.cpu_count() or 1) // 2)))))  # CPU budget per server process: pages recognized at once
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "20"))  # Pages recognized per document; later empty pages stay empty
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "30"))  # Seconds per page before its worker is killed
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "eng")  # Tesseract languages, joined with +
+OCR_CACHE_DB = os.getenv("OCR_CACHE_DB", os.path.join("data", "ocr.db"))
+
+# Applied in order by SQLiteDatabase
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS ocr_images (
+        image_hash TEXT NOT NULL,
+        languages TEXT NOT NULL,
+        text TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (image_hash, languages)
+    )
+    """,
+]
+
+# Raw image samples are decoded by colour space; these filters already hold an image file
+IMAGE_FILE_FILTERS = ("/DCTDecode", "/JPXDecode", "/CCITTFaxDecode")
+COLOR_SPACE_MODES = {"/DeviceGray": "L", "/CalGray": "L", "/DeviceRGB": "RGB", "/CalRGB": "RGB", "/DeviceCMYK": "CMYK"}
+ICC_COMPONENT_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+
+
+class OCRCache:
+    """
+    Recognized text keyed by the hash of the image it came from, so a page
+    scanned once (a cover sheet, a repeated form) is only recognized once.
+    Shared by the OCR worker processes through SQLite.
+    """
+
+    def __init__(self, path: str = OCR_CACHE_DB):
+        self._db = SQLiteDatabase(path, MIGRATIONS)
+
+    def get(self, image_hash: str, languages: str) -> Optional[str]:
+        row = self._db.connection().execute(
+            "SELECT text FROM ocr_images WHERE image_hash = ? AND languages = ?", (image_hash, languages)
+        ).fetchone()
+        return row["text"] if row else None
+
+    def put(self, image_hash: str, languages: str, text: str) -> bool:
+        """
+        Store an image's text. Returns False if another worker already had.
+        """
+        connection = self._db.connection()
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO ocr_images (image_hash, languages, text, created) VALUES (?, ?, ?, ?)",
+            (image_hash, languages, text, time.time()),
+        )
+        connection.commit()
+        return cursor.rowcount > 0
+
+    def size(self) -> int:
+        return self._db.connection().execute("SELECT COUNT(*) FROM ocr_images").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+def tesseract_available() -> bool:
+    """
+    True if pytesseract is installed and can find the tesseract binary.
+    """
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except Exception:
+        return False
+    return True
+
+
+def iter_page_images(page, depth: int = 0) -> Iterator[Any]:
+    """
+    Yield the image XObjects drawn on a page, including those inside form XObjects.
+    """
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if not xobjects:
+        return
+    for reference in xobjects.get_object().values():
+        xobject = reference.get_object()
+        if xobject.get("/Subtype") == "/Image":
+            yield xobject
+        elif xobject.get("/Subtype") == "/Form" and depth < 3:
+            yield from iter_page_images(xobject, depth + 1)
+
+
+def decode_image(xobject, data: bytes):
+    """
+    Turn an image XObject's decoded stream into a PIL image, or None if its
+    colour space isn't supported.
+    """
+    from PIL import Image
+
+    filters = xobject.get("/Filter") or []
+    filters = [filters] if isinstance(filters, str) else list(filters)
+    if filters and filters[-1] in IMAGE_FILE_FILTERS:
+        return Image.open(io.BytesIO(data))
+    size = (int(xobject["/Width"]), int(xobject["/Height"]))
+    if int(xobject.get("/BitsPerComponent", 8)) == 1:
+        return Image.frombytes("1", size, data)
+    color_space = xobject.get("/ColorSpace")
+    if isinstance(color_space, list) and color_space and color_space[0] == "/ICCBased":
+        mode = ICC_COMPONENT_MODES.get(int(color_space[1].get_object().get("/N", 0)))
+    else:
+        mode = COLOR_SPACE_MODES.get(color_space)
+    return Image.frombytes(mode, size, data) if mode else None
+
+
+_worker_cache: Optional[OCRCache] = None  # One per worker process
+
+
+def ocr_pdf_page(path: str, index: int, languages: str, cache_path: str) -> Dict[str, Any]:
+    """
+    Recognize the text of the images on one PDF page, reusing cached text for
+    images seen before. Runs in an OCR worker process.
+    """
+    global _worker_cache
+    import pytesseract
+
+    begin = time.perf_counter()
+    # The worker count is the CPU budget, so keep tesseract itself single-threaded
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    if _worker_cache is None:
+        _worker_cache = OCRCache(cache_path)
+    texts, images, cached, stored = [], 0, 0, 0
+    try:
+        with open(path, "rb") as f:
+            for xobject in iter_page_images(PdfReader(f).pages[index]):
+                data = xobject.get_data()
+                image_hash = hashlib.sha256(f"{xobject.get('/Width')}x{xobject.get('/Height')}:".encode() + data).hexdigest()
+                text = _worker_cache.get(image_hash, languages)
+                if text is None:
+                    image = decode_image(xobject, data)
+                    if image is None:
+                        continue
+                    text = pytesseract.image_to_string(image, lang=languages).strip()
+                    stored += _worker_cache.put(image_hash, languages, text)
+                else:
+                    cached += 1
+                images += 1
+                texts.append(text)
+    except MemoryError:
+        raise ExtractionError(f"Page {index + 1} exceeded the OCR memory limit.")
+    except Exception as e:
+        raise ExtractionError(f"Failed to recognize text on page {index + 1}: {str(e)}")
+    return {
+        "text": "\n".join(text for text in texts if text),
+        "images": images,
+        "cached": images > 0 and cached == images,
+        "stored": stored,
+        "ocrMs": round((time.perf_counter() - begin) * 1000, 2),
+    }
+
+
+class PageOCR:
+    """
+    Fallback for scanned PDFs: pages PyPDF2 found no text on are recognized
+    with tesseract, one page per task on a pool of OCR_WORKERS processes kept
+    apart from the extraction pool. At most OCR_MAX_PAGES pages are
+    recognized per document so one long scan can't hold the pool.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = OCR_ENABLED,
+        workers: int = OCR_WORKERS,
+        max_pages: int = OCR_MAX_PAGES,
+        timeout: float = OCR_TIMEOUT,
+        languages: str = OCR_LANGUAGES,
+        cache_path: str = OCR_CACHE_DB,
+    ):
+        self.available = enabled and tesseract_available()
+        self._pool = ExtractionPool(workers=workers, timeout=timeout)
+        self._max_pages = max_pages
+        self._languages = languages
+        self._cache_path = cache_path
+        self._cache = OCRCache(cache_path)
+        # Counted once, then kept up to date from the entries this process's workers add
+        self._cached_images = self._cache.size()
+        self._documents = 0
+        self._pages = 0
+        self._cached_pages = 0
+        self._failed_pages = 0
+        self._skipped_pages = 0
+
+    async def start(self):
+        if self.available:
+            await self._pool.start()
+
+    def document(self, path: str) -> "DocumentOCR":
+        """
+        Start recognizing a PDF's pages one at a time, as extraction finds them empty.
+        """
+        return DocumentOCR(self, path)
+
+    async def recognize(self, path: str, pages: List[int]) -> Tuple[Dict[int, str], List[Dict[str, Any]]]:
+        """
+        Recognize the given zero-based pages of a PDF in parallel. Returns the
+        text found per page index, and a record per page (see DocumentOCR.finish).
+        """
+        document = self.document(path)
+        for index in pages:
+            document.add(index)
+        return await document.finish()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "languages": self._languages,
+            "maxPages": self._max_pages,
+            "documents": self._documents,
+            "pages": self._pages,
+            "cachedPages": self._cached_pages,
+            "failedPages": self._failed_pages,
+            "skippedPages": self._skipped_pages,
+            "cachedImages": self._cached_images,
+            "pool": self._pool.stats(),
+        }
+
+    def shutdown(self):
+        self._pool.shutdown()
+        self._cache.close()
+
+
+class DocumentOCR:
+    """
+    The OCR of one PDF. Each page added starts recognizing at once, so OCR
+    overlaps the extraction of later pages; pages past OCR_MAX_PAGES are
+    skipped.
+    """
+
+    def __init__(self, ocr: PageOCR, path: str):
+        self._ocr = ocr
+        self._path = path
+        self._tasks: Dict[int, asyncio.Future] = {}
+        self._skipped: List[int] = []
+        self._results: Dict[int, Any] = {}
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks or self._skipped)
+
+    def add(self, index: int):
+        ocr = self._ocr
+        if not self.started:
+            ocr._documents += 1
+        if len(self._tasks) >= ocr._max_pages:
+            self._skipped.append(index)
+            return
+        self._tasks[index] = asyncio.ensure_future(ocr._pool.run(ocr_pdf_page, self._path, index, ocr._languages, ocr._cache_path))
+
+    def pending(self, index: int) -> bool:
+        """
+        True if this page is being recognized and its text isn't in yet.
+        """
+        task = self._tasks.get(index)
+        return task is not None and index not in self._results and not task.done()
+
+    async def text(self, index: int) -> str:
+        """
+        The recognized text of a page, waiting for it if need be; empty if the
+        page wasn't recognized or recognition failed.
+        """
+        if index not in self._tasks:
+            return ""
+        result = await self._result(index)
+        return result["text"] if isinstance(result, dict) else ""
+
+    async def finish(self) -> Tuple[Dict[int, str], List[Dict[str, Any]]]:
+        """
+        Wait for every page. Returns the text found per page index, and a
+        record per page (1-based page number, milliseconds, whether the cache
+        answered it, or why it failed, or that it was skipped by the page cap).
+        """
+        ocr = self._ocr
+        texts: Dict[int, str] = {}
+        records: List[Dict[str, Any]] = []
+        for index in sorted(self._tasks):
+            result = await self._result(index)
+            if isinstance(result, ExtractionError):
+                ocr._failed_pages += 1
+                records.append({"page": index + 1, "error": str(result)})
+                continue
+            outcome = "cached" if result["cached"] else "recognized"
+            ocr._pages += 1
+            ocr._cached_pages += result["cached"]
+            ocr._cached_images += result["stored"]
+            OCR_LATENCY.observe(result["ocrMs"] / 1000, outcome)
+            texts[index] = result["text"]
+            records.append({"page": index + 1, "ms": result["ocrMs"], "cached": result["cached"], "images": result["images"]})
+        ocr._skipped_pages += len(self._skipped)
+        records.extend({"page": index + 1, "skipped": True} for index in self._skipped)
+        return texts, records
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+    async def _result(self, index: int):
+        if index not in self._results:
+            try:
+                self._results[index] = await self._tasks[index]
+            except ExtractionError as e:
+                self._results[index] = e
+        return self._results[index]
@@ -0,0 +1,113 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from utils.db import SQLiteDatabase
+
+# Load environment variables
+load_dotenv()
+
+# Search index configuration
+SEARCH_DB = os.getenv("SEARCH_DB", os.path.join("data", "search.db"))
+SEARCH_TITLE_WEIGHT = float(os.getenv("SEARCH_TITLE_WEIGHT", "10.0"))  # BM25 weight of title matches relative to body text
+SEARCH_SNIPPET_TOKENS = int(os.getenv("SEARCH_SNIPPET_TOKENS", "16"))  # Approximate snippet length in tokens
+
+# Applied in order by SQLiteDatabase
+MIGRATIONS = [
+    # Maps document ids to the integer rowids FTS5 keys on, so deletes are a primary key lookup
+    """
+    CREATE TABLE IF NOT EXISTS search_documents (
+        rowid INTEGER PRIMARY KEY,
+        document_id TEXT NOT NULL UNIQUE
+    )
+    """,
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(title, content, tokenize = 'porter unicode61')",
+]
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+
+class SearchIndex:
+    """
+    Full-text index over extracted document text, backed by SQLite FTS5 and
+    ranked with BM25.
+    """
+
+    def __init__(self, path: str = SEARCH_DB):
+        self._db = SQLiteDatabase(path, MIGRATIONS)
+
+    def add(self, document_id: str, title: str, content: str):
+        connection = self._db.connection()
+        with connection:
+            self._remove(connection, document_id)
+            cursor = connection.execute("INSERT INTO search_documents (document_id) VALUES (?)", (document_id,))
+            connection.execute(
+                "INSERT INTO search_fts (rowid, title, content) VALUES (?, ?, ?)",
+                (cursor.lastrowid, title, content),
+            )
+
+    def remove(self, document_id: str) -> bool:
+        connection = self._db.connection()
+        with connection:
+            return self._remove(connection, document_id)
+
+    def content(self, document_id: str) -> Optional[str]:
+        """
+        Return the indexed text of a document.
+        """
+        row = self._db.connection().execute(
+            "SELECT search_fts.content FROM search_documents "
+            "JOIN search_fts ON search_fts.rowid = search_documents.rowid "
+            "WHERE search_documents.document_id = ?",
+            (document_id,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, prefix: bool = False) -> List[Dict[str, Any]]:
+        """
+        Return matching document ids, best first, with BM25 scores (higher is better) and highlighted snippets.
+        """
+        match = build_match_query(query, prefix)
+        if not match:
+            return []
+        rows = self._db.connection().execute(
+            "SELECT search_documents.document_id, bm25(search_fts, ?, 1.0) AS rank, "
+            "snippet(search_fts, 1, ?, ?, '…', ?) AS snippet "
+            "FROM search_fts JOIN search_documents ON search_documents.rowid = search_fts.rowid "
+            "WHERE search_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+            (SEARCH_TITLE_WEIGHT, HIGHLIGHT_START, HIGHLIGHT_END, SEARCH_SNIPPET_TOKENS, match, limit, offset),
+        )
+        # FTS5's bm25() is negative, lower meaning more relevant
+        return [
+            {"id": row["document_id"], "score": round(-row["rank"], 4), "snippet": row["snippet"]}
+            for row in rows
+        ]
+
+    def close(self):
+        self._db.close()
+
+    def _remove(self, connection, document_id: str) -> bool:
+        row = connection.execute("SELECT rowid FROM search_documents WHERE document_id = ?", (document_id,)).fetchone()
+        if not row:
+            return False
+        connection.execute("DELETE FROM search_fts WHERE rowid = ?", (row[0],))
+        connection.execute("DELETE FROM search_documents WHERE rowid = ?", (row[0],))
+        return True
+
+
+def build_match_query(query: str, prefix: bool = False) -> str:
+    """
+    Turn free text into an FTS5 query where every word must match. With
+    `prefix`, the last word also matches as a prefix (for search-as-you-type);
+    short prefixes can expand to many terms, so it is opt-in.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
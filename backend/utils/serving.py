@@ -0,0 +1,76 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Server processes. `python main.py` starts one per core unless this is set,
+# and exports the count to the processes it starts; each imports the app on
+# its own, so state that must be seen by all of them lives in SQLite or files.
+# Anything else that starts several processes (e.g. `uvicorn --workers`)
+# must set it to match, or the processes won't share state.
+WEB_WORKERS = max(1, int(os.getenv("WEB_WORKERS", "1")))
+SHARED_STATE = WEB_WORKERS > 1  # Whether other server processes may be reading and writing the same data
+
+
+def per_worker(total: int) -> int:
+    """
+    Split a machine-wide process budget (e.g. extraction workers) between the server processes.
+    """
+    return max(1, total // WEB_WORKERS)
+
+
+def process_alive(pid: int) -> bool:
+    """
+    True if a process with this id is running on this machine. Only checked on
+    POSIX; elsewhere every process is assumed alive.
+    """
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class FileLock:
+    """
+    An exclusive lock held across threads and processes, using flock on a lock
+    file. Where flock isn't available (Windows) only threads are excluded,
+    which is enough for a single server process.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._thread_lock = threading.RLock()
+        self._file = None
+        self._depth = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                import fcntl
+            except ImportError:
+                fcntl = None
+            if fcntl is not None:
+                self._file = open(self._path, "a")
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            # Closing the file releases the lock
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
@@ -0,0 +1,291 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+import zlib
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+
+import multipart
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from multipart.multipart import parse_options_header
+
+# Load environment variables
+load_dotenv()
+
+# Upload spooling configuration
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))  # Per file
+SPOOL_DIR = os.getenv("SPOOL_DIR") or None  # Defaults to the system temp directory
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Slack for boundaries and part headers when checking Content-Length
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class SpooledFile:
+    """
+    An uploaded file written to disk, with its size and SHA-256 computed while streaming.
+    """
+
+    def __init__(self, path: str, filename: str, content_type: str, size: int, sha256: str):
+        self.path = path
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+
+    def discard(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _Spooler:
+    """
+    python-multipart callbacks that write file parts straight to spool files.
+    Parsing happens on the event loop; the collected writes are flushed in the threadpool.
+    """
+
+    def __init__(self, max_bytes: int, accept: Optional[Callable[[str, str], None]]):
+        self._max_bytes = max_bytes
+        self._accept = accept
+        self._header_name = b""
+        self._header_value = b""
+        self._headers: List[Tuple[bytes, bytes]] = []
+        self._file = None
+        self._path = None
+        self._filename = ""
+        self._content_type = ""
+        self._size = 0
+        self._digest = None
+        self._pending: List[Tuple[object, bytes]] = []  # (file, data) waiting to be written
+        self._finished: List[Tuple[object, SpooledFile]] = []  # Closed after pending writes
+        self.completed: List[SpooledFile] = []
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._headers = []
+        self._file = None
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers.append((self._header_name.lower(), self._header_value))
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        headers = dict(self._headers)
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        if b"filename" not in options:
+            return  # Plain form fields are ignored
+        self._filename = options[b"filename"].decode("utf-8", "replace")
+        self._content_type = headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+        # Reject unwanted files before any of their bytes are read
+        if self._accept:
+            self._accept(self._filename, self._content_type)
+        fd, self._path = tempfile.mkstemp(dir=SPOOL_DIR, prefix="upload-")
+        self._file = os.fdopen(fd, "wb")
+        self._size = 0
+        self._digest = hashlib.sha256()
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._file is None:
+            return
+        chunk = data[start:end]
+        self._size += len(chunk)
+        if self._size > self._max_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large. The limit is {self._max_bytes} bytes.")
+        self._digest.update(chunk)
+        self._pending.append((self._file, chunk))
+
+    def on_part_end(self):
+        if self._file is None:
+            return
+        spooled = SpooledFile(self._path, self._filename, self._content_type, self._size, self._digest.hexdigest())
+        self._finished.append((self._file, spooled))
+        self._file = None
+        self._path = None
+
+    def flush(self):
+        """
+        Write pending chunks and close finished files (runs in the threadpool).
+        """
+        for file, chunk in self._pending:
+            file.write(chunk)
+        self._pending = []
+        for file, spooled in self._finished:
+            file.close()
+            self.completed.append(spooled)
+        self._finished = []
+
+    def abort(self):
+        """
+        Close and remove every file that was not handed to the caller.
+        """
+        self._pending = []
+        open_files = [file for file, _ in self._finished]
+        paths = [spooled.path for _, spooled in self._finished] + [spooled.path for spooled in self.completed]
+        if self._file is not None:
+            open_files.append(self._file)
+            paths.append(self._path)
+        for file in open_files:
+            file.close()
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._finished = []
+        self.completed = []
+        self._file = None
+
+
+async def iter_spooled_files(
+    request: Request,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    accept: Optional[Callable[[str, str], None]] = None,
+    max_total_bytes: Optional[int] = None,
+) -> AsyncIterator[SpooledFile]:
+    """
+    Stream a multipart request body to disk, yielding each file as soon as it is complete.
+
+    Only one chunk of the body is held in memory at a time. `accept(filename,
+    content_type)` may raise to reject a file before its data is read.
+    `max_total_bytes` limits the whole body. Files that have been yielded
+    belong to the caller; the rest are removed on error.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+    content_length = request.headers.get("content-length")
+    if max_total_bytes is not None and content_length and content_length.isdigit() and int(content_length) > max_total_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload too large. The limit is {max_total_bytes} bytes.")
+
+    spooler = _Spooler(max_bytes, accept)
+    parser = multipart.MultipartParser(params[b"boundary"], spooler.callbacks())
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if max_total_bytes is not None and received > max_total_bytes:
+                raise HTTPException(status_code=413, detail=f"Upload too large. The limit is {max_total_bytes} bytes.")
+            parser.write(chunk)
+            await run_in_threadpool(spooler.flush)
+            while spooler.completed:
+                yield spooler.completed.pop(0)
+        parser.finalize()
+        await run_in_threadpool(spooler.flush)
+        while spooler.completed:
+            yield spooler.completed.pop(0)
+    except BaseException:
+        spooler.abort()
+        raise
+
+
+async def spool_upload(
+    request: Request,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    accept: Optional[Callable[[str, str], None]] = None,
+) -> SpooledFile:
+    """
+    Spool a single-file upload, rejecting oversized requests from Content-Length before reading the body.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large. The limit is {max_bytes} bytes.")
+
+    spooled = None
+    try:
+        # Without a Content-Length, extra parts would otherwise be read and spooled only to be discarded
+        async for item in iter_spooled_files(request, max_bytes, accept, max_total_bytes=max_bytes + MULTIPART_OVERHEAD_BYTES):
+            if spooled is None:
+                spooled = item
+            else:
+                item.discard()  # Only the first file is used
+    except BaseException:
+        if spooled is not None:
+            spooled.discard()
+        raise
+    if spooled is None:
+        raise HTTPException(status_code=400, detail="No file was uploaded.")
+    return spooled
+
+
+async def spool_body(request: Request, filename: str, content_type: str, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledFile:
+    """
+    Stream a raw (non-multipart) request body to a spool file.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large. The limit is {max_bytes} bytes.")
+
+    fd, path = tempfile.mkstemp(dir=SPOOL_DIR, prefix="upload-")
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File too large. The limit is {max_bytes} bytes.")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return SpooledFile(path, filename, content_type, size, digest.hexdigest())
+
+
+def iter_zip_entries(path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> Iterator[Tuple[str, Optional[SpooledFile], Optional[str]]]:
+    """
+    Copy the files in a ZIP archive to spool files one at a time, yielding
+    (name, spooled file, None), or (name, None, error) for an entry that
+    can't be used. Sizes are enforced while decompressing, so a forged
+    header can't smuggle in an oversized entry. Raises zipfile.BadZipFile
+    for a file that isn't a ZIP archive.
+    """
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.file_size > max_bytes:
+                yield info.filename, None, f"File too large. The limit is {max_bytes} bytes."
+                continue
+            fd, entry_path = tempfile.mkstemp(dir=SPOOL_DIR, prefix="upload-")
+            size = 0
+            digest = hashlib.sha256()
+            try:
+                with os.fdopen(fd, "wb") as out, archive.open(info) as source:
+                    while True:
+                        chunk = source.read(COPY_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise ValueError(f"File too large. The limit is {max_bytes} bytes.")
+                        digest.update(chunk)
+                        out.write(chunk)
+            except (ValueError, RuntimeError, EOFError, OSError, zipfile.BadZipFile, zlib.error) as e:
+                # Oversized, encrypted or corrupt entry
+                os.unlink(entry_path)
+                yield info.filename, None, str(e)
+                continue
+            except BaseException:
+                os.unlink(entry_path)
+                raise
+            yield info.filename, SpooledFile(entry_path, os.path.basename(info.filename), "", size, digest.hexdigest()), None
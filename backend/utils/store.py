@@ -0,0 +1,317 @@
+import base64
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils.db import SQLiteDatabase
+from utils.serving import SHARED_STATE
+
+# Load environment variables
+load_dotenv()
+
+# Document store configuration
+DOCUMENT_STORE = os.getenv("DOCUMENT_STORE", "sqlite")  # sqlite, or memory for tests
+DOCUMENT_DB = os.getenv("DOCUMENT_DB", os.path.join("data", "documents.db"))
+
+# DocumentMetadata field -> SQLite column
+COLUMNS = {
+    "id": "id",
+    "title": "title",
+    "uploadDate": "upload_date",
+    "category": "category",
+    "summary": "summary",
+    "pageCount": "page_count",
+    "extractMs": "extract_ms",
+    "contentHash": "content_hash",
+    "contentType": "content_type",
+    "size": "size",
+}
+
+# Applied in order by SQLiteDatabase
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+        id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        upload_date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        summary TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS documents_category ON documents (category)",
+    "CREATE INDEX IF NOT EXISTS documents_upload_date ON documents (upload_date)",
+    # Composite indexes matching the keyset pagination orderings
+    "DROP INDEX IF EXISTS documents_upload_date",
+    "DROP INDEX IF EXISTS documents_category",
+    "CREATE INDEX IF NOT EXISTS documents_upload_date_id ON documents (upload_date, id)",
+    "CREATE INDEX IF NOT EXISTS documents_title_id ON documents (title, id)",
+    "CREATE INDEX IF NOT EXISTS documents_category_upload_date_id ON documents (category, upload_date, id)",
+    "ALTER TABLE documents ADD COLUMN page_count INTEGER",
+    "ALTER TABLE documents ADD COLUMN extract_ms REAL",
+    # Original file, stored in the blob store under its SHA-256
+    "ALTER TABLE documents ADD COLUMN content_hash TEXT",
+    "ALTER TABLE documents ADD COLUMN content_type TEXT",
+    "ALTER TABLE documents ADD COLUMN size INTEGER",
+    "CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash)",
+    # Title ordering within one category
+    "CREATE INDEX IF NOT EXISTS documents_category_title_id ON documents (category, title, id)",
+]
+
+# Fields documents can be sorted by
+SORT_FIELDS = ("uploadDate", "title", "category")
+SORT_ORDERS = ("asc", "desc")
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised when a pagination cursor is malformed or was issued for a different sort.
+    """
+
+
+class DocumentStore:
+    """
+    Storage interface for document metadata. Documents are plain dicts keyed
+    like DocumentMetadata.
+    """
+
+    def add(self, document: Dict[str, Any]):
+        raise NotImplementedError
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete(self, document_id: str) -> bool:
+        raise NotImplementedError
+
+    def list(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the oldest document whose original file has this SHA-256.
+        """
+        raise NotImplementedError
+
+    def query(
+        self,
+        category: Optional[str] = None,
+        uploaded_after: Optional[str] = None,
+        uploaded_before: Optional[str] = None,
+        sort: str = "uploadDate",
+        order: str = "desc",
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of documents plus the cursor for the next page (None on the last page).
+        Upload date bounds are inclusive; a bare date as the upper bound covers the whole day.
+        """
+        raise NotImplementedError
+
+    def count(self, category: Optional[str] = None, uploaded_after: Optional[str] = None, uploaded_before: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryDocumentStore(DocumentStore):
+    """
+    Non-persistent store for tests and local experiments.
+    """
+
+    def __init__(self):
+        self._documents: Dict[str, Dict[str, Any]] = {}  # Insertion ordered
+
+    def add(self, document: Dict[str, Any]):
+        self._documents[document["id"]] = dict(document)
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        document = self._documents.get(document_id)
+        return dict(document) if document else None
+
+    def delete(self, document_id: str) -> bool:
+        return self._documents.pop(document_id, None) is not None
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [dict(document) for document in self._documents.values()]
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        for document in self._documents.values():
+            if document.get("contentHash") == content_hash:
+                return dict(document)
+        return None
+
+    def query(self, category=None, uploaded_after=None, uploaded_before=None, sort="uploadDate", order="desc", limit=50, cursor=None, fields=None):
+        matches = self._filter(category, uploaded_after, uploaded_before)
+        matches.sort(key=lambda document: (document[sort], document["id"]), reverse=order == "desc")
+        if cursor:
+            position = decode_cursor(cursor, sort, order)
+            if order == "desc":
+                matches = [document for document in matches if (document[sort], document["id"]) < position]
+            else:
+                matches = [document for document in matches if (document[sort], document["id"]) > position]
+        return _page(matches, sort, order, limit, fields)
+
+    def count(self, category=None, uploaded_after=None, uploaded_before=None) -> int:
+        if category is None and uploaded_after is None and uploaded_before is None:
+            return len(self._documents)
+        return len(self._filter(category, uploaded_after, uploaded_before))
+
+    def _filter(self, category, uploaded_after, uploaded_before) -> List[Dict[str, Any]]:
+        uploaded_before = _upper_bound(uploaded_before)
+        return [
+            document
+            for document in self._documents.values()
+            if (category is None or document["category"] == category)
+            and (uploaded_after is None or document["uploadDate"] >= uploaded_after)
+            and (uploaded_before is None or document["uploadDate"] <= uploaded_before)
+        ]
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """
+    Embedded SQLite store in WAL mode, indexed by id, category and upload date.
+    """
+
+    def __init__(self, path: str = DOCUMENT_DB):
+        self._db = SQLiteDatabase(path, MIGRATIONS)
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._db.connection()
+
+    def add(self, document: Dict[str, Any]):
+        fields = [field for field in COLUMNS if field in document]
+        columns = ", ".join(COLUMNS[field] for field in fields)
+        placeholders = ", ".join("?" for _ in fields)
+        connection = self._connection()
+        connection.execute(
+            f"INSERT OR REPLACE INTO documents ({columns}) VALUES ({placeholders})",
+            [document[field] for field in fields],
+        )
+        connection.commit()
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(f"SELECT {_SELECT} FROM documents WHERE id = ?", (document_id,)).fetchone()
+        return _to_document(row) if row else None
+
+    def delete(self, document_id: str) -> bool:
+        connection = self._connection()
+        cursor = connection.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+        connection.commit()
+        return cursor.rowcount > 0
+
+    def list(self) -> List[Dict[str, Any]]:
+        rows = self._connection().execute(f"SELECT {_SELECT} FROM documents ORDER BY upload_date, rowid")
+        return [_to_document(row) for row in rows]
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            f"SELECT {_SELECT} FROM documents WHERE content_hash = ? ORDER BY upload_date, rowid LIMIT 1", (content_hash,)
+        ).fetchone()
+        return _to_document(row) if row else None
+
+    def query(self, category=None, uploaded_after=None, uploaded_before=None, sort="uploadDate", order="desc", limit=50, cursor=None, fields=None):
+        column = COLUMNS[sort]
+        conditions, params = _conditions(category, uploaded_after, uploaded_before)
+        if cursor:
+            # Keyset pagination: continue strictly after the last row of the previous page
+            conditions.append(f"({column}, id) {'<' if order == 'desc' else '>'} (?, ?)")
+            params.extend(decode_cursor(cursor, sort, order))
+        selected = [field for field in COLUMNS if fields is None or field in fields or field in (sort, "id")]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS[field] for field in selected)} FROM documents {where} "
+            f"ORDER BY {column} {order.upper()}, id {order.upper()} LIMIT ?",
+            params + [limit + 1],
+        )
+        documents = [{field: row[COLUMNS[field]] for field in selected} for row in rows]
+        return _page(documents, sort, order, limit, fields)
+
+    def count(self, category=None, uploaded_after=None, uploaded_before=None) -> int:
+        conditions, params = _conditions(category, uploaded_after, uploaded_before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._connection().execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+_SELECT = ", ".join(COLUMNS.values())
+
+
+def _to_document(row: sqlite3.Row) -> Dict[str, Any]:
+    return {field: row[column] for field, column in COLUMNS.items()}
+
+
+def encode_cursor(sort: str, order: str, document: Dict[str, Any]) -> str:
+    raw = json.dumps([sort, order, document[sort], document["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple[str, str]:
+    """
+    Return the (sort value, id) position encoded in a cursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, document_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Invalid cursor.")
+    # Every sortable field is text; anything else was not issued by encode_cursor
+    if not isinstance(value, str) or not isinstance(document_id, str):
+        raise InvalidCursorError("Invalid cursor.")
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise InvalidCursorError("Cursor was issued for a different sort order.")
+    return value, document_id
+
+
+def _page(documents: List[Dict[str, Any]], sort: str, order: str, limit: int, fields) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Trim to the page size, build the next cursor and apply the field projection.
+    """
+    next_cursor = encode_cursor(sort, order, documents[limit - 1]) if len(documents) > limit else None
+    documents = documents[:limit]
+    if fields is not None:
+        documents = [{field: document.get(field) for field in COLUMNS if field in fields} for document in documents]
+    else:
+        documents = [dict(document) for document in documents]
+    return documents, next_cursor
+
+
+def _upper_bound(uploaded_before: Optional[str]) -> Optional[str]:
+    # A bare date includes every upload on that day
+    if uploaded_before is not None and len(uploaded_before) == 10:
+        return uploaded_before + " 23:59:59"
+    return uploaded_before
+
+
+def _conditions(category, uploaded_after, uploaded_before) -> Tuple[List[str], List[Any]]:
+    conditions, params = [], []
+    if category is not None:
+        conditions.append("category = ?")
+        params.append(category)
+    if uploaded_after is not None:
+        conditions.append("upload_date >= ?")
+        params.append(uploaded_after)
+    if uploaded_before is not None:
+        conditions.append("upload_date <= ?")
+        params.append(_upper_bound(uploaded_before))
+    return conditions, params
+
+
+def create_store(kind: str = DOCUMENT_STORE, path: str = DOCUMENT_DB) -> DocumentStore:
+    """
+    Build the configured document store.
+    """
+    if kind == "sqlite":
+        return SQLiteDocumentStore(path)
+    if kind == "memory":
+        if SHARED_STATE:
+            raise RuntimeError("The memory document store can't be shared between server processes; set WEB_WORKERS=1 or DOCUMENT_STORE=sqlite.")
+        return MemoryDocumentStore()
+    raise ValueError(f"Unknown document store: {kind}")
@@ -0,0 +1,448 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from utils.classifier import hash_terms
+from utils.db import SQLiteDatabase
+from utils.serving import SHARED_STATE, FileLock
+
+# Load environment variables
+load_dotenv()
+
+# Vector index configuration
+VECTOR_DIR = os.getenv("VECTOR_DIR", os.path.join("data", "vectors"))
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "256"))  # Size of hashed embeddings; a sentence-transformers model sets its own
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")  # sentence-transformers model; hashed embeddings when unset
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "flat")  # "flat" scans every vector; "ivf" probes the nearest clusters
+VECTOR_IVF_LISTS = int(os.getenv("VECTOR_IVF_LISTS", "0"))  # IVF clusters; 0 picks about sqrt(vectors)
+VECTOR_IVF_PROBE = int(os.getenv("VECTOR_IVF_PROBE", "16"))  # Clusters scanned per query
+VECTOR_IVF_MIN_VECTORS = int(os.getenv("VECTOR_IVF_MIN_VECTORS", "20000"))  # Below this, flat search is fast enough
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.95"))  # Cosine similarity; 0 disables
+VECTOR_SCAN_ROWS = 65536  # Vectors scored per block during a flat scan
+VECTOR_INITIAL_CAPACITY = 1024  # Rows allocated in a new vector file; doubled when full
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 32  # Training vectors sampled per IVF cluster
+VECTOR_CHANGES_KEPT = 100000  # Change log entries kept for other server processes to catch up on
+RETRAINED = -1  # Change log row marking new IVF clusters
+
+# Applied in order by SQLiteDatabase
+MIGRATIONS = [
+    # Row numbers index the memory-mapped vector file; `list` is the row's IVF cluster
+    """
+    CREATE TABLE IF NOT EXISTS vectors (
+        row INTEGER PRIMARY KEY,
+        document_id TEXT NOT NULL UNIQUE,
+        list INTEGER
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    # Rows written by one server process, replayed by the others (see VectorIndex._sync)
+    "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, row INTEGER NOT NULL)",
+]
+
+
+class HashingEmbedder:
+    """
+    Dependency-free embeddings: words and word pairs are hashed into a small
+    dense vector with random signs (the hashing trick), so texts that share
+    vocabulary point the same way.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes, counts = np.unique(hash_terms(text), return_counts=True)
+            signs = np.where((hashes >> 16) & 1, -1.0, 1.0)
+            np.add.at(vectors[row], hashes % self.dim, signs * (1 + np.log(counts)))
+        return _normalize(vectors)
+
+
+class SentenceEmbedder:
+    """
+    Embeddings from a sentence-transformers model, an optional dependency
+    loaded on first use.
+    """
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.name = model
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _ensure_model(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError:
+                    raise RuntimeError("EMBEDDING_MODEL requires sentence-transformers: pip install sentence-transformers")
+                self._model = SentenceTransformer(self.name, device="cpu")
+        return self._model
+
+    @property
+    def dim(self) -> int:
+        return self._ensure_model().get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self._ensure_model().encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+def create_embedder():
+    return SentenceEmbedder() if EMBEDDING_MODEL else HashingEmbedder()
+
+
+class VectorIndex:
+    """
+    Unit-length document embeddings in a memory-mapped float32 file, with
+    row-to-document ids in SQLite.
+
+    Queries score vectors by dot product (cosine similarity). A flat search
+    scans the file in blocks; with VECTOR_INDEX=ivf and enough vectors, the
+    rows are clustered with k-means and a query only scans the clusters
+    nearest to it. Deleted rows are masked out and their space is not
+    reused.
+    """
+
+    def __init__(self, directory: str = VECTOR_DIR, embedder=None, kind: str = VECTOR_INDEX):
+        self._embedder = embedder or create_embedder()
+        self._kind = kind
+        self._dim = self._embedder.dim
+        self._lock = threading.Lock()
+        self._db = SQLiteDatabase(os.path.join(directory, "vectors.db"), MIGRATIONS)
+        self._path = os.path.join(directory, "vectors.f32")
+        self._centroids_path = os.path.join(directory, "ivf_centroids.npy")
+        # Held while writing, so server processes sharing the directory don't hand out the same row
+        self._file_lock = FileLock(os.path.join(directory, "vectors.lock"))
+        self._check_settings()
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._live = np.zeros(0, dtype=bool)
+        with self._lock:
+            self._load()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self._embedder.embed([text])[0]
+
+    def add(self, document_id: str, vector: np.ndarray):
+        with self._lock, self._file_lock:
+            self._sync()
+            row = self._row_of.get(document_id)
+            if row is None:
+                row = self._count
+                self._ensure_capacity(row + 1)
+                self._count += 1
+                self._ids.append(document_id)
+                self._row_of[document_id] = row
+            self._vectors[row] = vector
+            self._live[row] = True
+            cluster = None
+            if self._centroids is not None:
+                cluster = int(np.argmax(self._centroids @ vector))
+                self._lists[cluster].append(row)
+            connection = self._db.connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO vectors (row, document_id, list) VALUES (?, ?, ?)",
+                    (row, document_id, cluster),
+                )
+                self._log_change(connection, row)
+
+    def remove(self, document_id: str) -> bool:
+        with self._lock, self._file_lock:
+            self._sync()
+            row = self._row_of.pop(document_id, None)
+            if row is None:
+                return False
+            self._ids[row] = None
+            self._live[row] = False
+            connection = self._db.connection()
+            with connection:
+                connection.execute("DELETE FROM vectors WHERE row = ?", (row,))
+                self._log_change(connection, row)
+            return True
+
+    def vector(self, document_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            self._sync()
+            row = self._row_of.get(document_id)
+            vectors = self._vectors
+        return None if row is None else np.array(vectors[row])
+
+    def search(self, vector: np.ndarray, limit: int = 10, exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Return the ids of the most similar documents, best first, with cosine similarity scores.
+        """
+        with self._lock:
+            self._sync()
+            # Rows are only ever appended or cleared, so reading these without the lock is safe
+            vectors, live, ids, count = self._vectors, self._live, self._ids, self._count
+            centroids, lists = self._centroids, self._lists
+        if exclude is not None:
+            limit += 1
+        if centroids is not None:
+            rows, scores = self._search_ivf(vector, limit, vectors, live, centroids, lists)
+        else:
+            rows, scores = self._search_flat(vector, limit, vectors, live, count)
+        matches = [
+            {"id": ids[row], "score": round(float(score), 4)}
+            for row, score in zip(rows, scores)
+            if ids[row] is not None and ids[row] != exclude
+        ]
+        return matches[:limit - 1] if exclude is not None else matches
+
+    def near_duplicate(self, vector: np.ndarray, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Tuple[Optional[str], Optional[float]]:
+        """
+        The id of the closest document if its similarity reaches `threshold`
+        (else None), and that similarity. A threshold of 0 disables the check.
+        """
+        if threshold <= 0:
+            return None, None
+        for match in self.search(vector, 1):
+            return (match["id"] if match["score"] >= threshold else None), match["score"]
+        return None, None
+
+    def train(self, lists: int = VECTOR_IVF_LISTS, min_vectors: int = VECTOR_IVF_MIN_VECTORS) -> bool:
+        """
+        Cluster the stored vectors for IVF search. Returns False when there are too few to be worth it.
+        """
+        with self._lock:
+            live_rows = np.flatnonzero(self._live[:self._count])
+            vectors = self._vectors
+        if len(live_rows) < max(min_vectors, 1):
+            return False
+        lists = lists or int(np.sqrt(len(live_rows)))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(live_rows, size=min(len(live_rows), lists * KMEANS_SAMPLE_PER_LIST), replace=False))
+        centroids = _kmeans(np.asarray(vectors[sample]), lists, rng)
+
+        assignments = np.empty(len(live_rows), dtype=np.int64)
+        for start in range(0, len(live_rows), VECTOR_SCAN_ROWS):
+            block = live_rows[start:start + VECTOR_SCAN_ROWS]
+            assignments[start:start + len(block)] = np.argmax(np.asarray(vectors[block]) @ centroids.T, axis=1)
+
+        with self._lock, self._file_lock:
+            self._sync()
+            # Rows added while training are assigned now; removed rows are skipped
+            trained = set(live_rows.tolist())
+            extra = [row for row in np.flatnonzero(self._live[:self._count]) if row not in trained]
+            grouped: List[List[int]] = [[] for _ in range(lists)]
+            for row, cluster in zip(live_rows.tolist(), assignments.tolist()):
+                if self._live[row]:
+                    grouped[cluster].append(row)
+            for row in extra:
+                grouped[int(np.argmax(centroids @ self._vectors[row]))].append(int(row))
+            # Written before the rows point at them, and replaced whole, for other server processes
+            partial = self._centroids_path + ".partial.npy"
+            np.save(partial, centroids)
+            os.replace(partial, self._centroids_path)
+            connection = self._db.connection()
+            with connection:
+                connection.executemany(
+                    "UPDATE vectors SET list = ? WHERE row = ?",
+                    [(cluster, row) for cluster, rows in enumerate(grouped) for row in rows],
+                )
+                self._log_change(connection, RETRAINED)
+            self._centroids, self._lists = centroids, grouped
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._sync()
+            return {
+                "embedder": self._embedder.name,
+                "dimensions": self._dim,
+                "index": "ivf" if self._centroids is not None else "flat",
+                "vectors": len(self._row_of),
+                "rows": self._count,
+                "capacity": self._capacity,
+                "ivfLists": len(self._lists) if self._centroids is not None else None,
+                "ivfProbe": VECTOR_IVF_PROBE if self._centroids is not None else None,
+            }
+
+    @property
+    def wants_training(self) -> bool:
+        return self._kind == "ivf" and self._centroids is None
+
+    def close(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+        self._db.close()
+
+    def _load(self):
+        """
+        Read the row assignments and IVF clusters from disk. Call with the lock held.
+        """
+        connection = self._db.connection()
+        # Read the change log position first: changes made while loading are replayed, which is harmless
+        self._seq = connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        rows = connection.execute("SELECT row, document_id, list FROM vectors").fetchall()
+        self._count = max((row[0] for row in rows), default=-1) + 1
+        self._ensure_capacity(max(self._count, 1))
+        self._live = np.zeros(self._capacity, dtype=bool)  # False for deleted rows and unused capacity
+        self._ids: List[Optional[str]] = [None] * self._count
+        self._row_of: Dict[str, int] = {}
+        for row, document_id, _ in rows:
+            self._ids[row] = document_id
+            self._row_of[document_id] = row
+            self._live[row] = True
+
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        if os.path.exists(self._centroids_path):
+            self._centroids = np.load(self._centroids_path)
+            self._lists = [[] for _ in range(len(self._centroids))]
+            for row, _, cluster in rows:
+                if cluster is not None:
+                    self._lists[cluster].append(row)
+
+    def _sync(self):
+        """
+        Apply rows added or removed by other server processes since the last
+        sync. Their vectors are already in the shared memory-mapped file, so
+        only the row assignments are read. Call with the lock held.
+        """
+        if not SHARED_STATE:
+            return
+        connection = self._db.connection()
+        changes = connection.execute("SELECT seq, row FROM changes WHERE seq > ? ORDER BY seq", (self._seq,)).fetchall()
+        if not changes:
+            return
+        if changes[0][0] != self._seq + 1 or any(row == RETRAINED for _, row in changes):
+            # Too far behind the pruned log, or the clusters changed
+            self._load()
+            return
+        for _, row in changes:
+            self._ensure_capacity(row + 1)
+            if row >= self._count:
+                self._ids.extend([None] * (row + 1 - self._count))
+                self._count = row + 1
+            previous = self._ids[row]
+            if previous is not None:
+                self._row_of.pop(previous, None)
+            record = connection.execute("SELECT document_id, list FROM vectors WHERE row = ?", (row,)).fetchone()
+            if record is None:
+                self._ids[row] = None
+                self._live[row] = False
+                continue
+            self._ids[row] = record[0]
+            self._row_of[record[0]] = row
+            self._live[row] = True
+            if record[1] is not None and self._centroids is not None and record[1] < len(self._lists):
+                self._lists[record[1]].append(row)
+        self._seq = changes[-1][0]
+
+    def _log_change(self, connection, row: int):
+        """
+        Record a write for the other server processes. Call inside the write's transaction with both locks held.
+        """
+        if not SHARED_STATE:
+            return
+        self._seq = connection.execute("INSERT INTO changes (row) VALUES (?)", (row,)).lastrowid
+        if self._seq % 1000 == 0:
+            connection.execute("DELETE FROM changes WHERE seq <= ?", (self._seq - VECTOR_CHANGES_KEPT,))
+
+    def _check_settings(self):
+        """
+        Refuse to open an index built with a different embedder, since its vectors aren't comparable.
+        """
+        connection = self._db.connection()
+        settings = dict(connection.execute("SELECT key, value FROM settings").fetchall())
+        expected = {"embedder": self._embedder.name, "dimensions": str(self._dim)}
+        if not settings:
+            with connection:
+                connection.executemany("INSERT INTO settings (key, value) VALUES (?, ?)", expected.items())
+        elif settings != expected:
+            raise RuntimeError(
+                f"The vector index was built with {settings.get('embedder')} ({settings.get('dimensions')} dimensions). "
+                f"Delete {os.path.dirname(self._path)} to rebuild it with {self._embedder.name}."
+            )
+
+    def _ensure_capacity(self, rows: int):
+        """
+        Grow the vector file (by doubling) so it holds at least `rows` rows. Call with the lock held.
+        """
+        if rows <= self._capacity:
+            return
+        existing = os.path.getsize(self._path) // (self._dim * 4) if os.path.exists(self._path) else 0
+        capacity = max(existing, VECTOR_INITIAL_CAPACITY)
+        while capacity < rows:
+            capacity *= 2
+        if capacity > existing:
+            with open(self._path, "ab") as f:
+                f.truncate(capacity * self._dim * 4)
+        if self._vectors is not None:
+            self._vectors.flush()
+        # Searches still holding the old map keep reading valid rows
+        self._vectors = np.memmap(self._path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+        self._live = np.concatenate([self._live, np.zeros(capacity - len(self._live), dtype=bool)])
+        self._capacity = capacity
+
+    def _search_flat(self, vector, limit, vectors, live, count) -> Tuple[np.ndarray, np.ndarray]:
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+        for start in range(0, count, VECTOR_SCAN_ROWS):
+            stop = min(start + VECTOR_SCAN_ROWS, count)
+            scores = np.asarray(vectors[start:stop]) @ vector
+            scores[~live[start:stop]] = -np.inf
+            rows, scores = _top(scores, limit)
+            best_rows, best_scores = _top_merge(best_rows, best_scores, rows + start, scores, limit)
+        keep = np.isfinite(best_scores)
+        return best_rows[keep], best_scores[keep]
+
+    def _search_ivf(self, vector, limit, vectors, live, centroids, lists) -> Tuple[np.ndarray, np.ndarray]:
+        probe = np.argsort(-(centroids @ vector))[:VECTOR_IVF_PROBE]
+        rows = np.concatenate([np.array(lists[cluster], dtype=np.int64) for cluster in probe])
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        rows = np.unique(rows[live[rows]])  # Sorted, for sequential reads from the memory map
+        scores = np.asarray(vectors[rows]) @ vector
+        top_rows, top_scores = _top(scores, limit)
+        return rows[top_rows], top_scores
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top(scores: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Indices and values of the `limit` highest scores, best first.
+    """
+    if len(scores) > limit:
+        indices = np.argpartition(-scores, limit)[:limit]
+    else:
+        indices = np.arange(len(scores))
+    indices = indices[np.argsort(-scores[indices])]
+    return indices, scores[indices]
+
+
+def _top_merge(rows_a, scores_a, rows_b, scores_b, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    rows = np.concatenate([rows_a, rows_b])
+    scores = np.concatenate([scores_a, scores_b])
+    indices, top_scores = _top(scores, limit)
+    return rows[indices], top_scores
+
+
+def _kmeans(sample: np.ndarray, clusters: int, rng) -> np.ndarray:
+    """
+    Spherical k-means: centroids are kept at unit length so assignment is a dot product.
+    """
+    centroids = sample[rng.choice(len(sample), size=min(clusters, len(sample)), replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = ~sums.any(axis=1)
+        # Reseed clusters that lost all their members
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
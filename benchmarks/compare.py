@@ -0,0 +1,63 @@
+"""
+Compare two benchmark result files, e.g. from the base and head of a branch.
+
+Prints the change in p50/p95/p99 latency and throughput for every operation
+and concurrency level both files measured, and exits with status 1 when a
+p95 latency grew by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def load(path: str) -> Tuple[Dict[str, Any], Dict[Tuple[str, int], Dict[str, Any]]]:
+    with open(path) as f:
+        report = json.load(f)
+    return report, {(result["operation"], result["concurrency"]): result for result in report["results"]}
+
+
+def change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def format_change(value: Optional[float]) -> str:
+    return "     n/a" if value is None else f"{value:+7.1f}%"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", help="Results file to compare against")
+    parser.add_argument("current", help="Results file being checked")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed p95 latency increase in percent (default: 10)")
+    args = parser.parse_args(argv)
+
+    baseline_report, baseline = load(args.baseline)
+    current_report, current = load(args.current)
+    print(f"baseline {baseline_report.get('commit')}  current {current_report.get('commit')}")
+    print(f"{'operation':>9} {'clients':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8}")
+
+    regressions = []
+    for key in sorted(set(baseline) & set(current), key=lambda key: (key[1], key[0])):
+        before, after = baseline[key], current[key]
+        p95 = change(before["latencyMs"]["p95"], after["latencyMs"]["p95"])
+        print(
+            f"{key[0]:>9} {key[1]:>7} "
+            f"{format_change(change(before['latencyMs']['p50'], after['latencyMs']['p50']))} "
+            f"{format_change(p95)} "
+            f"{format_change(change(before['latencyMs']['p99'], after['latencyMs']['p99']))} "
+            f"{format_change(change(before['throughput'], after['throughput']))}"
+        )
+        if p95 is not None and p95 > args.threshold:
+            regressions.append(f"{key[0]} x{key[1]}")
+
+    if regressions:
+        print(f"p95 latency regressed by more than {args.threshold:g}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import os
+import sys
+from typing import List, Tuple
+
+# The document generators live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_synthetic_data as synthetic  # noqa: E402
+
+
+def generate_corpus(directory: str, count: int, seed: int = 0, workers: int = None) -> List[Tuple[str, str]]:
+    """
+    Write `count` seeded synthetic documents to `directory` (see
+    generate_synthetic_data.py), reusing files left by an earlier run with
+    the same seed. Returns (path, kind) pairs.
+    """
+    return [
+        (os.path.join(directory, entry["path"]), entry["kind"])
+        for entry in synthetic.generate_corpus(directory, count, workers, seed=seed)
+    ]
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import random
+import re
+from typing import Any, Dict, List, Union
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Mock inference configuration
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "200"))  # Base time per request
+MOCK_PER_INPUT_MS = float(os.getenv("MOCK_PER_INPUT_MS", "20"))  # Added per input of a batched request
+MOCK_JITTER_MS = float(os.getenv("MOCK_JITTER_MS", "50"))  # Standard deviation of the added noise
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))  # Fraction of requests answered with 500
+MOCK_LOADING_RATE = float(os.getenv("MOCK_LOADING_RATE", "0"))  # Fraction answered with 503 "model loading"
+MOCK_SEED = os.getenv("MOCK_SEED")  # Seed for latency and error draws
+
+# Categories recognised from keywords in the prompt, matching the synthetic corpus
+CATEGORIES = {"invoice": "Invoice", "contract": "Contract", "agreement": "Contract", "report": "Report"}
+
+app = FastAPI()
+rng = random.Random(MOCK_SEED)
+stats = {"requests": 0, "inputs": 0, "errors": 0, "loading": 0}
+
+
+def categorize(prompt: str) -> str:
+    for word in re.findall(r"[a-z]+", prompt.lower()):
+        if word in CATEGORIES:
+            return CATEGORIES[word]
+    return "General"
+
+
+def respond(prompt: str, max_length: int) -> Dict[str, str]:
+    """
+    A canned answer in the shape the backend expects for the prompt's task.
+    """
+    category = categorize(prompt)
+    if "Category:" in prompt:
+        text = f"Category: {category} Summary: A synthetic {category.lower()} document."
+    elif max_length <= 20:
+        text = category
+    else:
+        text = f"A synthetic {category.lower()} document."
+    return {"generated_text": text}
+
+
+@app.post("/models/{model:path}")
+async def generate(model: str, request: Request):
+    """
+    Stand-in for the Hugging Face Inference API text generation endpoint.
+    """
+    payload = await request.json()
+    inputs: Union[str, List[str]] = payload.get("inputs", "")
+    prompts = inputs if isinstance(inputs, list) else [inputs]
+    max_length = int(payload.get("parameters", {}).get("max_length", 50))
+    stats["requests"] += 1
+    stats["inputs"] += len(prompts)
+
+    delay = MOCK_LATENCY_MS + MOCK_PER_INPUT_MS * (len(prompts) - 1) + rng.gauss(0, MOCK_JITTER_MS)
+    await asyncio.sleep(max(delay, 0) / 1000)
+
+    draw = rng.random()
+    if draw < MOCK_ERROR_RATE:
+        stats["errors"] += 1
+        return JSONResponse({"error": "Internal error"}, status_code=500)
+    if draw < MOCK_ERROR_RATE + MOCK_LOADING_RATE:
+        stats["loading"] += 1
+        return JSONResponse({"error": f"Model {model} is currently loading", "estimated_time": 0.5}, status_code=503)
+
+    results: Any = [respond(prompt, max_length) for prompt in prompts]
+    return results if isinstance(inputs, list) else results[:1]
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
@@ -0,0 +1,327 @@
+"""
+Load benchmark for the backend API.
+
+Starts the mock inference server and the backend (unless --url points at a
+running backend), generates a synthetic corpus, then measures upload,
+ingest, list, search and delete latency at each concurrency level. Results
+are written as JSON for comparison with compare.py.
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from corpus import generate_corpus
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+BACKEND_DIR = os.path.join(REPO_DIR, "backend")
+
+# Words that occur in the synthetic documents, used as search queries
+SEARCH_TERMS = ("invoice", "contract", "report", "summary", "total", "party", "agreement", "terms", "date", "item")
+
+RESULTS_VERSION = 1
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app: str, port: int, cwd: str, env: Dict[str, str], log_path: str, workers: int = 1) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--workers", str(workers)],
+        cwd=cwd,
+        env={**os.environ, **env},
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def wait_until_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server for {url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server for {url} did not start within {timeout:.0f}s")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """
+    Linearly interpolated percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(operation: str, concurrency: int, latencies: List[float], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latency * 1000 for latency in latencies)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value, 2) if value is not None else None
+
+    return {
+        "operation": operation,
+        "concurrency": concurrency,
+        "requests": len(latencies) + sum(errors.values()),
+        "errors": errors,
+        "elapsedSeconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latencyMs": {
+            "p50": ms(percentile(latencies, 0.50)),
+            "p95": ms(percentile(latencies, 0.95)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+    }
+
+
+async def run_operation(
+    operation: str,
+    concurrency: int,
+    tasks: List[Any],
+    call: Callable[[Any], Awaitable[Tuple[bool, str, Any]]],
+) -> Tuple[Dict[str, Any], List[Any]]:
+    """
+    Run `call` over `tasks` with `concurrency` clients pulling from a shared
+    queue. `call` returns (ok, error label, result). Returns the summary and
+    the results of successful calls.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for task in tasks:
+        queue.put_nowait(task)
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    results: List[Any] = []
+
+    async def client():
+        while not queue.empty():
+            task = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                ok, error, result = await call(task)
+            except httpx.HTTPError as e:
+                ok, error, result = False, type(e).__name__, None
+            if ok:
+                latencies.append(time.perf_counter() - start)
+                results.append(result)
+            else:
+                errors[error] = errors.get(error, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(operation, concurrency, latencies, errors, time.perf_counter() - start), results
+
+
+async def benchmark_level(client: httpx.AsyncClient, concurrency: int, corpus: List[Tuple[str, str]], requests: int, rng: random.Random) -> List[Dict[str, Any]]:
+    # Each document is uploaded at most once per level: a repeat would be answered by
+    # content-hash deduplication or the result cache rather than run through the pipeline
+    files = rng.sample(corpus, min(requests, len(corpus)))
+    response = await client.delete("/admin/cache")
+    response.raise_for_status()
+
+    upload_latencies: List[float] = []
+    upload_errors: Dict[str, int] = {}
+
+    async def ingest(document):
+        # Upload, then long-poll until the job finishes, so each client has one document in flight
+        path, _ = document
+        with open(path, "rb") as f:
+            content = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        start = time.perf_counter()
+        response = await client.post("/upload", files={"file": (os.path.basename(path), content, content_type)})
+        if response.status_code != 202:
+            upload_errors[str(response.status_code)] = upload_errors.get(str(response.status_code), 0) + 1
+            return False, "upload", None
+        upload_latencies.append(time.perf_counter() - start)
+        job_id = response.json()["id"]
+        while True:
+            response = await client.get(f"/jobs/{job_id}", params={"wait": 60})
+            if response.status_code != 200:
+                return False, str(response.status_code), None
+            status = response.json()
+            if status["status"] == "completed":
+                return True, "", status["document"]["id"]
+            if status["status"] == "failed":
+                return False, "failed", None
+
+    async def list_documents(_):
+        response = await client.get("/documents", params={"limit": 50})
+        return response.status_code == 200, str(response.status_code), None
+
+    async def search(term):
+        response = await client.get("/search", params={"q": term})
+        return response.status_code == 200, str(response.status_code), None
+
+    async def delete(document_id):
+        response = await client.delete(f"/delete/{document_id}")
+        return response.status_code == 200, str(response.status_code), None
+
+    # "upload" is the time until the file is accepted and queued; "ingest" runs until its job completes
+    ingest_summary, document_ids = await run_operation("ingest", concurrency, files, ingest)
+    upload_summary = summarize("upload", concurrency, upload_latencies, upload_errors, ingest_summary["elapsedSeconds"])
+    list_summary, _ = await run_operation("list", concurrency, [None] * requests, list_documents)
+    search_summary, _ = await run_operation("search", concurrency, [rng.choice(SEARCH_TERMS) for _ in range(requests)], search)
+    delete_summary, _ = await run_operation("delete", concurrency, document_ids, delete)
+    return [upload_summary, ingest_summary, list_summary, search_summary, delete_summary]
+
+
+async def benchmark(url: str, concurrency_levels: List[int], corpus: List[Tuple[str, str]], requests: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=max(concurrency_levels), max_keepalive_connections=max(concurrency_levels))
+    results = []
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        for concurrency in concurrency_levels:
+            for summary in await benchmark_level(client, concurrency, corpus, requests, rng):
+                results.append(summary)
+                print_summary(summary)
+    return results
+
+
+def print_summary(summary: Dict[str, Any]):
+    latency = summary["latencyMs"]
+    errors = sum(summary["errors"].values())
+    print(
+        f"{summary['operation']:>7} x{summary['concurrency']:<4} "
+        f"p50 {latency['p50'] or 0:9.1f} ms  p95 {latency['p95'] or 0:9.1f} ms  p99 {latency['p99'] or 0:9.1f} ms  "
+        f"{summary['throughput'] or 0:8.1f} req/s  errors {errors}"
+    )
+
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running backend instead of starting one with the mock inference server")
+    parser.add_argument("--concurrency", default="1,10,100", help="Comma-separated client counts (default: 1,10,100)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per operation at each concurrency level (default: 200)")
+    parser.add_argument("--documents", type=int, default=200, help="Distinct documents in the corpus (default: 200)")
+    parser.add_argument("--corpus-dir", default=os.path.join(BENCHMARK_DIR, "corpus"), help="Where the corpus is generated and cached")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the corpus, request mix and mock inference")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Mock inference base latency (default: 200)")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Mock inference latency standard deviation (default: 50)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock inference requests that fail with 500")
+    parser.add_argument("--loading-rate", type=float, default=0.0, help="Fraction of mock inference requests that return 503 model loading")
+    parser.add_argument("--web-workers", type=int, default=1, help="Backend server processes (default: 1)")
+    parser.add_argument("--output", help="Results file (default: results/<timestamp>-<commit>.json)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    if args.documents < args.requests:
+        print(f"Only {args.documents} distinct documents: ingest makes {args.documents} uploads per level, not {args.requests}")
+    print(f"Generating {args.documents} documents in {args.corpus_dir}")
+    corpus = generate_corpus(args.corpus_dir, args.documents, args.seed)
+
+    mock_config = {
+        "MOCK_LATENCY_MS": str(args.latency_ms),
+        "MOCK_JITTER_MS": str(args.jitter_ms),
+        "MOCK_ERROR_RATE": str(args.error_rate),
+        "MOCK_LOADING_RATE": str(args.loading_rate),
+        "MOCK_SEED": str(args.seed),
+    }
+    processes: List[subprocess.Popen] = []
+    data_dir = tempfile.mkdtemp(prefix="dms-benchmark-")
+    try:
+        url = args.url
+        if url is None:
+            mock_port, backend_port = free_port(), free_port()
+            processes.append(start_server("mock_inference:app", mock_port, BENCHMARK_DIR, mock_config, os.path.join(data_dir, "mock.log")))
+            wait_until_ready(f"http://127.0.0.1:{mock_port}/stats", processes[-1])
+            # A fresh store and indexes per run, so results don't depend on earlier runs
+            processes.append(start_server("main:app", backend_port, BACKEND_DIR, {
+                "HUGGING_FACE_API_URL": f"http://127.0.0.1:{mock_port}/models",
+                "INFERENCE_BACKEND": "remote",
+                "DOCUMENT_DB": os.path.join(data_dir, "documents.db"),
+                "SEARCH_DB": os.path.join(data_dir, "search.db"),
+                "VECTOR_DIR": os.path.join(data_dir, "vectors"),
+                "BLOB_DIR": os.path.join(data_dir, "blobs"),
+                "IDEMPOTENCY_DB": os.path.join(data_dir, "idempotency.db"),
+                "OCR_CACHE_DB": os.path.join(data_dir, "ocr.db"),
+                "JOB_DB": os.path.join(data_dir, "jobs.db"),
+                "EVENTS_DB": os.path.join(data_dir, "events.db"),
+                # No result cache, so documents uploaded again at a later level are analyzed again
+                "RESULT_CACHE_DB": "",
+                "RESULT_CACHE_SIZE": "0",
+                "JOB_QUEUE_MAXSIZE": str(max(args.requests, 100)),
+                "WEB_WORKERS": str(args.web_workers),
+            }, os.path.join(data_dir, "backend.log"), workers=args.web_workers))
+            url = f"http://127.0.0.1:{backend_port}"
+            wait_until_ready(f"{url}/jobs/stats", processes[-1])
+
+        results = asyncio.run(benchmark(url, concurrency_levels, corpus, args.requests, args.seed))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "version": RESULTS_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "url": args.url,
+            "concurrency": concurrency_levels,
+            "requests": args.requests,
+            "documents": args.documents,
+            "seed": args.seed,
+            "webWorkers": None if args.url else args.web_workers,
+            "mock": None if args.url else mock_config,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        BENCHMARK_DIR, "results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{(commit or 'unknown')[:12]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
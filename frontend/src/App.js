@@ -1,18 +1,42 @@
-import React, { useState } from "react";
+import React, { useCallback, useEffect, useState } from "react";
 import axios from "axios";
 
+const PAGE_SIZE = 50;
+
+// File types the backend can extract text from
+const ACCEPTED_EXTENSIONS = [".pdf", ".docx", ".xlsx", ".pptx", ".txt", ".md", ".csv", ".html", ".htm", ".eml"];
+
 function App() {
   const [files, setFiles] = useState([]);
   const [error, setError] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+
+  // Fetch one page of documents; without a cursor this (re)loads the first page
+  const loadDocuments = useCallback(async (cursor) => {
+    try {
+      const response = await axios.get("http://localhost:8000/documents", {
+        params: { limit: PAGE_SIZE, cursor: cursor || undefined, include_total: false },
+      });
+      const { items, nextCursor } = response.data;
+      setFiles((current) => (cursor ? [...current, ...items] : items));
+      setNextCursor(nextCursor);
+    } catch (err) {
+      setError("Failed to load documents. Please try again.");
+    }
+  }, []);
+
+  useEffect(() => {
+    loadDocuments(null);
+  }, [loadDocuments]);
 
   const handleFileUpload = async (e) => {
     const file = e.target.files[0];
     if (!file) return;
 
-    // Validate file type
-    const allowedTypes = ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"];
-    if (!allowedTypes.includes(file.type)) {
-      setError("Invalid file type. Please upload a PDF or DOCX file.");
+    // Validate file type by extension; the backend checks the file's contents
+    const extension = file.name.slice(file.name.lastIndexOf(".")).toLowerCase();
+    if (!ACCEPTED_EXTENSIONS.includes(extension)) {
+      setError("Invalid file type. Please upload a PDF, Word, Excel, PowerPoint, text, HTML or email file.");
       return;
     }
 
@@ -27,16 +51,58 @@ function App() {
       const response = await axios.post("http://localhost:8000/upload", formData, {
         headers: { "Content-Type": "multipart/form-data" },
       });
-      setFiles([...files, response.data]);
+
+      // Processing runs in the background; show a placeholder row and fill it in from progress events
+      const job = response.data;
+      setFiles((current) => [{ id: job.id, title: job.filename, pending: true, stage: "received" }, ...current]);
+      watchJob(job.id);
     } catch (err) {
       setError("Failed to upload file. Please try again.");
     }
   };
 
+  // Follow a job's progress over server-sent events until it completes or fails
+  const watchJob = (jobId) => {
+    const source = new EventSource(`http://localhost:8000/events?job_ids=${encodeURIComponent(jobId)}`);
+    const updateRow = (changes) =>
+      setFiles((current) => current.map((file) => (file.id === jobId ? { ...file, ...changes } : file)));
+    const finish = (job) => {
+      source.close();
+      if (job.status === "completed") {
+        updateRow({ ...job.document, pending: false });
+      } else {
+        setFiles((current) => current.filter((file) => file.id !== jobId));
+        setError(job.error || "Failed to process file. Please try again.");
+      }
+    };
+
+    // Sent first with the job's current status, in case it finished before we connected
+    source.addEventListener("snapshot", (e) => {
+      const job = JSON.parse(e.data);
+      if (job.status === "completed" || job.status === "failed") finish(job);
+    });
+    source.addEventListener("job", (e) => {
+      const event = JSON.parse(e.data);
+      if (event.stage === "completed" || event.stage === "failed") {
+        finish(event);
+        return;
+      }
+      const changes = { stage: event.stage };
+      if (event.category) changes.category = event.category;
+      if (event.summary) changes.summary = event.summary;
+      updateRow(changes);
+    });
+    // Missed events; fall back to the job status
+    source.addEventListener("resync", async () => {
+      const status = await axios.get(`http://localhost:8000/jobs/${jobId}`);
+      if (status.data.status === "completed" || status.data.status === "failed") finish(status.data);
+    });
+  };
+
   const handleDelete = async (id) => {
     try {
       await axios.delete(`http://localhost:8000/delete/${id}`);
-      setFiles(files.filter((file) => file.id !== id));
+      setFiles((current) => current.filter((file) => file.id !== id));
     } catch (err) {
       setError("Failed to delete file. Please try again.");
     }
@@ -50,7 +116,7 @@ function App() {
           type="file"
           onChange={handleFileUpload}
           className="mb-4"
-          accept=".pdf,.docx"  // Allow both PDF and DOCX files
+          accept={ACCEPTED_EXTENSIONS.join(",")}
         />
         {error && <p className="text-red-500 mb-4">{error}</p>}
         <ul>
@@ -58,12 +124,13 @@ function App() {
             <li key={file.id} className="flex justify-between items-center mb-2">
               <div>
                 <p className="font-semibold">{file.title}</p>
-                <p className="text-sm text-gray-500">{file.uploadDate}</p>
+                <p className="text-sm text-gray-500">{file.pending ? `Processing: ${file.stage}` : file.uploadDate}</p>
                 <p className="text-sm text-gray-500">{file.category}</p>
                 <p className="text-sm text-gray-500">{file.summary}</p>
               </div>
               <button
                 onClick={() => handleDelete(file.id)}
+                disabled={file.pending}
                 className="bg-red-500 text-white px-3 py-1 rounded hover:bg-red-600"
               >
                 Delete
@@ -71,6 +138,14 @@ function App() {
             </li>
           ))}
         </ul>
+        {nextCursor && (
+          <button
+            onClick={() => loadDocuments(nextCursor)}
+            className="mt-4 w-full bg-gray-200 px-3 py-1 rounded hover:bg-gray-300"
+          >
+            Load more
+          </button>
+        )}
       </div>
     </div>
   );
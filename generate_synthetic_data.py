@@ -1,8 +1,21 @@
+import argparse
+import hashlib
+import io
+import json
+import math
 import os
+import random
+import sys
+import textwrap
+import time
+from datetime import date, datetime
+from multiprocessing import Pool
 from faker import Faker
-from datetime import datetime
 from docx import Document
+from docx.shared import Inches
+from PIL import Image, ImageDraw, ImageFont
 from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 
 # Initialize Faker for generating fake data
@@ -10,76 +23,307 @@ fake = Faker()
 
 # Define the folder structure
 data_folder = "synthetic_data"
-os.makedirs(data_folder, exist_ok=True)
 
-# Function to generate a synthetic invoice (PDF)
-def generate_invoice_pdf(file_path):
+# Lines of body text that fit on a letter page below the 100pt margins
+LINES_PER_PAGE = 30
+
+# Scanned pages are rendered at this resolution before being embedded as images
+SCAN_DPI = 100
+
+# Dates on generated documents fall in a fixed range so seeded runs produce the same text
+DATE_RANGE = (date(2020, 1, 1), date(2024, 12, 31))
+
+# Function to pick a document date
+def document_date(seeded):
+    if seeded:
+        return fake.date_between(*DATE_RANGE).strftime('%Y-%m-%d')
+    return datetime.now().strftime('%Y-%m-%d')
+
+# Function to render a page of text as a slightly skewed grayscale scan
+def scan_page(lines, rng):
+    scale = SCAN_DPI / 72
+    width, height = int(letter[0] * scale), int(letter[1] * scale)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=int(12 * scale))
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        font = ImageFont.load_default()
+    for y, text in lines:
+        draw.text((100 * scale, (letter[1] - y - 12) * scale), text, fill=rng.randint(0, 60), font=font)
+    # A scanner never feeds a page perfectly straight
+    return image.rotate(rng.uniform(-1.5, 1.5), fillcolor=255)
+
+# Function to draw a small bar chart to embed as a figure
+def figure_image(rng):
+    image = Image.new("RGB", (300, 165), "white")
+    draw = ImageDraw.Draw(image)
+    bars = rng.randint(3, 8)
+    width = 280 // bars
+    for bar in range(bars):
+        top = rng.randint(10, 150)
+        color = (rng.randint(0, 200), rng.randint(0, 200), rng.randint(0, 200))
+        draw.rectangle([10 + bar * width, top, 10 + (bar + 1) * width - 6, 155], fill=color)
+    return image
+
+# Function to serialize an image for python-docx
+def png_stream(image):
+    stream = io.BytesIO()
+    image.save(stream, format="PNG")
+    stream.seek(0)
+    return stream
+
+# Function to write pages of (y, text) lines to a PDF, with scanned pages and figures
+def render_pdf(file_path, pages, images=0, scanned_pages=(), rng=None):
+    rng = rng or random.Random()
     c = canvas.Canvas(file_path, pagesize=letter)
-    c.setFont("Helvetica", 12)
+    for number, lines in enumerate(pages):
+        if number in scanned_pages:
+            # Scanned pages are only an image, with no text layer
+            c.drawImage(ImageReader(scan_page(lines, rng)), 0, 0, *letter)
+        else:
+            c.setFont("Helvetica", 12)
+            for y, text in lines:
+                c.drawString(100, y, text)
+        # Figures go below the text, spread across the pages
+        for _ in range(number, images, len(pages)):
+            c.drawImage(ImageReader(figure_image(rng)), 100, 40, 200, 110)
+        c.showPage()
+    c.save()
 
+# Function to lay out lines from the top of a page, one every 20pt
+def layout(texts, top=750):
+    return [(top - 20 * row, text) for row, text in enumerate(texts) if text]
+
+# Function to generate a synthetic invoice (PDF)
+def generate_invoice_pdf(file_path, pages=1, images=0, scanned_pages=(), rng=None, seeded=False):
     # Add invoice header
-    c.drawString(100, 750, "Invoice")
-    c.drawString(100, 730, f"Invoice Number: {fake.random_int(min=1000, max=9999)}")
-    c.drawString(100, 710, f"Date: {datetime.now().strftime('%Y-%m-%d')}")
-    c.drawString(100, 690, f"Bill To: {fake.company()}")
-
-    # Add invoice items
-    c.drawString(100, 650, "Item Description          Quantity          Price")
-    y = 630
+    first = [
+        "Invoice",
+        f"Invoice Number: {fake.random_int(min=1000, max=9999)}",
+        f"Date: {document_date(seeded)}",
+        f"Bill To: {fake.company()}",
+        "",
+        # Add invoice items
+        "Item Description          Quantity          Price",
+    ]
     for _ in range(3):
-        c.drawString(100, y, f"{fake.word()}          {fake.random_int(min=1, max=10)}          ${fake.random_int(min=10, max=100)}")
-        y -= 20
+        first.append(f"{fake.word()}          {fake.random_int(min=1, max=10)}          ${fake.random_int(min=10, max=100)}")
+    body = [first]
+
+    # Continue the item list on further pages
+    for _ in range(pages - 1):
+        body.append([f"{fake.word()}          {fake.random_int(min=1, max=10)}          ${fake.random_int(min=10, max=100)}" for _ in range(LINES_PER_PAGE)])
 
     # Add total
-    c.drawString(100, y - 20, f"Total: ${fake.random_int(min=50, max=500)}")
+    body[-1] += ["", f"Total: ${fake.random_int(min=50, max=500)}"]
 
-    c.save()
+    render_pdf(file_path, [layout(page) for page in body], images, scanned_pages, rng)
 
 # Function to generate a synthetic contract (DOCX)
-def generate_contract_docx(file_path):
-    doc = Document()
-    doc.add_heading("Contract Agreement", 0)
+def generate_contract_docx(file_path, pages=1, images=0, scanned_pages=(), rng=None, seeded=False):
+    rng = rng or random.Random()
 
     # Add contract details
-    doc.add_paragraph(f"This agreement is made and entered into on {datetime.now().strftime('%Y-%m-%d')} by and between:")
-    doc.add_paragraph(f"Party A: {fake.company()}")
-    doc.add_paragraph(f"Party B: {fake.company()}")
-    doc.add_paragraph("Terms and Conditions:")
+    first = [
+        f"This agreement is made and entered into on {document_date(seeded)} by and between:",
+        f"Party A: {fake.company()}",
+        f"Party B: {fake.company()}",
+        "Terms and Conditions:",
+    ]
     for _ in range(5):
-        doc.add_paragraph(fake.sentence())
+        first.append(fake.sentence())
+    body = [first]
 
-    doc.add_paragraph("Signatures:")
-    doc.add_paragraph(f"Party A: ___________________________")
-    doc.add_paragraph(f"Party B: ___________________________")
+    # Further clauses, one page each
+    for _ in range(pages - 1):
+        body.append([fake.paragraph(nb_sentences=3) for _ in range(LINES_PER_PAGE // 3)])
+
+    body[-1] += ["Signatures:", "Party A: ___________________________", "Party B: ___________________________"]
+
+    doc = Document()
+    for number, paragraphs in enumerate(body):
+        if number:
+            doc.add_page_break()
+        if number in scanned_pages:
+            # Scanned pages are a picture of the text
+            texts = (["Contract Agreement", ""] if number == 0 else []) + [line for text in paragraphs for line in textwrap.wrap(text, 70)]
+            doc.add_picture(png_stream(scan_page(layout(texts[:LINES_PER_PAGE + 4], top=770), rng)), width=Inches(6.5))
+        else:
+            if number == 0:
+                doc.add_heading("Contract Agreement", 0)
+            for text in paragraphs:
+                doc.add_paragraph(text)
+        for _ in range(number, images, len(body)):
+            doc.add_picture(png_stream(figure_image(rng)), width=Inches(3))
 
     doc.save(file_path)
 
 # Function to generate a synthetic report (PDF)
-def generate_report_pdf(file_path):
-    c = canvas.Canvas(file_path, pagesize=letter)
-    c.setFont("Helvetica", 12)
-
+def generate_report_pdf(file_path, pages=1, images=0, scanned_pages=(), rng=None, seeded=False):
     # Add report header
-    c.drawString(100, 750, "Monthly Report")
-    c.drawString(100, 730, f"Report Date: {datetime.now().strftime('%Y-%m-%d')}")
-    c.drawString(100, 710, f"Prepared By: {fake.name()}")
-
-    # Add report content
-    c.drawString(100, 680, "Summary:")
-    y = 660
+    first = [
+        "Monthly Report",
+        f"Report Date: {document_date(seeded)}",
+        f"Prepared By: {fake.name()}",
+        "",
+        # Add report content
+        "Summary:",
+    ]
     for _ in range(5):
-        c.drawString(100, y, fake.sentence())
-        y -= 20
+        first.append(fake.sentence())
+    body = [first]
 
-    c.save()
+    # Add further pages of findings
+    for _ in range(pages - 1):
+        body.append([fake.sentence() for _ in range(LINES_PER_PAGE)])
+
+    render_pdf(file_path, [layout(page) for page in body], images, scanned_pages, rng)
+
+# Document kinds: generator, file extension, ground-truth category and default share of a corpus
+DOCUMENT_KINDS = {
+    "invoice": (generate_invoice_pdf, ".pdf", "Invoice", 0.4),
+    "report": (generate_report_pdf, ".pdf", "Report", 0.35),
+    "contract": (generate_contract_docx, ".docx", "Contract", 0.25),
+}
+
+# Corpus defaults; page counts are log-normal, so most documents are short and a few run long
+CORPUS_DEFAULTS = {
+    "seed": 0,
+    "pages_median": 2.0,
+    "pages_sigma": 1.0,
+    "max_pages": 200,
+    "image_ratio": 0.2,
+    "scanned_docs": 0.0,
+    "scanned_pages": 1.0,
+    "shard_size": 1000,
+}
+
+# Documents handed to a worker process at a time
+CHUNK_SIZE = 64
+
+# Function to decide a document's kind, length, figures and scanned pages from the seed alone
+def document_spec(index, options):
+    rng = random.Random(options["seed"] * 1_000_003 + index)
+    kinds = list(DOCUMENT_KINDS)
+    kind = rng.choices(kinds, [DOCUMENT_KINDS[name][3] for name in kinds])[0]
+    pages = round(rng.lognormvariate(math.log(options["pages_median"]), options["pages_sigma"]))
+    pages = max(1, min(options["max_pages"], pages))
+    images = rng.randint(1, 3) if rng.random() < options["image_ratio"] else 0
+    scanned = []
+    if rng.random() < options["scanned_docs"]:
+        scanned = sorted(rng.sample(range(pages), max(1, round(pages * options["scanned_pages"]))))
+    extension = DOCUMENT_KINDS[kind][1]
+    shard = f"{index // options['shard_size']:05d}"
+    # Everything the file's content depends on, so a file is only reused when it would come out the same
+    variant = hashlib.sha256(json.dumps([options["seed"], kind, pages, images, scanned]).encode()).hexdigest()[:8]
+    return {
+        "index": index,
+        "path": os.path.join(shard, f"{index:08d}-{kind}-{variant}{extension}"),
+        "kind": kind,
+        "category": DOCUMENT_KINDS[kind][2],
+        "pages": pages,
+        "images": images,
+        "scannedPages": scanned,
+    }, rng
+
+# Function to write one document, skipping files left by an earlier run with the same seed and options
+def generate_document(output, index, options):
+    spec, rng = document_spec(index, options)
+    path = os.path.join(output, spec["path"])
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fake.seed_instance(options["seed"] * 1_000_003 + index)
+        generate = DOCUMENT_KINDS[spec["kind"]][0]
+        # Write under a temporary name so an interrupted run never leaves a truncated document
+        partial = path + ".partial"
+        generate(partial, pages=spec["pages"], images=spec["images"], scanned_pages=set(spec["scannedPages"]), rng=rng, seeded=True)
+        os.replace(partial, path)
+    spec["bytes"] = os.path.getsize(path)
+    del spec["index"]
+    return spec
 
-# Generate synthetic documents
-generate_invoice_pdf(os.path.join(data_folder, "invoice.pdf"))
-generate_contract_docx(os.path.join(data_folder, "contract.docx"))
-generate_report_pdf(os.path.join(data_folder, "report.pdf"))
+# Function run by each worker process for a range of documents
+def generate_chunk(task):
+    output, start, stop, options = task
+    return [generate_document(output, index, options) for index in range(start, stop)]
 
-# Create a README file for the synthetic data
-readme = """
+# Function to generate a corpus across a process pool, yielding manifest entries in order
+def generate_corpus(output, count, workers=None, manifest="manifest.jsonl", **options):
+    options = {**CORPUS_DEFAULTS, **options}
+    os.makedirs(output, exist_ok=True)
+    tasks = [(output, start, min(start + CHUNK_SIZE, count), options) for start in range(0, count, CHUNK_SIZE)]
+    workers = workers or os.cpu_count() or 1
+    with open(os.path.join(output, manifest), "w") as manifest_file:
+        if workers == 1:
+            chunks = map(generate_chunk, tasks)
+            pool = None
+        else:
+            pool = Pool(workers)
+            chunks = pool.imap(generate_chunk, tasks)
+        try:
+            for chunk in chunks:
+                for entry in chunk:
+                    manifest_file.write(json.dumps(entry) + "\n")
+                    yield entry
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic invoices, reports and contracts. Without --count, writes the three sample files to synthetic_data/.",
+    )
+    parser.add_argument("--count", type=int, help="Number of documents to generate")
+    parser.add_argument("--output", default=data_folder, help=f"Output directory (default: {data_folder})")
+    parser.add_argument("--seed", type=int, default=CORPUS_DEFAULTS["seed"], help="Seed for reproducible output (default: 0)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    parser.add_argument("--pages-median", type=float, default=CORPUS_DEFAULTS["pages_median"], help="Median page count (default: 2)")
+    parser.add_argument("--pages-sigma", type=float, default=CORPUS_DEFAULTS["pages_sigma"], help="Spread of the log-normal page count (default: 1.0)")
+    parser.add_argument("--max-pages", type=int, default=CORPUS_DEFAULTS["max_pages"], help="Page count cap (default: 200)")
+    parser.add_argument("--image-ratio", type=float, default=CORPUS_DEFAULTS["image_ratio"], help="Fraction of documents with embedded figures (default: 0.2)")
+    parser.add_argument("--scanned-docs", type=float, default=CORPUS_DEFAULTS["scanned_docs"], help="Fraction of documents with scanned pages (default: 0)")
+    parser.add_argument("--scanned-pages", type=float, default=CORPUS_DEFAULTS["scanned_pages"], help="Fraction of a scanned document's pages that are scans (default: 1.0)")
+    parser.add_argument("--shard-size", type=int, default=CORPUS_DEFAULTS["shard_size"], help="Documents per subdirectory (default: 1000)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.count is None:
+        generate_samples()
+        return
+
+    start = time.perf_counter()
+    options = {
+        "seed": args.seed,
+        "pages_median": args.pages_median,
+        "pages_sigma": args.pages_sigma,
+        "max_pages": args.max_pages,
+        "image_ratio": args.image_ratio,
+        "scanned_docs": args.scanned_docs,
+        "scanned_pages": args.scanned_pages,
+        "shard_size": args.shard_size,
+    }
+    total_bytes = 0
+    for done, entry in enumerate(generate_corpus(args.output, args.count, args.workers, **options), 1):
+        total_bytes += entry["bytes"]
+        if done % 1000 == 0 or done == args.count:
+            elapsed = time.perf_counter() - start
+            print(f"{done}/{args.count} documents, {total_bytes / 1e6:.1f} MB ({done / elapsed:.0f} documents/s)", file=sys.stderr)
+    print(f"Synthetic corpus generated in {args.output}; ground truth in {os.path.join(args.output, 'manifest.jsonl')}")
+
+def generate_samples():
+    os.makedirs(data_folder, exist_ok=True)
+
+    # Generate synthetic documents
+    generate_invoice_pdf(os.path.join(data_folder, "invoice.pdf"))
+    generate_contract_docx(os.path.join(data_folder, "contract.docx"))
+    generate_report_pdf(os.path.join(data_folder, "report.pdf"))
+
+    # Create a README file for the synthetic data
+    readme = """
 # Synthetic Data for Testing
 
 This folder contains synthetic documents generated for testing the Document Management System.
@@ -93,8 +337,13 @@ This folder contains synthetic documents generated for testing the Document Mana
 ## Usage
 
 These documents can be used to test the document upload, categorization, and summarization features of the application.
+
+To generate a larger corpus for load and accuracy testing, see `python generate_synthetic_data.py --help`.
 """
-with open(os.path.join(data_folder, "README.md"), "w") as f:
-    f.write(readme)
+    with open(os.path.join(data_folder, "README.md"), "w") as f:
+        f.write(readme)
+
+    print("Synthetic data generated successfully!")
 
-print("Synthetic data generated successfully!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()